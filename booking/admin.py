@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Provider, TimeSlot, Booking, PatientProfile
+from .models import (
+    ArchivedBooking, ArchivedSlot, AvailabilityException, AvailabilityRule, DailyAvailability, Provider, TimeSlot,
+    Booking, PatientProfile,
+)
 
 
 @admin.register(PatientProfile)
@@ -23,3 +26,45 @@ class TimeSlotAdmin(admin.ModelAdmin):
 class BookingAdmin(admin.ModelAdmin):
     list_display = ('client', 'slot', 'status', 'created_at')
     list_filter = ('status',)
+
+@admin.register(AvailabilityRule)
+class AvailabilityRuleAdmin(admin.ModelAdmin):
+    list_display = ('provider', 'weekday', 'start', 'end', 'slot_minutes', 'valid_from', 'valid_until')
+    list_filter = ('weekday', 'provider')
+
+@admin.register(AvailabilityException)
+class AvailabilityExceptionAdmin(admin.ModelAdmin):
+    list_display = ('provider', 'date', 'start', 'end', 'reason')
+    list_filter = ('provider',)
+
+@admin.register(DailyAvailability)
+class DailyAvailabilityAdmin(admin.ModelAdmin):
+    # Maintained by booking.summary; edit slots instead.
+    list_display = ('provider', 'date', 'total', 'free', 'booked')
+    list_filter = ('provider',)
+    date_hierarchy = 'date'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+class ReadOnlyAdmin(admin.ModelAdmin):
+    # Written by booking.archive only.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(ArchivedSlot)
+class ArchivedSlotAdmin(ReadOnlyAdmin):
+    list_display = ('provider', 'start_time', 'end_time', 'is_booked', 'archived_at')
+    list_filter = ('provider',)
+
+@admin.register(ArchivedBooking)
+class ArchivedBookingAdmin(ReadOnlyAdmin):
+    list_display = ('client', 'slot', 'status', 'created_at')
+    list_filter = ('status',)
+    list_select_related = ('client', 'slot__provider__user')
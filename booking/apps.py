@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class BookingConfig(AppConfig):
     name = 'booking'
+
+    def ready(self):
+        from . import availability, caching, conditional, feed, photos, signals, summary  # noqa: F401  (connect receivers)
@@ -0,0 +1,107 @@
+"""
+Move past slots and their bookings out of the live tables.
+
+Slots that started more than `ARCHIVE_AFTER_DAYS` days ago are copied into
+`ArchivedSlot`, and all their bookings (any status) into `ArchivedBooking`.
+The live rows are then deleted.  This keeps `TimeSlot` and `Booking`, and
+every index on them, sized to the booking horizon instead of the clinic's
+whole history.
+
+Work goes oldest first, in batches of `batch_size` slots.  Each batch is one
+serialized write transaction, so a batch holds the write lock briefly and an
+interrupted run loses at most the batch in flight.  No progress is stored
+anywhere.  What is left in the live tables is the progress, so
+`manage.py archive_bookings` simply resumes where the last run stopped.
+
+The live rows are deleted with plain SQL DELETEs.  Per-row model signals
+would cost a query each, so `DailyAvailability` and the `slots_changed`
+listeners are told once per batch instead, as `bulk.create_slots` does for
+inserts.
+"""
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from . import summary
+from .models import ArchivedBooking, ArchivedSlot, Booking, TimeSlot
+from .signals import notify
+from .writes import serialized
+
+
+DEFAULT_AFTER_DAYS = 90
+DEFAULT_BATCH_SIZE = 500
+
+
+def cutoff(days=None):
+    """Slots starting before this moment are archived."""
+    if days is None:
+        days = getattr(settings, 'ARCHIVE_AFTER_DAYS', DEFAULT_AFTER_DAYS)
+    return timezone.now() - timedelta(days=days)
+
+
+def pending(before):
+    """Number of live slots waiting to be archived."""
+    return TimeSlot.objects.filter(start_time__lt=before).count()
+
+
+@serialized
+def archive_batch(before, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Archive the oldest `batch_size` slots starting before `before`, with their
+    bookings.  Return `(slots, bookings)` moved; `(0, 0)` when nothing is left.
+    """
+    keys = list(
+        TimeSlot.objects.filter(start_time__lt=before)
+        .order_by('start_time', 'id')
+        .values_list('start_time', 'id')[:batch_size]
+    )
+    if not keys:
+        return 0, 0
+    # Everything up to the last key, in (start_time, id) order: older rows
+    # were archived by earlier batches, so this is exactly the batch.  The
+    # range keeps the statements free of long id lists.
+    last_start, last_id = keys[-1]
+    live_slots = TimeSlot.objects.filter(
+        Q(start_time__lt=last_start) | Q(start_time=last_start, id__lte=last_id)
+    )
+    live_bookings = Booking.objects.filter(slot__in=live_slots.values('id'))
+
+    slots = list(live_slots)
+    bookings = list(live_bookings)
+    ArchivedSlot.objects.bulk_create([
+        ArchivedSlot(
+            id=slot.id, provider_id=slot.provider_id, start_time=slot.start_time,
+            end_time=slot.end_time, is_booked=slot.is_booked, updated_at=slot.updated_at,
+        )
+        for slot in slots
+    ])
+    ArchivedBooking.objects.bulk_create([
+        ArchivedBooking(
+            id=booking.id, client_id=booking.client_id, slot_id=booking.slot_id, status=booking.status,
+            created_at=booking.created_at, updated_at=booking.updated_at,
+        )
+        for booking in bookings
+    ])
+    live_bookings._raw_delete(live_bookings.db)
+    live_slots._raw_delete(live_slots.db)
+
+    summary.slots_removed(slots)
+    notify('deleted', slots)
+    return len(slots), len(bookings)
+
+
+def archive(before, batch_size=DEFAULT_BATCH_SIZE, max_batches=None):
+    """
+    Archive in batches until nothing before `before` is left, or after
+    `max_batches`.  Yields `(slots, bookings)` per batch.
+    """
+    done = 0
+    while max_batches is None or done < max_batches:
+        moved = archive_batch(before, batch_size)
+        if not moved[0]:
+            return
+        done += 1
+        yield moved
@@ -0,0 +1,288 @@
+"""
+In-memory index of free future slots, for "next available appointment".
+
+Each process keeps, per provider, a list of `(start_time, slot_id, end_time)`
+tuples for its free future slots, sorted by start time.  A search bisects to
+the window start in every matching provider's list and merges the lists
+lazily with `heapq.merge`, so finding the next N slots costs about
+O(providers * log slots + N), however many slots exist.
+
+Providers with recurring `AvailabilityRule`s also get a lazily expanded
+stream of virtual slots (see `booking.schedule`), merged into the same
+search; those results come back as `schedule.VirtualSlot`s.
+
+The index is loaded from the database on first use and then kept current
+from `signals.slots_changed`.  Writes made by other worker processes only
+become visible at the next periodic rebuild (`AVAILABILITY_INDEX_TTL`
+seconds).  For that reason every result is re-checked against the
+database before it is returned, and entries found to be stale are dropped.
+"""
+
+import heapq
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, time as dt_time, timedelta
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import schedule
+from .models import AvailabilityException, AvailabilityRule, Provider, TimeSlot
+from .signals import slots_changed
+
+
+DEFAULT_TTL = 300
+DEFAULT_HORIZON_DAYS = 180
+MAX_RESULTS = 100
+
+
+def _horizon_end():
+    days = getattr(settings, 'AVAILABILITY_HORIZON_DAYS', DEFAULT_HORIZON_DAYS)
+    return timezone.now() + timedelta(days=days)
+
+
+def _in_time_window(start, end, time_from, time_to):
+    local_start, local_end = timezone.localtime(start), timezone.localtime(end)
+    if time_from is not None and local_start.time() < time_from:
+        return False
+    if time_to is not None and (local_end.time() > time_to or local_end.date() != local_start.date()):
+        return False
+    return True
+
+
+class AvailabilityIndex:
+    """
+    Per-provider lists are copy-on-write: updates swap in a new list, so a
+    search can merge the lists it picked up without holding the lock.
+    """
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._free = {}            # provider_id -> sorted [(start, slot_id, end)]
+        self._entries = {}         # slot_id -> (provider_id, entry)
+        self._specialization = {}  # provider_id -> specialization
+        self._rules = {}           # provider_id -> ([AvailabilityRule], {date: [exception]})
+        self._loaded_at = None
+
+    # ── Loading ──────────────────────────────────────────────────
+    def _get_ttl(self):
+        if self.ttl is not None:
+            return self.ttl
+        return getattr(settings, 'AVAILABILITY_INDEX_TTL', DEFAULT_TTL)
+
+    @property
+    def loaded(self):
+        return self._loaded_at is not None
+
+    def rebuild(self):
+        free, entries = {}, {}
+        rows = (
+            TimeSlot.objects.filter(is_booked=False, start_time__gte=timezone.now())
+            .order_by('provider_id', 'start_time', 'id')
+            .values_list('provider_id', 'start_time', 'id', 'end_time')
+            .iterator(chunk_size=5000)
+        )
+        for provider_id, start, slot_id, end in rows:
+            entry = (start, slot_id, end)
+            free.setdefault(provider_id, []).append(entry)
+            entries[slot_id] = (provider_id, entry)
+        specialization = dict(Provider.objects.values_list('id', 'specialization'))
+        rules = self._load_rules(specialization.keys())
+        with self._lock:
+            self._free, self._entries, self._specialization = free, entries, specialization
+            self._rules = rules
+            self._loaded_at = time.monotonic()
+
+    def _load_rules(self, provider_ids):
+        rules = schedule.load_rules(provider_ids)
+        today = timezone.localdate()
+        exceptions = schedule.load_exceptions(rules.keys(), today, timezone.localtime(_horizon_end()).date())
+        return {pid: (provider_rules, exceptions[pid]) for pid, provider_rules in rules.items()}
+
+    def reload_rules(self, provider_id):
+        rules = self._load_rules([provider_id])
+        with self._lock:
+            if provider_id in rules:
+                self._rules[provider_id] = rules[provider_id]
+            else:
+                self._rules.pop(provider_id, None)
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self._get_ttl():
+            self.rebuild()
+
+    def clear(self):
+        with self._lock:
+            self._free, self._entries, self._specialization, self._rules = {}, {}, {}, {}
+            self._loaded_at = None
+
+    # ── Incremental updates ──────────────────────────────────────
+    def discard(self, slot_id):
+        with self._lock:
+            found = self._entries.pop(slot_id, None)
+            if found is None:
+                return
+            provider_id, entry = found
+            entries = self._free.get(provider_id, [])
+            i = bisect_left(entries, entry)
+            if i < len(entries) and entries[i] == entry:
+                self._free[provider_id] = entries[:i] + entries[i + 1:]
+
+    def add(self, slot):
+        """Index `slot` if it is free and in the future; otherwise drop it."""
+        self.discard(slot.id)
+        if slot.is_booked or slot.start_time < timezone.now():
+            return
+        entry = (slot.start_time, slot.id, slot.end_time)
+        with self._lock:
+            entries = list(self._free.get(slot.provider_id, ()))
+            insort(entries, entry)
+            self._free[slot.provider_id] = entries
+            self._entries[slot.id] = (slot.provider_id, entry)
+
+    def set_specialization(self, provider_id, specialization):
+        with self._lock:
+            self._specialization[provider_id] = specialization
+
+    def remove_provider(self, provider_id):
+        with self._lock:
+            for _, slot_id, _ in self._free.pop(provider_id, []):
+                self._entries.pop(slot_id, None)
+            self._specialization.pop(provider_id, None)
+            self._rules.pop(provider_id, None)
+
+    # ── Search ───────────────────────────────────────────────────
+    def _iter_provider(self, provider_id, entries, after, time_from=None, time_to=None):
+        """
+        Yield entries from `after` on.  With a time-of-day window, entries
+        outside it are skipped by bisecting to the next window opening rather
+        than by stepping through them.
+        """
+        i, n = bisect_left(entries, (after,)), len(entries)
+        while i < n:
+            start, slot_id, end = entries[i]
+            if time_from is not None or time_to is not None:
+                local_start = timezone.localtime(start)
+                if time_from is not None and local_start.time() < time_from:
+                    i = bisect_left(entries, (datetime.combine(local_start.date(), time_from, local_start.tzinfo),), i + 1)
+                    continue
+                if time_to is not None and local_start.time() >= time_to:
+                    next_day = datetime.combine(local_start.date() + timedelta(days=1), time_from or dt_time.min, local_start.tzinfo)
+                    i = bisect_left(entries, (next_day,), i + 1)
+                    continue
+                local_end = timezone.localtime(end)
+                if time_to is not None and (local_end.time() > time_to or local_end.date() != local_start.date()):
+                    i += 1
+                    continue
+            yield start, slot_id, end, provider_id
+            i += 1
+
+    def _iter_virtual(self, provider_id, rules, after, time_from=None, time_to=None):
+        provider_rules, exceptions = rules
+        for start, end in schedule.iter_rule_slots(provider_rules, exceptions, after, _horizon_end()):
+            if time_from is None and time_to is None or _in_time_window(start, end, time_from, time_to):
+                yield start, None, end, provider_id
+
+    def candidates(self, specialization=None, provider_id=None, after=None, before=None,
+                   time_from=None, time_to=None, min_duration=None):
+        """
+        Yield `(start, slot_id, end, provider_id)` for indexed free slots in
+        time order; `slot_id` is None for virtual slots.  `time_from`/`time_to`
+        bound the local time of day of the slot; `min_duration` is a timedelta.
+        """
+        self._ensure_loaded()
+        after = max(after or timezone.now(), timezone.now())
+        with self._lock:
+            provider_ids = [
+                pid for pid, spec in self._specialization.items()
+                if (specialization is None or spec == specialization)
+                and (provider_id is None or pid == provider_id)
+            ]
+            streams = [
+                self._iter_provider(pid, self._free.get(pid, ()), after, time_from, time_to)
+                for pid in provider_ids
+            ]
+            streams += [
+                self._iter_virtual(pid, self._rules[pid], after, time_from, time_to)
+                for pid in provider_ids if pid in self._rules
+            ]
+        for start, slot_id, end, pid in heapq.merge(*streams, key=lambda c: c[0]):
+            if before is not None and start >= before:
+                return
+            if min_duration is not None and end - start < min_duration:
+                continue
+            yield start, slot_id, end, pid
+
+    def next_available(self, limit=10, **filters):
+        """
+        Return up to `limit` free slots (with provider and user loaded),
+        earliest first.  Candidates are confirmed against the database in
+        batches: stored slots must still be free, and virtual slots must not
+        have been overlapped by a stored one.  Stale entries are dropped.
+        """
+        limit = max(1, min(limit, MAX_RESULTS))
+        found = []
+        stream = self.candidates(**filters)
+        while len(found) < limit:
+            batch = [c for _, c in zip(range(limit - len(found)), stream)]
+            if not batch:
+                break
+            found.extend(self._confirm(batch))
+        return found
+
+    def _confirm(self, batch):
+        ids = [slot_id for _, slot_id, _, _ in batch if slot_id is not None]
+        fresh = TimeSlot.objects.filter(id__in=ids, is_booked=False).select_related('provider__user').in_bulk()
+        virtual = [c for c in batch if c[1] is None]
+        if virtual:
+            pids = {pid for _, _, _, pid in virtual}
+            providers = Provider.objects.select_related('user').in_bulk(pids)
+            taken = schedule.concrete_intervals(pids, virtual[0][0], max(end for _, _, end, _ in virtual))
+        confirmed = []
+        for start, slot_id, end, pid in batch:
+            if slot_id is None:
+                if not schedule.overlaps_any(taken[pid], start, end):
+                    confirmed.append(schedule.VirtualSlot(pid, start, end, providers.get(pid)))
+            elif slot_id in fresh:
+                confirmed.append(fresh[slot_id])
+            else:
+                self.discard(slot_id)
+        return confirmed
+
+
+index = AvailabilityIndex()
+
+
+# ── Keep the index current ───────────────────────────────────────
+@receiver(slots_changed)
+def _on_slots_changed(sender, event, slots, **kwargs):
+    if not index.loaded:
+        return
+    for slot in slots:
+        if event == 'deleted':
+            index.discard(slot.id)
+        else:
+            index.add(slot)
+
+
+@receiver(post_save, sender=Provider)
+def _on_provider_saved(sender, instance, **kwargs):
+    if index.loaded:
+        index.set_specialization(instance.id, instance.specialization)
+
+
+@receiver(post_delete, sender=Provider)
+def _on_provider_deleted(sender, instance, **kwargs):
+    if index.loaded:
+        index.remove_provider(instance.id)
+
+
+@receiver([post_save, post_delete], sender=AvailabilityRule)
+@receiver([post_save, post_delete], sender=AvailabilityException)
+def _on_rules_changed(sender, instance, **kwargs):
+    if index.loaded:
+        index.reload_rules(instance.provider_id)
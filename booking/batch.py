@@ -0,0 +1,202 @@
+"""
+`POST /api/batch/`: run many write operations in one request and one
+transaction.
+
+The body is a list of operations (or `{"operations": [...]}`), each
+
+    {"method": "PUT", "path": "/api/bookings/5/", "body": {"slot_id": 9}}
+
+`path` is resolved with the URLconf.  Operations on `/api/slots/`,
+`/api/providers/` and `/api/bookings/` run through the same booking engine
+and bulk code as the single-resource endpoints, and answer with the status
+and body those endpoints would.  Everything runs inside one
+`transaction.atomic()`.  If an operation fails, the batch stops and the
+whole transaction rolls back, so nothing is written.  Signals, cache bumps
+and feed events are delivered once, on commit, and only for batches that
+succeeded.
+"""
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.urls import Resolver404, resolve
+
+from . import bulk, services
+from .writes import serialized
+from .models import Booking, Provider, TimeSlot
+
+
+DEFAULT_MAX_OPERATIONS = 500
+
+
+class OperationFailed(Exception):
+    """An operation was rejected; `status` is the HTTP status it maps to."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def max_operations():
+    return getattr(settings, 'BATCH_MAX_OPERATIONS', DEFAULT_MAX_OPERATIONS)
+
+
+def _get(model, pk):
+    try:
+        return model.objects.get(pk=pk)
+    except model.DoesNotExist:
+        raise OperationFailed(404, f'{model.__name__} {pk} does not exist.')
+
+
+# ── Slots ────────────────────────────────────────────────────────
+def _create_slot(data):
+    created, errors = bulk.create_slots([data])
+    if errors:
+        status = 409 if errors[0]['error'] == bulk.OVERLAP_ERROR else 400
+        raise OperationFailed(status, errors[0]['error'])
+    return 201, {'id': created[0][1].id, 'status': 'created'}
+
+
+def _update_slot(data, slot_id):
+    slot = _get(TimeSlot, slot_id)
+    if 'is_booked' in data:
+        slot.is_booked = data['is_booked']
+    if 'start_time' in data:
+        slot.start_time = bulk.parse_when(data['start_time'], 'start_time')
+    if 'end_time' in data:
+        slot.end_time = bulk.parse_when(data['end_time'], 'end_time')
+    try:
+        with transaction.atomic():
+            slot.save()
+    except IntegrityError:
+        raise OperationFailed(409, bulk.START_TAKEN_ERROR)
+    return 200, {'status': 'updated'}
+
+
+def _delete_slot(data, slot_id):
+    _get(TimeSlot, slot_id).delete()
+    return 200, {'status': 'deleted'}
+
+
+# ── Providers ────────────────────────────────────────────────────
+def _create_provider(data):
+    user = _get(User, data['user_id'])
+    try:
+        with transaction.atomic():
+            provider = Provider.objects.create(user=user, specialization=data['specialization'].lower())
+    except IntegrityError:
+        raise OperationFailed(409, f'User {user.id} is already a provider.')
+    return 201, {'id': provider.id, 'status': 'created'}
+
+
+def _update_provider(data, provider_id):
+    provider = _get(Provider, provider_id)
+    if 'specialization' in data:
+        provider.specialization = data['specialization'].lower()
+    provider.save()
+    return 200, {'status': 'updated'}
+
+
+def _delete_provider(data, provider_id):
+    _get(Provider, provider_id).delete()
+    return 200, {'status': 'deleted'}
+
+
+# ── Bookings ─────────────────────────────────────────────────────
+def _create_booking(data):
+    if not User.objects.filter(id=data['client_id']).exists():
+        raise OperationFailed(400, 'Unknown client_id')
+    if 'slot_id' in data:
+        booking = services.book(data['client_id'], data['slot_id'], status='pending')
+    else:
+        start_time = bulk.parse_when(data['start_time'], 'start_time')
+        booking = services.book_at(data['client_id'], data['provider_id'], start_time, status='pending')
+    return 201, {'id': booking.id, 'status': 'created'}
+
+
+def _update_booking(data, booking_id):
+    if 'status' in data and data['status'] not in dict(Booking.STATUS_CHOICES):
+        raise OperationFailed(400, 'Invalid status')
+    services.update(
+        _get(Booking, booking_id), **{key: data[key] for key in ('slot_id', 'status', 'client_id') if key in data},
+    )
+    return 200, {'status': 'updated'}
+
+
+def _delete_booking(data, booking_id):
+    services.delete(_get(Booking, booking_id))
+    return 200, {'status': 'deleted'}
+
+
+# (view name, method, has id) -> handler(data[, id]).  Keyed by name because
+# views imports this module.
+HANDLERS = {
+    ('slots_api', 'POST', False): _create_slot,
+    ('slots_api', 'PUT', True): _update_slot,
+    ('slots_api', 'DELETE', True): _delete_slot,
+    ('providers_api', 'POST', False): _create_provider,
+    ('providers_api', 'PUT', True): _update_provider,
+    ('providers_api', 'DELETE', True): _delete_provider,
+    ('bookings_api', 'POST', False): _create_booking,
+    ('bookings_api', 'PUT', True): _update_booking,
+    ('bookings_api', 'DELETE', True): _delete_booking,
+}
+
+
+def _handler(operation):
+    if not isinstance(operation, dict) or not isinstance(operation.get('path'), str):
+        raise OperationFailed(400, 'Each operation needs "method" and "path"')
+    method = str(operation.get('method', '')).upper()
+    try:
+        match = resolve(operation['path'])
+    except Resolver404:
+        raise OperationFailed(404, f"No resource at {operation['path']}")
+    ids = list(match.kwargs.values())
+    handler = HANDLERS.get((match.func.__name__, method, bool(ids)))
+    if handler is None:
+        raise OperationFailed(405, f"{method} {operation['path']} is not supported in a batch")
+    return handler, ids
+
+
+def _run_one(operation):
+    handler, ids = _handler(operation)
+    data = operation.get('body') or {}
+    if not isinstance(data, dict):
+        raise OperationFailed(400, '"body" must be an object')
+    try:
+        return handler(data, *ids)
+    except KeyError as exc:
+        raise OperationFailed(400, f'Missing field {exc.args[0]!r}')
+    except ValueError as exc:
+        raise OperationFailed(400, str(exc))
+    except services.SlotNotFound as exc:
+        raise OperationFailed(404, str(exc))
+    except (services.SlotUnavailable, bulk.SlotConflict) as exc:
+        raise OperationFailed(409, str(exc))
+
+
+class _Rollback(Exception):
+    pass
+
+
+@serialized
+def run(operations):
+    """
+    Run `operations` in one transaction.  Return `(results, failed)`:
+    `results` is `[{'status', 'body'}]` for each operation attempted, and
+    `failed` is the index of the operation that rolled the batch back, or
+    None when every operation succeeded and the transaction committed.
+    """
+    results = []
+    try:
+        with transaction.atomic():
+            for index, operation in enumerate(operations):
+                try:
+                    status, body = _run_one(operation)
+                except OperationFailed as exc:
+                    results.append({'status': exc.status, 'body': {'error': str(exc)}})
+                    raise _Rollback(index)
+                results.append({'status': status, 'body': body})
+    except _Rollback as rollback:
+        return results, rollback.args[0]
+    return results, None
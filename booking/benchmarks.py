@@ -0,0 +1,425 @@
+"""
+Benchmark suite for the pages and JSON API, driven by `manage.py benchmark`.
+
+Each dataset size is generated with `seed_doctors.generate_dataset` in a
+throwaway test database.  Every scenario is then requested through the Django
+test client:
+  * `warmup` untimed runs;
+  * `iterations` timed runs, which give the latency percentiles;
+  * one instrumented run, which counts SQL queries and records peak Python
+    memory with tracemalloc.
+Results are plain dicts so they can be written as JSON and compared
+against a stored baseline.
+"""
+
+import asyncio
+import platform
+import statistics
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import nullcontext
+from datetime import timedelta
+from urllib.parse import urlsplit
+
+import django
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from .management.commands.seed_doctors import SYNTHETIC_PREFIX, generate_dataset
+from .models import Booking, Provider, TimeSlot
+
+
+SIZES = {
+    'small': {'providers': 10, 'patients': 100, 'days': 14, 'past_days': 7},
+    'medium': {'providers': 50, 'patients': 2000, 'days': 60, 'past_days': 30},
+    'large': {'providers': 200, 'patients': 10000, 'days': 180, 'past_days': 90},
+}
+
+
+class Fixtures:
+    """Ids and users the scenarios need, picked from the seeded dataset."""
+
+    def __init__(self):
+        self.provider = Provider.objects.select_related('user').order_by('id').first()
+        self.specialization = self.provider.specialization
+        booking = (
+            Booking.objects.filter(client__username__startswith=SYNTHETIC_PREFIX)
+            .select_related('client').order_by('client_id').first()
+        )
+        self.patient = booking.client
+        self.free_slots = list(
+            TimeSlot.objects.filter(is_booked=False, start_time__gte=timezone.now())
+            .order_by('start_time', 'id').values_list('id', flat=True)[:10000]
+        )
+
+
+def _get(path, user=None):
+    def run(client, fixtures):
+        return client.get(path(fixtures) if callable(path) else path)
+    run.user = user
+    return run
+
+
+def _book(client, fixtures):
+    return client.get(f'/book/{fixtures.free_slots.pop()}/')
+
+
+_book.user = 'patient'
+
+
+SCENARIOS = {
+    'slots_page': _get('/slots/'),
+    'specialization_page': _get(lambda f: f'/specialization/{f.specialization}/'),
+    'provider_detail': _get(lambda f: f'/provider/{f.provider.id}/'),
+    'my_appointments': _get('/my-appointments/', user='patient'),
+    'my_schedule': _get('/my-schedule/', user='doctor'),
+    'book_slot': _book,
+    'api_slots': _get('/api/slots/'),
+    'api_slots_filtered': _get(lambda f: f'/api/slots/?provider_id={f.provider.id}&is_booked=false'),
+    'api_slots_columnar': _get('/api/slots/?fields=id,start_time,is_booked&format=columnar'),
+    'api_providers': _get('/api/providers/'),
+    'api_bookings': _get('/api/bookings/'),
+}
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    k = (len(ordered) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def _client_for(role, fixtures):
+    client = Client()
+    if role == 'patient':
+        client.force_login(fixtures.patient)
+    elif role == 'doctor':
+        client.force_login(fixtures.provider.user)
+    return client
+
+
+def measure(fixtures, scenarios=None, iterations=20, warmup=2):
+    """Run the scenarios against the current database and return their stats."""
+    results = {}
+    for name in scenarios or SCENARIOS:
+        scenario = SCENARIOS[name]
+        client = _client_for(scenario.user, fixtures)
+        for _ in range(warmup):
+            scenario(client, fixtures)
+        samples, statuses = [], set()
+        for _ in range(iterations):
+            started = time.perf_counter()
+            response = scenario(client, fixtures)
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+            samples.append((time.perf_counter() - started) * 1000)
+            statuses.add(response.status_code)
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as queries:
+            scenario(client, fixtures)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results[name] = {
+            'iterations': iterations,
+            'p50_ms': round(_percentile(samples, 50), 3),
+            'p95_ms': round(_percentile(samples, 95), 3),
+            'p99_ms': round(_percentile(samples, 99), 3),
+            'mean_ms': round(statistics.fmean(samples), 3),
+            'queries': len(queries.captured_queries),
+            'peak_kb': round(peak / 1024, 1),
+            'status': sorted(statuses),
+        }
+    return results
+
+
+def run_suite(sizes, scenarios=None, iterations=20, warmup=2, seed=0, log=None):
+    """Seed a throwaway database per size, measure, and return a report dict."""
+    log = log or (lambda msg: None)
+    report = {
+        'meta': {
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'iterations': iterations,
+            'seed': seed,
+        },
+        'results': {},
+    }
+    setup_test_environment()
+    try:
+        for size in sizes:
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                # Page cache versions from the previous size would match the new ids.
+                cache.clear()
+                log(f'Seeding {size} dataset...')
+                counts = generate_dataset(
+                    seed=seed, start=timezone.localdate() + timedelta(days=1), **SIZES[size],
+                )
+                log(f'Measuring {size} ({counts["slots"]} slots)...')
+                report['results'][size] = {
+                    'dataset': counts,
+                    'scenarios': measure(Fixtures(), scenarios, iterations, warmup),
+                }
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+    finally:
+        teardown_test_environment()
+    return report
+
+
+def compare(report, baseline, tolerance=0.2):
+    """
+    Return regression messages: a scenario regresses when its p95 latency
+    grows by more than `tolerance` or it runs more SQL queries than the
+    baseline did on the same dataset size.
+    """
+    regressions = []
+    for size, current in report['results'].items():
+        base = baseline.get('results', {}).get(size)
+        if base is None:
+            continue
+        for name, stats in current['scenarios'].items():
+            old = base['scenarios'].get(name)
+            if old is None:
+                continue
+            if stats['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{size}/{name}: p95 {old['p95_ms']}ms -> {stats['p95_ms']}ms")
+            if stats['queries'] > old['queries']:
+                regressions.append(f"{size}/{name}: queries {old['queries']} -> {stats['queries']}")
+    return regressions
+
+
+# ── Concurrent load against running servers ──────────────────────
+# `manage.py benchmark_servers` compares deployments (for example gunicorn
+# serving myproject.wsgi and uvicorn serving myproject.asgi) by holding
+# `concurrency` connections open against each and requesting `paths` in
+# a loop for `duration` seconds.  The client is a small asyncio HTTP/1.1
+# loop so that it is not the bottleneck; it follows keep-alive when the
+# server allows it and reconnects when the server closes.
+
+DEFAULT_LOAD_PATHS = ('/api/slots/', '/api/providers/', '/api/bookings/')
+
+
+async def _read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('server closed the connection')
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif status != 304:
+        await reader.read()
+        headers['connection'] = 'close'
+    return status, headers.get('connection', '').lower() != 'close'
+
+
+async def _load_worker(host, port, paths, offset, deadline, samples, errors):
+    connection = None
+    i = offset
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection(host, port)
+            reader, writer = connection
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept: application/json\r\n\r\n'.encode())
+            await writer.drain()
+            status, keep_alive = await _read_response(reader)
+        except (OSError, ConnectionError, ValueError, asyncio.IncompleteReadError):
+            errors['connection'] += 1
+            connection = None
+            continue
+        samples.append((time.perf_counter() - started) * 1000)
+        if status >= 400:
+            errors[str(status)] += 1
+        if not keep_alive:
+            connection[1].close()
+            connection = None
+    if connection is not None:
+        connection[1].close()
+
+
+async def _load(url, paths, concurrency, duration):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    prefix = parts.path.rstrip('/')
+    paths = [prefix + path for path in paths]
+    samples, errors = [], Counter()
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(
+        _load_worker(host, port, paths, n, deadline, samples, errors) for n in range(concurrency)
+    ))
+    return samples, errors
+
+
+def load_test(url, paths=DEFAULT_LOAD_PATHS, concurrency=16, duration=10.0):
+    """Drive the server at `url` and return throughput and latency stats."""
+    samples, errors = asyncio.run(_load(url, list(paths), concurrency, duration))
+    result = {
+        'concurrency': concurrency,
+        'requests': len(samples),
+        'errors': dict(errors),
+        'rps': round(len(samples) / duration, 1),
+    }
+    if samples:
+        result.update({
+            'p50_ms': round(_percentile(samples, 50), 3),
+            'p95_ms': round(_percentile(samples, 95), 3),
+            'p99_ms': round(_percentile(samples, 99), 3),
+            'max_ms': round(max(samples), 3),
+        })
+    return result
+
+
+# ── SQLite write contention ──────────────────────────────────────
+# `manage.py benchmark_sqlite` measures booking write throughput and error
+# rates with several worker processes sharing one SQLite file, the way
+# gunicorn workers do.  Each mode gets a fresh database file, because WAL is
+# a persistent property of the file:
+#   baseline  Django's defaults: rollback journal, deferred transactions,
+#             a new connection per request, no retry;
+#   tuned     the settings in DATABASES, always with WAL, plus the retrying
+#             write path.
+# Each iteration books a slot, moves the booking and cancels it.  `move`
+# reads before it writes, which is where deferred transactions fail.
+
+SQLITE_MODES = ('baseline', 'tuned')
+
+
+def _prepare_sqlite(path, mode, slots_per_worker, workers):
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+
+    connection.close()
+    connection.settings_dict['NAME'] = str(path)
+    if mode == 'baseline':
+        connection.settings_dict['OPTIONS'] = {}
+        connection.settings_dict['CONN_MAX_AGE'] = 0
+    else:
+        options = dict(settings.DATABASES['default'].get('OPTIONS', {}))
+        # The tracked dev database keeps its rollback journal; a fresh file can take WAL.
+        if 'journal_mode=WAL' not in options.get('init_command', ''):
+            options['init_command'] = 'PRAGMA journal_mode=WAL;' + options.get('init_command', '')
+        connection.settings_dict['OPTIONS'] = options
+        connection.settings_dict['CONN_MAX_AGE'] = settings.DATABASES['default'].get('CONN_MAX_AGE', 0)
+    call_command('migrate', verbosity=0)
+    user = User.objects.create_user(username='bench_doctor')
+    provider = Provider.objects.create(user=user, specialization='therapist')
+    patients = User.objects.bulk_create(
+        [User(username=f'bench_patient_{i}') for i in range(workers)]
+    )
+    start = timezone.now().replace(second=0, microsecond=0) + timedelta(days=1)
+    TimeSlot.objects.bulk_create([
+        TimeSlot(provider=provider, start_time=start + timedelta(minutes=5 * i),
+                 end_time=start + timedelta(minutes=5 * i + 5))
+        for i in range(slots_per_worker * workers)
+    ], batch_size=1000)
+    ids = list(TimeSlot.objects.order_by('id').values_list('id', flat=True))
+    connection.close()
+    return [p.id for p in patients], [ids[w::workers] for w in range(workers)]
+
+
+def _sqlite_worker(mode, patient_id, slot_ids, deadline, results):
+    from django.db import OperationalError
+    from django.test.utils import override_settings
+
+    from . import services, writes
+
+    samples, counts = [], Counter()
+    with override_settings(SQLITE_WRITE_RETRIES=0) if mode == 'baseline' else nullcontext():
+        slots = iter(slot_ids)
+        while time.time() < deadline:
+            try:
+                first, second = next(slots), next(slots)
+            except StopIteration:
+                break
+            started = time.perf_counter()
+            try:
+                booking = services.book(patient_id, first)
+                booking = services.move(booking, second)
+                services.cancel(booking)
+                counts['ok'] += 1
+            except OperationalError as exc:
+                counts['locked' if writes.is_locked_error(exc) else 'error'] += 1
+            except Exception:
+                counts['error'] += 1
+            samples.append((time.perf_counter() - started) * 1000)
+            # End of "request": drop or keep the connection as the settings say
+            if mode == 'baseline':
+                connection.close()
+            else:
+                connection.close_if_unusable_or_obsolete()
+    connection.close()
+    results.put((samples, dict(counts)))
+
+
+def sqlite_write_load(workers=8, duration=5.0, slots_per_worker=4000, modes=SQLITE_MODES, log=None):
+    """Return `{mode: stats}` for concurrent booking writes against a fresh SQLite file per mode."""
+    import multiprocessing
+    import tempfile
+    from pathlib import Path
+
+    log = log or (lambda msg: None)
+    context = multiprocessing.get_context('fork')
+    original = dict(connection.settings_dict)
+    report = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for mode in modes:
+                log(f'Preparing {mode} database...')
+                patients, partitions = _prepare_sqlite(Path(tmp) / f'{mode}.sqlite3', mode, slots_per_worker, workers)
+                results = context.Queue()
+                deadline = time.time() + duration
+                processes = [
+                    context.Process(target=_sqlite_worker, args=(mode, patients[w], partitions[w], deadline, results))
+                    for w in range(workers)
+                ]
+                log(f'Running {mode} with {workers} workers for {duration:g}s...')
+                for process in processes:
+                    process.start()
+                collected = [results.get() for _ in processes]
+                for process in processes:
+                    process.join()
+                samples = [s for worker_samples, _ in collected for s in worker_samples]
+                counts = Counter()
+                for _, worker_counts in collected:
+                    counts.update(worker_counts)
+                attempts = sum(counts.values())
+                report[mode] = {
+                    'workers': workers,
+                    'attempts': attempts,
+                    'ok': counts['ok'],
+                    'locked': counts['locked'],
+                    'errors': counts['error'],
+                    'error_rate': round((attempts - counts['ok']) / attempts, 4) if attempts else 0.0,
+                    'ok_per_s': round(counts['ok'] / duration, 1),
+                    'p50_ms': round(_percentile(samples, 50), 3) if samples else None,
+                    'p99_ms': round(_percentile(samples, 99), 3) if samples else None,
+                }
+    finally:
+        connection.close()
+        connection.settings_dict.clear()
+        connection.settings_dict.update(original)
+    return report
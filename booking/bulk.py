@@ -0,0 +1,133 @@
+"""
+Bulk slot publishing for `POST /api/slots/`.
+
+A month of schedule arrives as one array.  Each item is parsed, then all
+items are checked for overlaps in one sort-and-sweep per provider, against
+each other and against the provider's stored slots in the affected window.
+That costs two queries in total, however many items there are.  Valid items
+are inserted with one `bulk_create` in a single transaction; invalid ones
+are reported by their index in the request.
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+from itertools import accumulate
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import summary
+from .models import Provider, TimeSlot
+from .signals import notify
+from .writes import serialized
+
+
+OVERLAP_ERROR = 'overlaps another slot of this provider'
+START_TAKEN_ERROR = 'another slot of this provider starts at that time'
+
+
+class SlotConflict(Exception):
+    """The batch collided with slots written concurrently by another request."""
+
+
+def parse_when(value, name):
+    dt = parse_datetime(value) if isinstance(value, str) else None
+    if dt is None:
+        raise ValueError(f'{name} must be an ISO 8601 datetime')
+    return timezone.make_aware(dt) if timezone.is_naive(dt) else dt
+
+
+def _parse_items(items):
+    """Return `(parsed, errors)`; parsed is `[(index, provider_id, start, end)]`."""
+    parsed, errors = [], []
+    for i, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError('each slot must be an object')
+            provider_id = int(item['provider_id'])
+            start = parse_when(item['start_time'], 'start_time')
+            end = parse_when(item['end_time'], 'end_time')
+            if end <= start:
+                raise ValueError('end_time must be after start_time')
+        except KeyError as exc:
+            errors.append({'index': i, 'error': f'{exc.args[0]} is required'})
+        except (TypeError, ValueError) as exc:
+            errors.append({'index': i, 'error': str(exc)})
+        else:
+            parsed.append((i, provider_id, start, end))
+    return parsed, errors
+
+
+def _sweep(parsed):
+    """
+    Split parsed items into accepted ones and overlap errors.
+
+    Per provider, each new interval is first checked against the stored
+    slots: they are sorted by start time with a running maximum of their
+    ends, so a bisect finds whether any stored slot starting before the new
+    end also ends after the new start.  The remaining new intervals are then
+    swept once in start order while tracking the latest accepted end.  One
+    that starts before that end overlaps an earlier item and is rejected;
+    rejected intervals don't move the end, so they can't block later items.
+    """
+    new = defaultdict(list)
+    for index, provider_id, start, end in parsed:
+        new[provider_id].append((start, end, index))
+
+    window_start = min(start for _, _, start, _ in parsed)
+    window_end = max(end for _, _, _, end in parsed)
+    stored = defaultdict(list)
+    for provider_id, start, end in TimeSlot.objects.filter(
+        provider_id__in=new.keys(), start_time__lt=window_end, end_time__gt=window_start,
+    ).values_list('provider_id', 'start_time', 'end_time'):
+        stored[provider_id].append((start, end))
+
+    accepted, errors = [], []
+    for provider_id, intervals in new.items():
+        existing = sorted(stored[provider_id])
+        starts = [start for start, _ in existing]
+        max_ends = list(accumulate((end for _, end in existing), max))
+        latest_end = None
+        for start, end, index in sorted(intervals, key=lambda iv: (iv[0], iv[2])):
+            before = bisect_left(starts, end)  # stored slots starting before this one ends
+            if (before and max_ends[before - 1] > start) or (latest_end is not None and start < latest_end):
+                errors.append({'index': index, 'error': OVERLAP_ERROR})
+                continue
+            latest_end = end
+            accepted.append((index, provider_id, start, end))
+    return accepted, errors
+
+
+@serialized
+def create_slots(items):
+    """
+    Validate and insert `items` (dicts with provider_id, start_time,
+    end_time).  Return `(created, errors)`: `created` is a list of
+    `(index, TimeSlot)` in request order, `errors` a list of
+    `{'index', 'error'}`.  Raises `SlotConflict` if a concurrent write made
+    the insert violate the (provider, start_time) constraint.
+    """
+    parsed, errors = _parse_items(items)
+    if parsed:
+        known = set(Provider.objects.filter(id__in={p for _, p, _, _ in parsed}).values_list('id', flat=True))
+        errors += [{'index': i, 'error': 'unknown provider_id'} for i, p, _, _ in parsed if p not in known]
+        parsed = [item for item in parsed if item[1] in known]
+    accepted = []
+    if parsed:
+        accepted, overlap_errors = _sweep(parsed)
+        errors += overlap_errors
+    accepted.sort()
+    created = []
+    if accepted:
+        slots = [TimeSlot(provider_id=p, start_time=s, end_time=e) for _, p, s, e in accepted]
+        try:
+            with transaction.atomic():
+                slots = TimeSlot.objects.bulk_create(slots, batch_size=1000)
+                summary.slots_added(slots)
+                notify('created', slots)
+        except IntegrityError as exc:
+            raise SlotConflict('Slots were created concurrently for the same times; retry the request.') from exc
+        created = [(index, slot) for (index, _, _, _), slot in zip(accepted, slots)]
+    errors.sort(key=lambda e: e['index'])
+    return created, errors
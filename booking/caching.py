@@ -0,0 +1,174 @@
+"""
+Versioned cache for the slot listing, specialization and provider pages.
+
+Every cache key embeds the current value of one or more version counters:
+
+    slots            the full slot listing
+    spec:<name>      slots of one specialization
+    provider:<id>    one provider's page
+
+Writes never delete cached entries.  They bump the counters their change
+touches, and entries stored under the old versions simply stop being read
+and expire.  A booking on provider 7 (a dentist) bumps `slots`,
+`spec:dentist` and `provider:7`; every other provider's page stays cached.
+Counters are bumped once the writing transaction commits, so a concurrent
+reader can't cache pre-commit data under the new version.
+
+Versions and hit/miss counters live in the default cache, so they are shared
+by every process using it.  A missing version is seeded from the clock
+rather than 0.  An evicted counter therefore can't come back with a value
+that old entries are still stored under.
+
+Anonymous GETs are served the rendered HTML.  Logged-in users get the cached
+page data (the template context) rendered fresh.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.shortcuts import render
+
+from .models import AvailabilityException, AvailabilityRule, Booking, Provider, TimeSlot
+from .signals import slots_changed
+
+
+DEFAULT_TIMEOUT = 60
+PAGES = ('slots', 'specialization', 'provider')
+
+
+def _timeout():
+    return getattr(settings, 'PAGE_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+
+
+# ── Version counters ─────────────────────────────────────────────
+def _version_key(name):
+    return f'booking:v:{name}'
+
+
+def get_versions(names):
+    keys = [_version_key(name) for name in names]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        if key not in found:
+            cache.add(key, time.time_ns(), timeout=None)
+            found[key] = cache.get(key)
+        versions.append(found[key])
+    return versions
+
+
+def bump(*names):
+    for name in names:
+        key = _version_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), timeout=None)
+
+
+def bump_on_commit(*names):
+    transaction.on_commit(lambda: bump(*names))
+
+
+def bump_providers(provider_ids):
+    """Bump every version that shows slots of `provider_ids`."""
+    provider_ids = set(provider_ids)
+    if not provider_ids:
+        return
+    specializations = set(
+        Provider.objects.filter(id__in=provider_ids).values_list('specialization', flat=True)
+    )
+    bump('slots', *(f'spec:{s}' for s in specializations), *(f'provider:{p}' for p in provider_ids))
+
+
+# ── Hit/miss counters ────────────────────────────────────────────
+def _count(page, outcome):
+    key = f'booking:stats:{page}:{outcome}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+
+
+def stats():
+    """`{page: {'hits', 'misses'}}` since the counters were last reset."""
+    keys = [f'booking:stats:{page}:{outcome}' for page in PAGES for outcome in ('hits', 'misses')]
+    found = cache.get_many(keys)
+    return {
+        page: {
+            outcome: found.get(f'booking:stats:{page}:{outcome}', 0)
+            for outcome in ('hits', 'misses')
+        }
+        for page in PAGES
+    }
+
+
+def reset_stats():
+    cache.delete_many([f'booking:stats:{page}:{outcome}' for page in PAGES for outcome in ('hits', 'misses')])
+
+
+# ── Pages ────────────────────────────────────────────────────────
+def cached_page(request, page, parts, versions, template, build_context):
+    """
+    Render `template` with the context returned by `build_context()`,
+    cached under `page`, the key `parts` and the named version counters.
+    Adds an `X-Cache: HIT|MISS` header.
+    """
+    stamp = '.'.join(str(v) for v in get_versions(versions))
+    key = f'booking:page:{page}:{":".join(str(p) for p in parts)}:{stamp}'
+    anonymous = request.method == 'GET' and not request.user.is_authenticated
+
+    if anonymous:
+        html = cache.get(f'{key}:html')
+        if html is not None:
+            _count(page, 'hits')
+            response = HttpResponse(html)
+            response['X-Cache'] = 'HIT'
+            return response
+
+    context = cache.get(f'{key}:data')
+    hit = context is not None
+    if not hit:
+        context = build_context()
+        cache.set(f'{key}:data', context, _timeout())
+    _count(page, 'hits' if hit else 'misses')
+
+    response = render(request, template, context)
+    if anonymous:
+        cache.set(f'{key}:html', response.content, _timeout())
+    response['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+
+# ── Invalidation ─────────────────────────────────────────────────
+@receiver(slots_changed)
+def _on_slots_changed(sender, event, slots, **kwargs):
+    bump_providers(slot.provider_id for slot in slots)
+
+
+@receiver([post_save, post_delete], sender=Booking)
+def _on_booking_changed(sender, instance, **kwargs):
+    provider_id = TimeSlot.objects.filter(id=instance.slot_id).values_list('provider_id', flat=True).first()
+    if provider_id is not None:
+        transaction.on_commit(lambda: bump_providers([provider_id]))
+
+
+@receiver([post_save, post_delete], sender=Provider)
+def _on_provider_changed(sender, instance, **kwargs):
+    # The old specialization isn't known after a save, and providers change
+    # rarely, so every specialization listing is refreshed.
+    specs = set(Provider.objects.values_list('specialization', flat=True).distinct())
+    specs.add(instance.specialization)
+    bump_on_commit('slots', f'provider:{instance.id}', *(f'spec:{s}' for s in specs))
+
+
+@receiver([post_save, post_delete], sender=AvailabilityRule)
+@receiver([post_save, post_delete], sender=AvailabilityException)
+def _on_rules_changed(sender, instance, **kwargs):
+    bump_on_commit(f'provider:{instance.provider_id}')
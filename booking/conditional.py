@@ -0,0 +1,91 @@
+"""
+Conditional GET for the JSON API.
+
+Every row of `TimeSlot`, `Provider` and `Booking` carries `updated_at`.
+A list response is validated with one aggregate query over the rows the
+request selects:
+  * `COUNT(*)` changes when a row is added or deleted;
+  * `MAX(updated_at)` changes when a row is written.
+The ETag hashes both values together with the request's query string.  A
+client that sends a matching `If-None-Match` gets a 304 before any row is
+loaded or serialized.
+
+Detail responses validate against the row's own `updated_at`, and they also
+send `Last-Modified`.  List responses send only an ETag.  A deletion doesn't
+move `MAX(updated_at)`, so a date alone could wrongly answer 304.
+
+Slot and provider payloads also show the provider's username, which lives
+on `User`, a table without `updated_at`.  When a username changes, the
+receivers below touch `updated_at` on the user's provider row and its slots.
+The validators then stay single-table aggregates that indexes can answer.
+"""
+
+import hashlib
+
+from django.contrib.auth.models import User
+from django.db.models import Count, Max
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .models import Provider, TimeSlot
+
+
+def _etag(*parts):
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+def _list_etag(request, queryset, stats):
+    last = stats['last'].isoformat() if stats['last'] else ''
+    return _etag(queryset.model._meta.label, stats['count'], last, sorted(request.GET.lists()))
+
+
+def list_validators(request, queryset):
+    """Return the ETag for `queryset` as selected by `request`."""
+    stats = queryset.order_by().aggregate(count=Count('pk'), last=Max('updated_at'))
+    return _list_etag(request, queryset, stats)
+
+
+async def alist_validators(request, queryset):
+    """Async version of `list_validators`."""
+    stats = await queryset.order_by().aaggregate(count=Count('pk'), last=Max('updated_at'))
+    return _list_etag(request, queryset, stats)
+
+
+def object_validators(obj):
+    """Return `(etag, last_modified)` for a single row."""
+    return _etag(obj._meta.label, obj.pk, obj.updated_at.isoformat()), int(obj.updated_at.timestamp())
+
+
+def not_modified(request, etag, last_modified=None):
+    """Return a 304 response if the client's validators match, else None."""
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    return response and set_validators(response, etag, last_modified)
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+# ── Usernames shown with providers and slots ─────────────────────
+@receiver(pre_save, sender=User)
+def _remember_username(sender, instance, update_fields=None, raw=False, **kwargs):
+    instance._username_before = None
+    if raw or instance.pk is None or (update_fields is not None and 'username' not in update_fields):
+        return  # e.g. the last_login update on every login
+    instance._username_before = User.objects.filter(pk=instance.pk).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def _on_username_changed(sender, instance, created, **kwargs):
+    before = getattr(instance, '_username_before', None)
+    if created or before is None or before == instance.username:
+        return
+    now = timezone.now()
+    Provider.objects.filter(user_id=instance.id).update(updated_at=now)
+    TimeSlot.objects.filter(provider__user_id=instance.id).update(updated_at=now)
@@ -0,0 +1,56 @@
+"""
+Streaming bulk export for the JSON API.
+
+`GET /api/<resource>/?format=ndjson` streams every matching row as one JSON
+object per line.  Rows are read with `QuerySet.values().iterator()`, so no
+model instances are built and only `EXPORT_CHUNK_SIZE` rows are held in
+memory at a time; the first line is sent before the query has finished.
+"""
+
+import json
+
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+
+EXPORT_CHUNK_SIZE = 2000
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+
+def wants_ndjson(request):
+    return request.GET.get('format', '').lower() == 'ndjson'
+
+
+def is_asgi(request):
+    """True when `request` is served by an ASGI server rather than WSGI."""
+    return isinstance(request, ASGIRequest)
+
+
+def _iter_lines(rows, serialize):
+    dumps = json.JSONEncoder(separators=(',', ':')).encode
+    for row in rows:
+        yield dumps(serialize(row)) + '\n'
+
+
+async def _aiter_lines(rows, serialize):
+    dumps = json.JSONEncoder(separators=(',', ':')).encode
+    async for row in rows:
+        yield dumps(serialize(row)) + '\n'
+
+
+def ndjson_response(queryset, fields, serialize, asynchronous=False):
+    """
+    Stream `queryset` as NDJSON.
+
+    `fields` are passed to `values()`; `serialize` turns each resulting dict
+    into the JSON-ready dict for one line.  With `asynchronous=True` the rows
+    are read with `aiterator()`, so an ASGI server streams them without
+    tying up a thread; a WSGI server needs the plain iterator, which it can
+    stream without buffering the whole body.
+    """
+    rows = queryset.values(*fields)
+    if asynchronous:
+        lines = _aiter_lines(rows.aiterator(chunk_size=EXPORT_CHUNK_SIZE), serialize)
+    else:
+        lines = _iter_lines(rows.iterator(chunk_size=EXPORT_CHUNK_SIZE), serialize)
+    return StreamingHttpResponse(lines, content_type=NDJSON_CONTENT_TYPE)
@@ -0,0 +1,193 @@
+"""
+Live slot availability feed, served as Server-Sent Events by
+`GET /api/slots/events/`.
+
+`broadcaster` keeps the last `SLOT_FEED_BUFFER` slot events of this process
+in a ring buffer.  It is fed from `signals.slots_changed`, so it sees every
+write path: bookings and cancellations, bulk creation, API and admin edits.
+Each event has an id of the form `<epoch>-<seq>`:
+
+    epoch  random per process start
+    seq    increases by one per event
+
+A client that reconnects sends the last id it saw (`Last-Event-ID`, which
+EventSource does by itself, or `?last_event_id=`) and is replayed what it
+missed.  If the id comes from another process lifetime, or is older than
+the buffer, the client gets a `reset` event instead and should re-fetch
+`/api/slots/`.
+
+Events are only seen by the process that made the write.  With several
+worker processes, a subscriber misses the other workers' writes until a
+shared transport (e.g. Redis pub/sub) replaces `publish()`.  The stream ends
+after `SLOT_FEED_MAX_SECONDS` so that proxies and workers are released.
+EventSource then reconnects with its cursor.
+
+Only ASGI servers hold the stream open.  A sync WSGI worker would be held
+for the whole stream, so under WSGI `catch_up()` answers with the missed
+events at once and asks the client to come back after `POLL_RETRY_MS`.
+"""
+
+import asyncio
+import itertools
+import json
+import secrets
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.dispatch import receiver
+
+from .models import Provider
+from .signals import slots_changed
+
+
+DEFAULT_BUFFER = 1000
+DEFAULT_MAX_SECONDS = 300
+KEEPALIVE_SECONDS = 15
+RETRY_MS = 3000
+POLL_RETRY_MS = 30000
+
+
+class Broadcaster:
+    """Thread-safe ring buffer of events that async readers can wait on."""
+
+    def __init__(self, size=DEFAULT_BUFFER):
+        self.epoch = secrets.token_hex(4)
+        self._seq = itertools.count(1)
+        self._events = deque(maxlen=size)
+        self._lock = threading.Lock()
+        self._waiters = set()
+
+    def publish(self, kind, payload):
+        with self._lock:
+            seq = next(self._seq)
+            self._events.append((seq, kind, payload))
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            loop.call_soon_threadsafe(event.set)
+        return seq
+
+    def parse_cursor(self, value):
+        """
+        Return the sequence number after which to replay, or None when the
+        cursor can't be honoured (another epoch, or older than the buffer).
+        An empty cursor means "from now on".
+        """
+        with self._lock:
+            latest = self._events[-1][0] if self._events else 0
+            if not value:
+                return latest
+            epoch, _, seq = value.partition('-')
+            if epoch != self.epoch or not seq.isdigit():
+                return None
+            seq = int(seq)
+            oldest = self._events[0][0] if self._events else latest + 1
+            if seq > latest or seq < oldest - 1:
+                return None
+            return seq
+
+    def since(self, seq):
+        with self._lock:
+            return [event for event in self._events if event[0] > seq]
+
+    async def wait(self, seq, timeout):
+        """Wait until an event newer than `seq` exists or `timeout` passes."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            if self._events and self._events[-1][0] > seq:
+                return
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+    def event_id(self, seq):
+        return f'{self.epoch}-{seq}'
+
+
+broadcaster = Broadcaster(getattr(settings, 'SLOT_FEED_BUFFER', DEFAULT_BUFFER))
+
+
+def _max_seconds():
+    return getattr(settings, 'SLOT_FEED_MAX_SECONDS', DEFAULT_MAX_SECONDS)
+
+
+# ── Filtering and framing ────────────────────────────────────────
+def _matches(payload, provider_id, specialization):
+    if provider_id is not None and payload['provider_id'] != provider_id:
+        return False
+    if specialization and payload['specialization'] != specialization:
+        return False
+    return True
+
+
+def _frame(seq, kind, payload):
+    data = json.dumps(payload, separators=(',', ':'))
+    return f'id: {broadcaster.event_id(seq)}\nevent: {kind}\ndata: {data}\n\n'
+
+
+def _reset_frame():
+    # Carries the current position so the client's next reconnect resumes from it.
+    seq = broadcaster.parse_cursor('')
+    return f'id: {broadcaster.event_id(seq)}\nevent: reset\ndata: {{}}\n\n', seq
+
+
+def _opening(cursor, retry_ms=RETRY_MS):
+    seq = broadcaster.parse_cursor(cursor)
+    if seq is None:
+        frame, seq = _reset_frame()
+        return f'retry: {retry_ms}\n\n' + frame, seq
+    return f'retry: {retry_ms}\n\n', seq
+
+
+def _pending(seq, provider_id, specialization):
+    frames = []
+    for seq, kind, payload in broadcaster.since(seq):
+        if _matches(payload, provider_id, specialization):
+            frames.append(_frame(seq, kind, payload))
+    return frames, seq
+
+
+async def astream(cursor, provider_id=None, specialization=None):
+    """Yield SSE frames until `SLOT_FEED_MAX_SECONDS` pass."""
+    opening, seq = _opening(cursor)
+    frames, seq = _pending(seq, provider_id, specialization)
+    yield opening + ''.join(frames)
+    deadline = time.monotonic() + _max_seconds()
+    while (remaining := deadline - time.monotonic()) > 0:
+        await broadcaster.wait(seq, min(KEEPALIVE_SECONDS, remaining))
+        frames, seq = _pending(seq, provider_id, specialization)
+        yield ''.join(frames) or ': keepalive\n\n'
+
+
+def catch_up(cursor, provider_id=None, specialization=None):
+    """
+    The WSGI answer: the events since `cursor` as one SSE body, without
+    waiting for new ones.  The retry hint makes EventSource poll slowly.
+    """
+    opening, seq = _opening(cursor, POLL_RETRY_MS)
+    frames, seq = _pending(seq, provider_id, specialization)
+    return opening + ''.join(frames)
+
+
+# ── Feeding the broadcaster ──────────────────────────────────────
+@receiver(slots_changed)
+def _on_slots_changed(sender, event, slots, **kwargs):
+    provider_ids = {slot.provider_id for slot in slots}
+    specializations = dict(
+        Provider.objects.filter(id__in=provider_ids).values_list('id', 'specialization')
+    )
+    for slot in slots:
+        broadcaster.publish(event, {
+            'id': slot.id,
+            'provider_id': slot.provider_id,
+            'specialization': specializations.get(slot.provider_id),
+            'start_time': slot.start_time.isoformat(),
+            'end_time': slot.end_time.isoformat(),
+            'is_booked': slot.is_booked,
+        })
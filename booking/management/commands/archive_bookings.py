@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from booking import archive
+
+
+class Command(BaseCommand):
+    help = 'Move past slots and their bookings into the archive tables, in batches; safe to stop and rerun'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help='Archive slots that started more than N days ago (default: ARCHIVE_AFTER_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=archive.DEFAULT_BATCH_SIZE, help='Slots per transaction')
+        parser.add_argument('--max-batches', type=int, help='Stop after N batches; the next run continues from there')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches, leaving the write lock to requests')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many slots would be archived')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        if options['days'] is not None and options['days'] < 0:
+            raise CommandError('--days must not be negative')
+        before = archive.cutoff(options['days'])
+        if options['dry_run']:
+            self.stdout.write(f'{archive.pending(before)} slot(s) started before {before:%Y-%m-%d %H:%M}.')
+            return
+
+        slots = bookings = batches = 0
+        for moved_slots, moved_bookings in archive.archive(before, options['batch_size'], options['max_batches']):
+            slots += moved_slots
+            bookings += moved_bookings
+            batches += 1
+            self.stdout.write(f'  batch {batches}: {moved_slots} slots, {moved_bookings} bookings')
+            if options['pause']:
+                time.sleep(options['pause'])
+        left = archive.pending(before)
+        message = f'Archived {slots} slots and {bookings} bookings in {batches} batch(es).'
+        if left:
+            self.stdout.write(self.style.WARNING(f'{message} {left} slot(s) left; run again to continue.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from booking import summary
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-provider, per-day availability counts, or check them for drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Only compare the stored counts with the slots; exit with an error on drift',
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk_create batch')
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            rows = summary.rebuild(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt availability summary: {rows} provider-days.'))
+            return
+
+        drifted = summary.drift()
+        for provider_id, day, stored, expected in drifted[:50]:
+            self.stdout.write(
+                f'  provider {provider_id} {day}: stored total/free/booked {stored}, slots say {expected}'
+            )
+        if len(drifted) > 50:
+            self.stdout.write(f'  ... and {len(drifted) - 50} more')
+        if drifted:
+            raise CommandError(f'{len(drifted)} provider-day(s) have drifted; run without --check to rebuild.')
+        self.stdout.write(self.style.SUCCESS('Availability summary matches the slots.'))
@@ -0,0 +1,72 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from booking import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the pages and API on seeded datasets and compare against a baseline'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='small',
+            help=f'Comma-separated dataset sizes ({", ".join(benchmarks.SIZES)})',
+        )
+        parser.add_argument(
+            '--scenarios',
+            help=f'Comma-separated scenarios to run (default: all of {", ".join(benchmarks.SCENARIOS)})',
+        )
+        parser.add_argument('--iterations', type=int, default=20, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=2, help='Untimed requests per scenario')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the datasets')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+        parser.add_argument('--baseline', help='JSON report to compare against')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Allowed p95 slowdown against the baseline, as a fraction (default 0.2)',
+        )
+
+    def handle(self, *args, **options):
+        sizes = options['sizes'].split(',')
+        unknown = [s for s in sizes if s not in benchmarks.SIZES]
+        if unknown:
+            raise CommandError(f'Unknown size(s): {", ".join(unknown)}')
+        scenarios = options['scenarios'].split(',') if options['scenarios'] else None
+        unknown = [s for s in scenarios or () if s not in benchmarks.SCENARIOS]
+        if unknown:
+            raise CommandError(f'Unknown scenario(s): {", ".join(unknown)}')
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1')
+
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        report = benchmarks.run_suite(
+            sizes, scenarios, iterations=options['iterations'], warmup=options['warmup'],
+            seed=options['seed'], log=self.stdout.write,
+        )
+
+        for size, result in report['results'].items():
+            self.stdout.write(f'\n{size}: {result["dataset"]}')
+            self.stdout.write(f'  {"scenario":<22}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"queries":>9}{"peak KB":>10}')
+            for name, stats in result['scenarios'].items():
+                self.stdout.write(
+                    f'  {name:<22}{stats["p50_ms"]:>10.2f}{stats["p95_ms"]:>10.2f}{stats["p99_ms"]:>10.2f}'
+                    f'{stats["queries"]:>9}{stats["peak_kb"]:>10.1f}'
+                )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f'\nReport written to {options["output"]}')
+
+        if baseline is not None:
+            regressions = benchmarks.compare(report, baseline, options['tolerance'])
+            if regressions:
+                for line in regressions:
+                    self.stderr.write(f'REGRESSION {line}')
+                raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
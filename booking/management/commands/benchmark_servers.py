@@ -0,0 +1,57 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from booking import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Compare throughput and tail latency of running deployments (e.g. WSGI vs ASGI) under concurrent load'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target', action='append', required=True, metavar='NAME=URL',
+            help='Server to drive, e.g. wsgi=http://127.0.0.1:8000 (repeat for each deployment)',
+        )
+        parser.add_argument('--concurrency', default='1,16,64', help='Comma-separated open connection counts')
+        parser.add_argument('--duration', type=float, default=10.0, help='Seconds per target and concurrency level')
+        parser.add_argument(
+            '--paths', default=','.join(benchmarks.DEFAULT_LOAD_PATHS),
+            help='Comma-separated paths requested in rotation',
+        )
+        parser.add_argument('--output', help='Write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        targets = []
+        for target in options['target']:
+            name, sep, url = target.partition('=')
+            if not sep or not url.startswith('http://'):
+                raise CommandError(f'--target must look like name=http://host:port, got {target!r}')
+            targets.append((name, url))
+        try:
+            levels = [int(n) for n in options['concurrency'].split(',')]
+        except ValueError:
+            raise CommandError('--concurrency must be comma-separated integers')
+        paths = options['paths'].split(',')
+
+        report = {'paths': paths, 'duration': options['duration'], 'results': {}}
+        for name, url in targets:
+            report['results'][name] = []
+            for concurrency in levels:
+                self.stdout.write(f'{name}: {concurrency} connections for {options["duration"]:g}s...')
+                report['results'][name].append(
+                    benchmarks.load_test(url, paths, concurrency, options['duration'])
+                )
+
+        self.stdout.write(f'\n  {"target":<10}{"conns":>7}{"req/s":>10}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"errors":>8}')
+        for name, results in report['results'].items():
+            for r in results:
+                self.stdout.write(
+                    f'  {name:<10}{r["concurrency"]:>7}{r["rps"]:>10.1f}{r.get("p50_ms", 0):>10.2f}'
+                    f'{r.get("p95_ms", 0):>10.2f}{r.get("p99_ms", 0):>10.2f}{sum(r["errors"].values()):>8}'
+                )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f'\nReport written to {options["output"]}')
@@ -0,0 +1,39 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from booking import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Compare booking write throughput and error rates on SQLite with default and tuned settings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent worker processes')
+        parser.add_argument('--duration', type=float, default=5.0, help='Seconds per mode')
+        parser.add_argument('--modes', default=','.join(benchmarks.SQLITE_MODES), help='Comma-separated: baseline,tuned')
+        parser.add_argument('--output', help='Write the JSON report to this file')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('benchmark_sqlite only applies to the SQLite backend')
+        modes = options['modes'].split(',')
+        unknown = set(modes) - set(benchmarks.SQLITE_MODES)
+        if unknown:
+            raise CommandError(f'Unknown mode(s): {", ".join(sorted(unknown))}')
+
+        report = benchmarks.sqlite_write_load(
+            workers=options['workers'], duration=options['duration'], modes=modes, log=self.stdout.write,
+        )
+
+        self.stdout.write(f'\n  {"mode":<10}{"ok/s":>9}{"ok":>8}{"locked":>8}{"errors":>8}{"err %":>8}{"p50 ms":>9}{"p99 ms":>9}')
+        for mode, r in report.items():
+            self.stdout.write(
+                f'  {mode:<10}{r["ok_per_s"]:>9.1f}{r["ok"]:>8}{r["locked"]:>8}{r["errors"]:>8}'
+                f'{r["error_rate"] * 100:>8.1f}{r["p50_ms"] or 0:>9.1f}{r["p99_ms"] or 0:>9.1f}'
+            )
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f'\nReport written to {options["output"]}')
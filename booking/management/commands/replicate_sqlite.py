@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from booking import replication
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database over the replica files (local replication stand-in)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='Repeat every N seconds (the replication lag); 0 copies once')
+
+    def handle(self, *args, **options):
+        replicas = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not replicas:
+            raise CommandError('No replicas configured; set DB_REPLICA_PATHS.')
+        while True:
+            started = time.perf_counter()
+            replication.replicate(replicas)
+            self.stdout.write(f'Replicated to {", ".join(replicas)} in {(time.perf_counter() - started) * 1000:.0f}ms')
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -8,13 +8,25 @@ Populate database with realistic sample data:
 Usage:
     python manage.py seed_doctors          # only creates what doesn't exist yet
     python manage.py seed_doctors --reset  # deletes all sample data and re-creates
+
+Synthetic load / benchmark datasets (any size option switches to this mode):
+    python manage.py seed_doctors --providers 500 --patients 20000 --days 180 \
+        --past-days 30 --density 0.3 --seed 42 --start-date 2030-01-01
+    python manage.py seed_doctors --synthetic-reset   # drop all synthetic data
+
+Synthetic users are named ``synth_dr_*`` / ``synth_pt_*`` and every row is
+written with batched ``bulk_create``.  The same seed and start date always
+produce the same doctors, slots and bookings.
 """
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
-from booking.models import Provider, TimeSlot, Booking
+from django.db import transaction
+from booking import summary
+from booking.models import PatientProfile, Provider, TimeSlot, Booking
 from django.utils import timezone
-from datetime import timedelta
+from datetime import date, datetime, time, timedelta
 import random
 
 
@@ -45,6 +57,135 @@ PATIENTS = [
 ]
 
 
+# ── Synthetic datasets ──────────────────────────────────────────
+SYNTHETIC_PREFIX = 'synth_'
+FIRST_NAMES = ['Alex', 'Maria', 'John', 'Aigerim', 'Daniel', 'Sara', 'Timur', 'Laura', 'Omar', 'Nina']
+LAST_NAMES = ['Smith', 'Kim', 'Garcia', 'Nurlanov', 'Brown', 'Ivanova', 'Lee', 'Khan', 'Moreau', 'Silva']
+DAY_START = time(9, 0)
+SLOT_MINUTES = 30
+
+
+def generate_dataset(providers, patients, days, past_days=0, slots_per_day=16, density=0.3,
+                     seed=0, start=None, batch_size=5000, log=None):
+    """
+    Bulk-insert a deterministic synthetic dataset and return row counts.
+
+    Every provider works `slots_per_day` consecutive 30-minute slots from
+    09:00 on each day from `start - past_days` to `start + days`.  About
+    `density` of the slots are booked by random patients, and a small share
+    of the free ones carry a cancelled booking.  Memory use is bounded by
+    `batch_size`, so millions of slots can be generated.
+    """
+    rng = random.Random(seed)
+    log = log or (lambda msg: None)
+    start = start or timezone.localdate() + timedelta(days=1)
+    tz = timezone.get_current_timezone()
+    specs = [code for code, _ in Provider.SPECIALIZATION_CHOICES]
+
+    def name():
+        return rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+
+    with transaction.atomic():
+        doctor_hash = make_password('doctor123')
+        doctor_users = []
+        for i in range(providers):
+            first, last = name()
+            doctor_users.append(User(
+                username=f'{SYNTHETIC_PREFIX}dr_{i:05d}', first_name=first, last_name=last,
+                email=f'{SYNTHETIC_PREFIX}dr_{i:05d}@clinic.com', password=doctor_hash,
+            ))
+        User.objects.bulk_create(doctor_users, batch_size=batch_size)
+        doctor_ids = _ids_by_username(f'{SYNTHETIC_PREFIX}dr_')
+        Provider.objects.bulk_create(
+            [Provider(user_id=uid, specialization=rng.choice(specs)) for uid in doctor_ids],
+            batch_size=batch_size,
+        )
+        provider_ids = list(Provider.objects.filter(user_id__in=doctor_ids).order_by('user_id').values_list('id', flat=True))
+        log(f'  {len(provider_ids)} providers')
+
+        patient_hash = make_password('patient123')
+        patient_users = []
+        for i in range(patients):
+            first, last = name()
+            patient_users.append(User(
+                username=f'{SYNTHETIC_PREFIX}pt_{i:06d}', first_name=first, last_name=last,
+                email=f'{SYNTHETIC_PREFIX}pt_{i:06d}@mail.com', password=patient_hash,
+            ))
+        User.objects.bulk_create(patient_users, batch_size=batch_size)
+        patient_ids = _ids_by_username(f'{SYNTHETIC_PREFIX}pt_')
+        PatientProfile.objects.bulk_create(
+            [
+                PatientProfile(user_id=uid, phone_number=f'+1555{i:07d}', is_phone_verified=True)
+                for i, uid in enumerate(patient_ids)
+            ],
+            batch_size=batch_size,
+        )
+        log(f'  {len(patient_ids)} patients')
+
+    counts = {'providers': len(provider_ids), 'patients': len(patient_ids), 'slots': 0, 'bookings': 0}
+    batch = []
+
+    def flush():
+        with transaction.atomic():
+            created = TimeSlot.objects.bulk_create(batch, batch_size=batch_size)
+            summary.slots_added(created)
+            bookings = []
+            for slot in created:
+                roll = rng.random()
+                if slot.is_booked:
+                    status = 'confirmed' if roll < 0.8 else 'pending'
+                elif patient_ids and roll < density * 0.1:
+                    status = 'cancelled'
+                else:
+                    continue
+                bookings.append(Booking(client_id=rng.choice(patient_ids), slot_id=slot.id, status=status))
+            Booking.objects.bulk_create(bookings, batch_size=batch_size)
+        counts['slots'] += len(created)
+        counts['bookings'] += len(bookings)
+        batch.clear()
+
+    first_day = start - timedelta(days=past_days)
+    for offset in range(past_days + days):
+        day = first_day + timedelta(days=offset)
+        day_start = datetime.combine(day, DAY_START, tz)
+        for provider_id in provider_ids:
+            for n in range(slots_per_day):
+                slot_start = day_start + timedelta(minutes=SLOT_MINUTES * n)
+                batch.append(TimeSlot(
+                    provider_id=provider_id,
+                    start_time=slot_start,
+                    end_time=slot_start + timedelta(minutes=SLOT_MINUTES),
+                    is_booked=bool(patient_ids) and rng.random() < density,
+                ))
+                if len(batch) >= batch_size:
+                    flush()
+        if offset % 30 == 29:
+            log(f"  ... {day} ({counts['slots']} slots so far)")
+    if batch:
+        flush()
+    log(f"  {counts['slots']} slots, {counts['bookings']} bookings")
+    return counts
+
+
+def _ids_by_username(prefix):
+    return list(User.objects.filter(username__startswith=prefix).order_by('username').values_list('id', flat=True))
+
+
+def delete_synthetic():
+    """Remove every synthetic user together with their providers, slots and bookings."""
+    users = User.objects.filter(username__startswith=SYNTHETIC_PREFIX)
+    slots = TimeSlot.objects.filter(provider__user__in=users)
+    with transaction.atomic():
+        Booking.objects.filter(slot__in=slots).delete()
+        Booking.objects.filter(client__in=users).delete()
+        # Plain SQL DELETE: the per-row post_delete signals only matter to a
+        # running server's in-memory index, and would load millions of rows.
+        slots._raw_delete(slots.db)
+        Provider.objects.filter(user__in=users).delete()
+        PatientProfile.objects.filter(user__in=users).delete()
+        users.delete()
+
+
 class Command(BaseCommand):
     help = 'Populate database with sample doctors, patients, slots and bookings'
 
@@ -54,8 +195,23 @@ class Command(BaseCommand):
             action='store_true',
             help='Delete all sample data before re-creating',
         )
+        synthetic = parser.add_argument_group('synthetic dataset')
+        synthetic.add_argument('--providers', type=int, help='Number of synthetic providers')
+        synthetic.add_argument('--patients', type=int, help='Number of synthetic patients')
+        synthetic.add_argument('--days', type=int, help='Days of future slots per provider')
+        synthetic.add_argument('--past-days', type=int, default=0, help='Days of past slots (history)')
+        synthetic.add_argument('--slots-per-day', type=int, default=16, help='30-minute slots per provider per day')
+        synthetic.add_argument('--density', type=float, default=0.3, help='Share of slots that are booked (0-1)')
+        synthetic.add_argument('--seed', type=int, default=0, help='Random seed; same seed gives the same data')
+        synthetic.add_argument('--start-date', type=date.fromisoformat, help='First future day (default: tomorrow)')
+        synthetic.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk_create batch')
+        synthetic.add_argument('--synthetic-reset', action='store_true', help='Delete all synthetic data')
 
     def handle(self, *args, **options):
+        if options['synthetic_reset'] or any(options[k] is not None for k in ('providers', 'patients', 'days')):
+            self._synthetic(options)
+            return
+
         if options['reset']:
             self._reset()
 
@@ -66,6 +222,37 @@ class Command(BaseCommand):
 
         self.stdout.write(self.style.SUCCESS('\nDone! Sample data is ready.'))
 
+    # ── Synthetic ────────────────────────────────────────────────
+    def _synthetic(self, options):
+        if not 0 <= options['density'] <= 1:
+            raise CommandError('--density must be between 0 and 1')
+        if User.objects.filter(username__startswith=SYNTHETIC_PREFIX).exists():
+            self.stdout.write(self.style.WARNING('\nRemoving previous synthetic data...'))
+            delete_synthetic()
+        if options['providers'] is None and options['patients'] is None and options['days'] is None:
+            self.stdout.write(self.style.SUCCESS('Synthetic data removed.'))
+            return
+
+        self.stdout.write('\n--- Synthetic dataset ---')
+        started = timezone.now()
+        counts = generate_dataset(
+            providers=options['providers'] or 10,
+            patients=options['patients'] or 100,
+            days=options['days'] or 14,
+            past_days=options['past_days'],
+            slots_per_day=options['slots_per_day'],
+            density=options['density'],
+            seed=options['seed'],
+            start=options['start_date'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write,
+        )
+        elapsed = (timezone.now() - started).total_seconds()
+        self.stdout.write(self.style.SUCCESS(
+            f"\nDone in {elapsed:.1f}s: {counts['providers']} providers, {counts['patients']} patients, "
+            f"{counts['slots']} slots, {counts['bookings']} bookings."
+        ))
+
     # ── Doctors ──────────────────────────────────────────────────
     def _create_doctors(self):
         self.stdout.write('\n--- Doctors ---')
@@ -0,0 +1,172 @@
+"""
+Per-request SQL instrumentation.
+
+`QueryCountMiddleware` hooks every database connection with
+`execute_wrapper`, so it works with DEBUG off.  It counts and times the
+queries a request runs, then reports the totals in two places:
+  * a `Server-Timing` header (`db;dur=...;desc="N queries"` and `app;dur=...`),
+    which browser dev tools display;
+  * one log record on the `booking.sql` logger.  The record carries the
+    numbers as `extra` fields.
+
+It also detects N+1 patterns.  SELECTs are grouped by their SQL with the
+literals and `IN (...)` lists collapsed.  A group that runs
+`N_PLUS_ONE_THRESHOLD` times or more (default 10) is logged as a warning.
+With `N_PLUS_ONE_RAISE = True` it raises
+`NPlusOneDetected` instead, which makes the request fail in tests.  A view
+that does the same work once per item on purpose (the batch API) sets
+`request.query_units` to the number of items, and the threshold then
+applies per item.
+
+Streaming responses run their queries while the body is iterated.  Those
+queries are added to the log record written when the stream ends.  The
+header can only describe the work done before the first byte.
+"""
+
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger('booking.sql')
+
+DEFAULT_N_PLUS_ONE_THRESHOLD = 10
+
+_IN_LIST = re.compile(r'\((?:\s*%s\s*,)+\s*%s\s*\)')
+_NUMBER = re.compile(r'\b\d+\b')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+
+
+class NPlusOneDetected(AssertionError):
+    """A request ran the same query shape at least `N_PLUS_ONE_THRESHOLD` times."""
+
+
+def normalize_sql(sql):
+    """Collapse literals and `IN` lists so repeated lookups share one key."""
+    sql = _STRING.sub('?', sql)
+    sql = _IN_LIST.sub('(...)', sql)
+    return _NUMBER.sub('?', sql)
+
+
+@contextmanager
+def _recording(recorder):
+    with ExitStack() as stack:
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(recorder))
+        yield
+
+
+class QueryRecorder:
+    """`execute_wrapper` callable that tallies query count, time and shapes."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            # Batched writes (bulk_create chunks) repeat by design; N+1 is about reads.
+            if sql.lstrip()[:6].upper() == 'SELECT':
+                self.shapes[normalize_sql(sql)] += 1
+
+    def repeated(self, threshold):
+        return [(sql, n) for sql, n in self.shapes.most_common() if n >= threshold]
+
+
+class QueryCountMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with _recording(recorder):
+            response = self.get_response(request)
+        return self._finish(request, response, recorder, started)
+
+    async def __acall__(self, request):
+        # Async views run their ORM calls via sync_to_async; the connection
+        # objects are shared with this context, so the wrapper still sees them.
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with _recording(recorder):
+            response = await self.get_response(request)
+        return self._finish(request, response, recorder, started)
+
+    def _finish(self, request, response, recorder, started):
+        elapsed = time.perf_counter() - started
+        response['Server-Timing'] = (
+            f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} queries", '
+            f'app;dur={elapsed * 1000:.1f}'
+        )
+        if not getattr(response, 'streaming', False):
+            self._check_repeated(request, recorder)
+            self._log(request, response, recorder, elapsed)
+        elif response.is_async:
+            response.streaming_content = self._astream(
+                request, response, response.streaming_content, recorder, started,
+            )
+        else:
+            response.streaming_content = self._stream(
+                request, response, response.streaming_content, recorder, started,
+            )
+        return response
+
+    def _stream(self, request, response, content, recorder, started):
+        with _recording(recorder):
+            yield from content
+        self._check_repeated(request, recorder)
+        self._log(request, response, recorder, time.perf_counter() - started)
+
+    async def _astream(self, request, response, content, recorder, started):
+        with _recording(recorder):
+            async for chunk in content:
+                yield chunk
+        self._check_repeated(request, recorder)
+        self._log(request, response, recorder, time.perf_counter() - started)
+
+    def _check_repeated(self, request, recorder):
+        threshold = getattr(settings, 'N_PLUS_ONE_THRESHOLD', DEFAULT_N_PLUS_ONE_THRESHOLD)
+        threshold *= getattr(request, 'query_units', 1)
+        repeated = recorder.repeated(threshold)
+        if not repeated:
+            return
+        sql, n = repeated[0]
+        message = f'Possible N+1 on {request.method} {request.path}: {n} x {sql}'
+        if getattr(settings, 'N_PLUS_ONE_RAISE', False):
+            raise NPlusOneDetected(message)
+        logger.warning(message, extra={'path': request.path, 'repeated': n, 'sql': sql})
+
+    def _log(self, request, response, recorder, elapsed):
+        logger.info(
+            '%s %s %s queries=%d db_ms=%.1f total_ms=%.1f',
+            request.method, request.path, response.status_code,
+            recorder.count, recorder.duration * 1000, elapsed * 1000,
+            extra={
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'queries': recorder.count,
+                'db_ms': round(recorder.duration * 1000, 1),
+                'total_ms': round(elapsed * 1000, 1),
+            },
+        )
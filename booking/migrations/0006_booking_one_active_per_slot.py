@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-18 04:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def cancel_double_bookings(apps, schema_editor):
+    """Keep the oldest active booking per slot so the constraint can be added."""
+    Booking = apps.get_model('booking', 'Booking')
+    seen = set()
+    duplicates = []
+    active = Booking.objects.exclude(status='cancelled').order_by('slot_id', 'created_at', 'id')
+    for booking_id, slot_id in active.values_list('id', 'slot_id').iterator():
+        if slot_id in seen:
+            duplicates.append(booking_id)
+        seen.add(slot_id)
+    Booking.objects.filter(id__in=duplicates).update(status='cancelled')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0005_patientprofile'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(cancel_double_bookings, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'cancelled'), _negated=True), fields=('slot',), name='booking_one_active_per_slot'),
+        ),
+    ]
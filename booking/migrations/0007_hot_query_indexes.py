@@ -0,0 +1,48 @@
+# Generated by Django 6.0 on 2026-10-18 04:04
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+
+def lowercase_specializations(apps, schema_editor):
+    """Specializations are matched exactly (and indexed) from now on."""
+    Provider = apps.get_model('booking', 'Provider')
+    Provider.objects.update(specialization=Lower('specialization'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0006_booking_one_active_per_slot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(lowercase_specializations, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='provider',
+            name='specialization',
+            field=models.CharField(choices=[('cardiologist', 'Cardiologist'), ('dermatologist', 'Dermatologist'), ('gynecologist', 'Gynecologist'), ('dentist', 'Dentist'), ('therapist', 'Therapist'), ('pediatrician', 'Pediatrician')], db_index=True, default='therapist', max_length=100),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['client', 'status'], name='booking_client_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status'], name='booking_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timeslot',
+            index=models.Index(fields=['start_time', 'id'], name='slot_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timeslot',
+            index=models.Index(fields=['provider', 'start_time'], name='slot_provider_start_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='timeslot',
+            index=models.Index(fields=['is_booked', 'start_time'], name='slot_booked_start_idx'),
+        ),
+    ]
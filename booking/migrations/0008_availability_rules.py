@@ -0,0 +1,99 @@
+# Generated by Django 6.0 on 2026-10-18 04:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def merge_duplicate_slots(apps, schema_editor):
+    """
+    Fold slots sharing a provider and start time into the oldest one so the
+    constraint can be added.  Their bookings move to it; of the active ones,
+    the oldest is kept and the others cancelled, as in 0006.
+    """
+    TimeSlot = apps.get_model('booking', 'TimeSlot')
+    Booking = apps.get_model('booking', 'Booking')
+    keepers = {}
+    merged = {}
+    slots = TimeSlot.objects.order_by('provider_id', 'start_time', 'id')
+    for slot_id, provider_id, start_time in slots.values_list('id', 'provider_id', 'start_time').iterator():
+        keeper = keepers.setdefault((provider_id, start_time), slot_id)
+        if keeper != slot_id:
+            merged[slot_id] = keeper
+    if not merged:
+        return
+
+    booked = set()
+    duplicates = []
+    active = (
+        Booking.objects.filter(slot_id__in=set(merged) | set(merged.values()))
+        .exclude(status='cancelled').order_by('created_at', 'id')
+    )
+    for booking_id, slot_id in active.values_list('id', 'slot_id'):
+        keeper = merged.get(slot_id, slot_id)
+        if keeper in booked:
+            duplicates.append(booking_id)
+        booked.add(keeper)
+    Booking.objects.filter(id__in=duplicates).update(status='cancelled')
+
+    by_keeper = {}
+    for slot_id, keeper in merged.items():
+        by_keeper.setdefault(keeper, []).append(slot_id)
+    for keeper, slot_ids in by_keeper.items():
+        Booking.objects.filter(slot_id__in=slot_ids).update(slot_id=keeper)
+    TimeSlot.objects.filter(id__in=booked).update(is_booked=True)
+    TimeSlot.objects.filter(id__in=merged).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0007_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailabilityException',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('start', models.TimeField(blank=True, help_text='Leave empty to block the whole day.', null=True)),
+                ('end', models.TimeField(blank=True, null=True)),
+                ('reason', models.CharField(blank=True, max_length=200)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AvailabilityRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('start', models.TimeField()),
+                ('end', models.TimeField()),
+                ('slot_minutes', models.PositiveSmallIntegerField(default=30)),
+                ('valid_from', models.DateField(blank=True, null=True)),
+                ('valid_until', models.DateField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(merge_duplicate_slots, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='timeslot',
+            name='slot_provider_start_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='timeslot',
+            constraint=models.UniqueConstraint(fields=('provider', 'start_time'), name='slot_unique_provider_start'),
+        ),
+        migrations.AddField(
+            model_name='availabilityexception',
+            name='provider',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_exceptions', to='booking.provider'),
+        ),
+        migrations.AddField(
+            model_name='availabilityrule',
+            name='provider',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_rules', to='booking.provider'),
+        ),
+        migrations.AddIndex(
+            model_name='availabilityexception',
+            index=models.Index(fields=['provider', 'date'], name='exception_provider_date_idx'),
+        ),
+    ]
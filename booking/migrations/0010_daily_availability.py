@@ -0,0 +1,55 @@
+# Generated by Django 6.0 on 2026-10-18 05:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def count_existing_slots(apps, schema_editor):
+    TimeSlot = apps.get_model('booking', 'TimeSlot')
+    DailyAvailability = apps.get_model('booking', 'DailyAvailability')
+    rows = (
+        TimeSlot.objects.annotate(day=TruncDate('start_time', tzinfo=timezone.get_current_timezone()))
+        .values('provider_id', 'day')
+        .annotate(total=Count('id'), booked=Count('id', filter=Q(is_booked=True)))
+        .order_by()
+    )
+    DailyAvailability.objects.bulk_create(
+        [
+            DailyAvailability(
+                provider_id=row['provider_id'], date=row['day'], total=row['total'],
+                free=row['total'] - row['booked'], booked=row['booked'],
+            )
+            for row in rows
+        ],
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0009_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total', models.IntegerField(default=0)),
+                ('free', models.IntegerField(default=0)),
+                ('booked', models.IntegerField(default=0)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_availability', to='booking.provider')),
+            ],
+            options={
+                'verbose_name_plural': 'daily availability',
+                'indexes': [models.Index(fields=['date'], name='daily_availability_date_idx')],
+                'constraints': [models.UniqueConstraint(fields=('provider', 'date'), name='daily_availability_provider_date')],
+            },
+        ),
+        migrations.RunPython(count_existing_slots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 05:40
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0010_daily_availability'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='patientprofile',
+            name='otp_code',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0011_remove_patientprofile_otp_code'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='provider',
+            name='photo_hash',
+            field=models.CharField(blank=True, editable=False, max_length=16),
+        ),
+    ]
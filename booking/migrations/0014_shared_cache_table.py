@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-18 14:20
+
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    # The `shared` cache (OTP codes and limits) is a DatabaseCache; create its
+    # table with the schema so a deploy's `migrate` is enough.
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0013_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, migrations.RunPython.noop),
+    ]
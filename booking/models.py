@@ -1,29 +1,12 @@
 from django.db import models
 from django.contrib.auth.models import User
-import random
 
 
 class PatientProfile(models.Model):
-    """Extra profile for patients: phone number + OTP verification."""
+    """Extra profile for patients: phone number + verification status (codes live in `otp`)."""
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='patient_profile')
     phone_number = models.CharField(max_length=20, unique=True)
     is_phone_verified = models.BooleanField(default=False)
-    otp_code = models.CharField(max_length=6, blank=True, null=True)
-
-    def generate_otp(self):
-        """Generate a 6-digit OTP code and save it."""
-        self.otp_code = str(random.randint(100000, 999999))
-        self.save()
-        return self.otp_code
-
-    def verify_otp(self, code):
-        """Check OTP and mark phone as verified."""
-        if self.otp_code and self.otp_code == code.strip():
-            self.is_phone_verified = True
-            self.otp_code = None  # Clear used code
-            self.save()
-            return True
-        return False
 
     def __str__(self):
         verified = 'verified' if self.is_phone_verified else 'unverified'
@@ -45,18 +28,91 @@ class Provider(models.Model):
         max_length=100,
         choices=SPECIALIZATION_CHOICES,
         default='therapist',
+        db_index=True,
     )
     photo = models.ImageField(upload_to='providers/', blank=True, null=True)
+    # Content hash of an uploaded raster photo, naming its resized variants
+    # (see `booking.photos`); blank when there are none.
+    photo_hash = models.CharField(max_length=16, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.user.username
 
 
+class AvailabilityRule(models.Model):
+    """
+    Recurring weekly working hours.  Slots generated from a rule are virtual
+    (see `booking.schedule`); a `TimeSlot` row is only created when one of
+    them is booked.  Times are local to `settings.TIME_ZONE`.
+    """
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+
+    provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='availability_rules')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    start = models.TimeField()
+    end = models.TimeField()
+    slot_minutes = models.PositiveSmallIntegerField(default=30)
+    valid_from = models.DateField(blank=True, null=True)
+    valid_until = models.DateField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.provider} | {self.get_weekday_display()} {self.start:%H:%M}-{self.end:%H:%M}"
+
+
+class AvailabilityException(models.Model):
+    """A day off, or a blocked part of a day, that overrides the rules."""
+    provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='availability_exceptions')
+    date = models.DateField()
+    start = models.TimeField(blank=True, null=True, help_text='Leave empty to block the whole day.')
+    end = models.TimeField(blank=True, null=True)
+    reason = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['provider', 'date'], name='exception_provider_date_idx')]
+
+    def blocks(self, start, end):
+        """True if this exception covers any part of local times `start`-`end`."""
+        if self.start is None or self.end is None:
+            return True
+        return start < self.end and end > self.start
+
+    def __str__(self):
+        span = f"{self.start:%H:%M}-{self.end:%H:%M}" if self.start and self.end else 'all day'
+        return f"{self.provider} | {self.date} {span}"
+
+
 class TimeSlot(models.Model):
     provider = models.ForeignKey(Provider, on_delete=models.CASCADE)
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
     is_booked = models.BooleanField(default=False)
+    # Also set explicitly by QuerySet.update() callers, which bypass auto_now.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination and date-range listings order by (start_time, id).
+            models.Index(fields=['start_time', 'id'], name='slot_start_idx'),
+            # Free-slot listings (?is_booked=false) in time order.
+            models.Index(fields=['is_booked', 'start_time'], name='slot_booked_start_idx'),
+        ]
+        constraints = [
+            # Also serves provider pages, schedules and ?provider_id= filters,
+            # and stops a rule-generated slot from being materialized twice.
+            models.UniqueConstraint(fields=['provider', 'start_time'], name='slot_unique_provider_start'),
+        ]
+
+    # Rows are real slots; see schedule.VirtualSlot for rule-generated ones.
+    is_virtual = False
 
     def __str__(self):
         return f"{self.provider} | {self.start_time}"
@@ -73,7 +129,81 @@ class Booking(models.Model):
     slot = models.ForeignKey(TimeSlot, on_delete=models.CASCADE)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # my_appointments: one patient's bookings, split by status.
+            models.Index(fields=['client', 'status'], name='booking_client_status_idx'),
+            models.Index(fields=['status'], name='booking_status_idx'),
+        ]
+        constraints = [
+            # At most one booking may hold a slot; cancelled ones don't count.
+            models.UniqueConstraint(
+                fields=['slot'],
+                condition=~models.Q(status='cancelled'),
+                name='booking_one_active_per_slot',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.client} booked {self.slot} ({self.get_status_display()})"
 
+
+class DailyAvailability(models.Model):
+    """
+    Slot counts per provider per local day, kept in step with `TimeSlot` by
+    `booking.summary` so listings can show "N free today" without counting
+    slots.  Rebuild or check with `manage.py availability_summary`.
+    """
+    provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='daily_availability')
+    date = models.DateField()
+    total = models.IntegerField(default=0)
+    free = models.IntegerField(default=0)
+    booked = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'daily availability'
+        indexes = [
+            # Per-specialization totals over a date range, across providers.
+            models.Index(fields=['date'], name='daily_availability_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'date'], name='daily_availability_provider_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} | {self.date}: {self.free}/{self.total} free"
+
+
+class ArchivedSlot(models.Model):
+    """
+    A past `TimeSlot` moved out of the live table by `booking.archive`.
+    Keeps the live row's id; its bookings move along as `ArchivedBooking`.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    provider = models.ForeignKey(Provider, on_delete=models.CASCADE, related_name='archived_slots')
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    is_booked = models.BooleanField(default=False)
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['start_time', 'id'], name='archived_slot_start_idx')]
+
+    def __str__(self):
+        return f"{self.provider} | {self.start_time} (archived)"
+
+
+class ArchivedBooking(models.Model):
+    """A `Booking` of an archived slot, with the live row's id."""
+    id = models.BigIntegerField(primary_key=True)
+    client = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_bookings')
+    slot = models.ForeignKey(ArchivedSlot, on_delete=models.CASCADE, related_name='bookings')
+    status = models.CharField(max_length=20, choices=Booking.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.client} booked {self.slot} ({self.get_status_display()})"
@@ -0,0 +1,154 @@
+"""
+One-time phone verification codes, kept in the cache.
+
+Nothing here touches the database; the only write in the verification flow
+is setting `PatientProfile.is_phone_verified` once a code matches.  Per
+phone number the cache holds:
+
+    booking:otp:<phone>:code      HMAC of the code (never the code itself), for OTP_TTL
+    booking:otp:<phone>:attempts  wrong guesses against the current code
+    booking:otp:<phone>:cooldown  present for OTP_RESEND_COOLDOWN after a send
+    booking:otp:<phone>:sends     sends in the current window (also kept per IP)
+
+Phone numbers are hashed into the keys.  A code is burned after
+`OTP_MAX_ATTEMPTS` wrong guesses.  Sends are also counted in fixed windows
+of `OTP_SEND_WINDOW` seconds, both per phone (`OTP_SENDS_PER_PHONE`) and per
+client IP (`OTP_SENDS_PER_IP`).  This stops the resend link from being used
+to flood a number or to run up SMS costs.  Behind a proxy, `REMOTE_ADDR` is
+the proxy.  `client_ip()` then reads the address the outermost of
+`TRUSTED_PROXY_COUNT` proxies added to `X-Forwarded-For`.  Entries further
+left are whatever the client sent, so they can't be trusted.
+
+Codes are delivered by `OTP_SMS_SENDER`, the dotted path of a callable
+`send(phone, code)`.  Until one is configured the plain code is also cached
+so the verify page can show it, as the app always did; otherwise nobody
+could verify a phone.
+
+All of it lives in the `shared` cache, which every worker process sees: a
+code issued by one worker verifies on another, and the limits are global.
+"""
+
+import hashlib
+import secrets
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.module_loading import import_string
+
+
+DEFAULTS = {
+    'OTP_TTL': 300,
+    'OTP_MAX_ATTEMPTS': 5,
+    'OTP_RESEND_COOLDOWN': 30,
+    'OTP_SEND_WINDOW': 3600,
+    'OTP_SENDS_PER_PHONE': 5,
+    'OTP_SENDS_PER_IP': 20,
+}
+
+cache = caches['shared']
+
+
+class Throttled(Exception):
+    """No code was sent; `retry_after` is the number of seconds to wait."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _setting(name):
+    return getattr(settings, name, DEFAULTS[name])
+
+
+def _sender():
+    path = getattr(settings, 'OTP_SMS_SENDER', '')
+    return import_string(path) if path else None
+
+
+def _key(phone, part):
+    digest = hashlib.sha256(phone.encode()).hexdigest()[:32]
+    return f'booking:otp:{digest}:{part}'
+
+
+def _hash(phone, code):
+    return salted_hmac('booking.otp', f'{phone}:{code}', algorithm='sha256').hexdigest()
+
+
+def _count(key, timeout):
+    """Increment a fixed-window counter, starting it if missing; return its value."""
+    if cache.add(key, 1, timeout=timeout):
+        return 1
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Expired between add() and incr(): this send opens a new window.
+        cache.set(key, 1, timeout=timeout)
+        return 1
+
+
+def client_ip(request):
+    """The client's address, as seen by the first trusted proxy in front of the app."""
+    proxies = getattr(settings, 'TRUSTED_PROXY_COUNT', 0)
+    if proxies:
+        forwarded = [part.strip() for part in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if part.strip()]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get('REMOTE_ADDR')
+
+
+def issue(phone, ip=None):
+    """
+    Create a new code for `phone`, replacing any previous one, and return it.
+    Raises `Throttled` if the phone or IP has asked too often.
+    """
+    cooldown = _setting('OTP_RESEND_COOLDOWN')
+    if cooldown and not cache.add(_key(phone, 'cooldown'), 1, timeout=cooldown):
+        raise Throttled(f'Please wait {cooldown} seconds before requesting another code.', cooldown)
+
+    window = _setting('OTP_SEND_WINDOW')
+    limits = [(_key(phone, 'sends'), _setting('OTP_SENDS_PER_PHONE'))]
+    if ip:
+        limits.append((f'booking:otp:ip:{ip}:sends', _setting('OTP_SENDS_PER_IP')))
+    for key, limit in limits:
+        if _count(key, window) > limit:
+            raise Throttled('Too many codes requested. Please try again later.', window)
+
+    code = f'{secrets.randbelow(1_000_000):06d}'
+    ttl = _setting('OTP_TTL')
+    entries = {_key(phone, 'code'): _hash(phone, code)}
+    send = _sender()
+    if send is None:
+        entries[_key(phone, 'hint')] = code
+    cache.set_many(entries, timeout=ttl)
+    cache.delete(_key(phone, 'attempts'))
+    if send is not None:
+        send(phone, code)
+    return code
+
+
+def verify(phone, code):
+    """
+    Return True if `code` is the current code for `phone`, consuming it.
+    Wrong guesses count against `OTP_MAX_ATTEMPTS`; then the code is burned.
+    """
+    stored = cache.get(_key(phone, 'code'))
+    if stored is None:
+        return False
+    attempts = _count(_key(phone, 'attempts'), _setting('OTP_TTL'))
+    if attempts > _setting('OTP_MAX_ATTEMPTS'):
+        clear(phone)
+        return False
+    if not constant_time_compare(stored, _hash(phone, code.strip())):
+        return False
+    clear(phone)
+    return True
+
+
+def hint(phone):
+    """The plain current code when no SMS sender is configured, else None."""
+    return cache.get(_key(phone, 'hint')) if _sender() is None else None
+
+
+def clear(phone):
+    cache.delete_many([_key(phone, part) for part in ('code', 'hint', 'attempts')])
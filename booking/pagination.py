@@ -0,0 +1,89 @@
+"""
+Keyset (cursor) pagination for the JSON API.
+
+A cursor is an opaque, URL-safe token that encodes the ordering key of the
+last row on a page — `(start_time, id)` for slots.  The next page is fetched
+with a `WHERE (start_time, id) > (cursor)` filter instead of an OFFSET, so
+every page costs the same no matter how deep the client walks.  Other
+querysets can page on a related start time (`field='slot__start_time'`), and
+newest first with `descending=True`.
+"""
+
+import base64
+from datetime import datetime
+from operator import attrgetter
+
+from django.db.models import Q
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+class InvalidCursor(ValueError):
+    """Raised when a cursor or page size from the query string is malformed."""
+
+
+def encode_cursor(start_time, pk):
+    raw = f"{start_time.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return `(start_time, id)` from a cursor produced by `encode_cursor`."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        start, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(start), int(pk)
+    except (ValueError, UnicodeDecodeError) as exc:
+        raise InvalidCursor('Invalid cursor') from exc
+
+
+def parse_limit(value):
+    if value in (None, ''):
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(value)
+    except ValueError as exc:
+        raise InvalidCursor('limit must be an integer') from exc
+    if limit < 1:
+        raise InvalidCursor('limit must be positive')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def paginate_by_start_time(queryset, cursor=None, limit=DEFAULT_PAGE_SIZE, field='start_time', descending=False):
+    """
+    Return `(rows, next_cursor)` for one page of `queryset`.
+
+    Rows are ordered by `(field, id)`, reversed if `descending`;
+    `next_cursor` is None on the last page.  One extra row is fetched to tell
+    whether another page exists.
+    """
+    rows = list(_page_query(queryset, cursor, limit, field, descending))
+    return _split_page(rows, limit, field)
+
+
+async def apaginate_by_start_time(queryset, cursor=None, limit=DEFAULT_PAGE_SIZE, field='start_time', descending=False):
+    """Async version of `paginate_by_start_time`, for async views."""
+    rows = [row async for row in _page_query(queryset, cursor, limit, field, descending)]
+    return _split_page(rows, limit, field)
+
+
+def _page_query(queryset, cursor, limit, field, descending):
+    sign, op = ('-', 'lt') if descending else ('', 'gt')
+    queryset = queryset.order_by(f'{sign}{field}', f'{sign}id')
+    if cursor:
+        start_time, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{f'{field}__{op}': start_time}) | Q(**{field: start_time, f'id__{op}': pk})
+        )
+    return queryset[:limit + 1]
+
+
+def _split_page(rows, limit, field):
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(attrgetter(field.replace('__', '.'))(last), last.id)
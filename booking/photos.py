@@ -0,0 +1,128 @@
+"""
+Resized provider photos.
+
+Listing pages show provider photos at 100 CSS pixels.  Each uploaded photo
+gets square crops at `WIDTHS` (1x, 2x and 3x of that), in WebP and JPEG:
+
+    providers/variants/<photo_hash>/<width>.<ext>
+
+`photo_hash` is the start of the SHA-256 of the uploaded file, stored on
+`Provider` when the photo is saved.  A new photo means new URLs, so
+`provider_photo` serves variants with a one-year immutable Cache-Control.
+The variants are rendered once the saving transaction commits.  A variant
+that is still missing (an older upload, a wiped media directory) is rendered
+on its first request.
+
+Files Pillow can't read, like the SVG placeholders, get no hash and no
+variants.  Templates then show the original.  Render a photo with
+`{% provider_photo provider %}` from the `booking_photos` tag library.
+"""
+
+import hashlib
+import io
+import logging
+import re
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models.signals import post_save, pre_save
+from django.dispatch import receiver
+from django.urls import reverse
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from .models import Provider
+
+
+logger = logging.getLogger('booking.photos')
+
+DISPLAY_SIZE = 100
+WIDTHS = (100, 200, 300)
+# ext -> (Pillow format, content type, save options)
+FORMATS = {
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 6}),
+    'jpg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_HASH_RE = re.compile(r'[0-9a-f]{16}')
+
+
+def is_hash(value):
+    return bool(_HASH_RE.fullmatch(value))
+
+
+def content_hash(file):
+    """Hash of an uploaded image file, or '' if Pillow can't read it."""
+    try:
+        file.seek(0)
+        Image.open(file)
+    except (UnidentifiedImageError, OSError):
+        return ''
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()[:16]
+
+
+def variant_name(photo_hash, width, ext):
+    return f'providers/variants/{photo_hash}/{width}.{ext}'
+
+
+def url(provider, width, ext):
+    return reverse('provider_photo', args=[provider.id, provider.photo_hash, width, ext])
+
+
+def srcset(provider, ext):
+    return ', '.join(f'{url(provider, width, ext)} {width}w' for width in WIDTHS)
+
+
+def render(source, width, ext):
+    """Crop `source` to a `width` pixel square and encode it as `ext`."""
+    image_format, _, options = FORMATS[ext]
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        image = ImageOps.fit(image, (width, width), Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **options)
+    return buffer.getvalue()
+
+
+def ensure(provider, width, ext):
+    """Render one variant of `provider.photo` unless it exists; return its storage name."""
+    storage = provider.photo.storage
+    name = variant_name(provider.photo_hash, width, ext)
+    if not storage.exists(name):
+        with provider.photo.open('rb') as source:
+            data = render(source, width, ext)
+        saved = storage.save(name, ContentFile(data))
+        if saved != name:
+            # Another worker wrote it first and the storage picked a new name.
+            storage.delete(saved)
+    return name
+
+
+def generate(provider):
+    for width in WIDTHS:
+        for ext in FORMATS:
+            try:
+                ensure(provider, width, ext)
+            except (OSError, ValueError):
+                logger.exception('Could not render %s for provider %s', variant_name(provider.photo_hash, width, ext), provider.id)
+                return
+
+
+@receiver(pre_save, sender=Provider)
+def _hash_photo(sender, instance, **kwargs):
+    if not instance.photo:
+        instance.photo_hash = ''
+    elif not instance.photo._committed:
+        # A new upload, not yet written to storage.
+        instance.photo_hash = content_hash(instance.photo)
+        instance._photo_uploaded = True
+
+
+@receiver(post_save, sender=Provider)
+def _render_variants(sender, instance, **kwargs):
+    if instance.__dict__.pop('_photo_uploaded', False) and instance.photo_hash:
+        transaction.on_commit(lambda: generate(instance))
@@ -0,0 +1,115 @@
+"""
+Who the current user is, in booking terms: `request.principal`.
+
+`PrincipalMiddleware` attaches a lazy `Principal` to every request.  It
+carries the role, provider id and phone verification state that views and
+templates used to look up one by one.  The first access loads it with one
+query (the user's provider and patient profile, both LEFT JOINed).  It is
+then kept in the session for `PRINCIPAL_CACHE_TIMEOUT` seconds, so later
+requests cost no query at all, whichever worker serves them.  Requests that
+never look at it don't load it.
+
+A view that changes the current user's provider or patient profile calls
+`forget(request)`, so the next access reloads it.  Changes made from
+another session (the admin, the API) show up once the entry times out.
+"""
+
+import time
+from dataclasses import asdict, dataclass
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.functional import SimpleLazyObject
+
+
+DEFAULT_TIMEOUT = 300
+SESSION_KEY = '_booking_principal'
+
+
+@dataclass(frozen=True)
+class Principal:
+    user_id: int | None = None
+    provider_id: int | None = None
+    phone_number: str | None = None
+    phone_verified: bool = False
+
+    @property
+    def is_authenticated(self):
+        return self.user_id is not None
+
+    @property
+    def is_doctor(self):
+        return self.provider_id is not None
+
+    @property
+    def is_patient(self):
+        return self.phone_number is not None
+
+    @property
+    def role(self):
+        if not self.is_authenticated:
+            return 'anonymous'
+        if self.is_doctor:
+            return 'doctor'
+        return 'patient' if self.is_patient else 'user'
+
+    @property
+    def can_book(self):
+        """Doctors can always book; patients once their phone is verified."""
+        return self.is_doctor or self.phone_verified
+
+
+ANONYMOUS = Principal()
+
+
+def load(user_id):
+    """Build the principal for `user_id` from the database (one query)."""
+    row = (
+        User.objects.filter(id=user_id)
+        .values('provider__id', 'patient_profile__phone_number', 'patient_profile__is_phone_verified')
+        .first()
+    )
+    if row is None:
+        return ANONYMOUS
+    return Principal(
+        user_id=user_id,
+        provider_id=row['provider__id'],
+        phone_number=row['patient_profile__phone_number'],
+        phone_verified=bool(row['patient_profile__is_phone_verified']),
+    )
+
+
+def get_principal(request):
+    user = request.user
+    if not user.is_authenticated:
+        return ANONYMOUS
+    stored = request.session.get(SESSION_KEY)
+    timeout = getattr(settings, 'PRINCIPAL_CACHE_TIMEOUT', DEFAULT_TIMEOUT)
+    if stored and stored['user_id'] == user.id and time.time() - stored['loaded_at'] < timeout:
+        return Principal(**{name: value for name, value in stored.items() if name != 'loaded_at'})
+    principal = load(user.id)
+    request.session[SESSION_KEY] = {**asdict(principal), 'loaded_at': time.time()}
+    return principal
+
+
+def forget(request):
+    """Drop the principal kept in `request`'s session; the next access reloads it."""
+    request.session.pop(SESSION_KEY, None)
+    _attach(request)
+
+
+def _attach(request):
+    request.principal = SimpleLazyObject(lambda: get_principal(request))
+
+
+class PrincipalMiddleware(MiddlewareMixin):
+    """Set `request.principal`; must come after `AuthenticationMiddleware`."""
+
+    def process_request(self, request):
+        _attach(request)
+
+
+def principal(request):
+    """Template context processor: `{{ principal.role }}` and friends."""
+    return {'principal': getattr(request, 'principal', ANONYMOUS)}
@@ -0,0 +1,97 @@
+"""
+Sparse fieldsets and columnar output for the JSON API list endpoints.
+
+`?fields=id,start_time` limits each row to the named fields.  Only their
+columns are selected with `values_list()`, and no model instances are
+built.  `?format=columnar` sends the field names once and one array of
+values per field, instead of a repeated-key object per row:
+
+    {"fields": ["id", "start_time"], "columns": {"id": [1, 2], "start_time": ["...", "..."]}}
+
+A `Projection` maps each public field name to the ORM lookup it reads and
+an optional function that makes the value JSON-ready.
+"""
+
+from django.http import JsonResponse
+
+
+COLUMNAR = 'columnar'
+
+
+class InvalidFields(ValueError):
+    """Raised when `?fields=` names a field the resource doesn't have."""
+
+
+def isoformat(value):
+    return value.isoformat()
+
+
+class Projection:
+    def __init__(self, **fields):
+        # name -> (lookup, convert); keyword order is the default field order.
+        self.fields = fields
+
+    def parse(self, value):
+        """Return the requested field names, in request order; all when empty."""
+        if not value:
+            return list(self.fields)
+        names = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+        unknown = [name for name in names if name not in self.fields]
+        if unknown or not names:
+            raise InvalidFields(
+                f"Unknown field(s): {', '.join(unknown) or value!r}. Available: {', '.join(self.fields)}"
+            )
+        return names
+
+    def lookups(self, names, required=()):
+        """ORM lookups to select for `names`, plus any `required` for ordering or cursors."""
+        lookups = [self.fields[name][0] for name in names]
+        return list(dict.fromkeys([*lookups, *required]))
+
+    def _getters(self, names, lookups):
+        getters = []
+        for name in names:
+            lookup, convert = self.fields[name]
+            index = lookups.index(lookup)
+            getters.append((name, index, convert))
+        return getters
+
+    def rows(self, names, lookups, rows):
+        """Turn `values_list(*lookups)` tuples into one dict per row."""
+        getters = self._getters(names, lookups)
+        return [
+            {name: convert(row[i]) if convert else row[i] for name, i, convert in getters}
+            for row in rows
+        ]
+
+    def columns(self, names, lookups, rows):
+        """Turn `values_list(*lookups)` tuples into one list per field."""
+        columns = {}
+        for name, i, convert in self._getters(names, lookups):
+            values = [row[i] for row in rows]
+            columns[name] = [convert(v) for v in values] if convert else values
+        return columns
+
+    def serializer(self, names, lookups):
+        """Per-row function for `values(*lookups)` dicts, as `export.ndjson_response` needs."""
+        getters = [(name, self.fields[name][0], self.fields[name][1]) for name in names]
+        return lambda row: {
+            name: convert(row[lookup]) if convert else row[lookup] for name, lookup, convert in getters
+        }
+
+
+def wants_columnar(request):
+    return request.GET.get('format', '').lower() == COLUMNAR
+
+
+def list_response(projection, names, lookups, rows, columnar, **extra):
+    """
+    JSON response for a list of `values_list` rows.  `extra` (e.g. `next`)
+    is added alongside the data; without it, row output is a bare array.
+    """
+    if columnar:
+        return JsonResponse({'fields': names, 'columns': projection.columns(names, lookups, rows), **extra})
+    data = projection.rows(names, lookups, rows)
+    if extra:
+        return JsonResponse({'results': data, **extra})
+    return JsonResponse(data, safe=False)
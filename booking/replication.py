@@ -0,0 +1,44 @@
+"""
+Local replication stand-in for SQLite replicas.
+
+A real deployment replicates with its database (streaming replication,
+LiteFS, Litestream restores...).  For local testing, `copy_database()`
+takes a consistent snapshot of the primary file into each replica file with
+SQLite's online backup API.  `manage.py replicate_sqlite` runs it in a loop,
+and the loop interval acts as the replication lag.
+"""
+
+import sqlite3
+import time
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def _path(alias):
+    name = str(connections[alias].settings_dict['NAME'])
+    return name.removeprefix('file:').split('?', 1)[0]
+
+
+def copy_database(source, target, retries=20, delay=0.05):
+    """Copy the SQLite file `source` over `target`, retrying while readers hold it."""
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        for attempt in range(retries + 1):
+            try:
+                src.backup(dst)
+                return
+            except sqlite3.OperationalError:
+                if attempt == retries:
+                    raise
+                time.sleep(delay)
+    finally:
+        dst.close()
+        src.close()
+
+
+def replicate(replicas):
+    """Copy the primary over every replica alias in `replicas`."""
+    primary = _path(DEFAULT_DB_ALIAS)
+    for alias in replicas:
+        copy_database(primary, _path(alias))
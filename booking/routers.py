@@ -0,0 +1,124 @@
+"""
+Primary/replica database routing.
+
+Writes always go to `default`, the primary.  Reads made while serving a
+GET/HEAD/OPTIONS request go to one of the aliases in
+`settings.DATABASE_REPLICAS`, picked at random.  With no replicas
+configured, everything stays on `default`.
+
+Reads stay on the primary when:
+  * they happen outside a request (management commands, scripts);
+  * they run inside a transaction on the primary (the booking engine reads
+    the rows it just wrote);
+  * the request isn't a GET/HEAD/OPTIONS, or has already written (the
+    booking link is a GET);
+  * the client wrote something in the last `REPLICA_STICKY_SECONDS`.
+    `ReplicaRoutingMiddleware` sets a short-lived cookie on any response
+    whose request wrote to the primary.  While the cookie lives, that
+    client's reads use the primary, so a patient who has just booked sees
+    the booking on `my_appointments` even if the replicas lag behind.
+
+The database cache table (`django_cache`) is always read from the primary.
+It holds short-lived state, like OTP codes, that a replica would serve stale.
+
+Keep `REPLICA_STICKY_SECONDS` above the worst replication lag.  Cached pages
+built from a replica can trail a write by up to that lag, on top of the
+page cache timeout.
+"""
+
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+STICKY_COOKIE = 'booking_primary'
+DEFAULT_STICKY_SECONDS = 10
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+CACHE_APP_LABEL = 'django_cache'
+
+
+class _RoutingState:
+    def __init__(self, pinned):
+        self.pinned = pinned
+        self.wrote = False
+
+
+_state = ContextVar('booking_routing_state', default=None)
+
+
+def _replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = _replicas()
+        if not replicas or model._meta.app_label == CACHE_APP_LABEL:
+            return DEFAULT_DB_ALIAS
+        state = _state.get()
+        if state is None or state.pinned or state.wrote or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None and model._meta.app_label != CACHE_APP_LABEL:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema by replication.
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaRoutingMiddleware:
+    """Pin unsafe requests and recent writers to the primary; must wrap the session middleware."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.set(None)
+        return self._finish(state, response)
+
+    async def __acall__(self, request):
+        state = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.set(None)
+        return self._finish(state, response)
+
+    def _start(self, request):
+        state = _RoutingState(
+            pinned=request.method not in SAFE_METHODS or STICKY_COOKIE in request.COOKIES,
+        )
+        _state.set(state)
+        return state
+
+    def _finish(self, state, response):
+        if state.wrote and _replicas():
+            response.set_cookie(
+                STICKY_COOKIE, '1',
+                max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', DEFAULT_STICKY_SECONDS),
+                httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,155 @@
+"""
+Expand recurring `AvailabilityRule`s into virtual slots.
+
+Instead of storing a `TimeSlot` row for every 30 minutes of every working
+day, providers describe their weekly hours once.  Listings expand the rules
+for the window being shown; `services.book_at` creates the concrete row only
+when a virtual slot is booked.  A virtual slot is hidden wherever a concrete
+slot of the same provider already overlaps it.
+"""
+
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from .models import AvailabilityException, AvailabilityRule, Provider, TimeSlot
+
+
+MAX_WINDOW_DAYS = 31
+
+
+class VirtualSlot:
+    """A free slot generated from a rule; quacks like an unbooked TimeSlot."""
+    id = None
+    is_booked = False
+    is_virtual = True
+
+    def __init__(self, provider_id, start_time, end_time, provider=None):
+        self.provider_id = provider_id
+        self.start_time = start_time
+        self.end_time = end_time
+        self.provider = provider
+
+    @property
+    def timestamp(self):
+        return int(self.start_time.timestamp())
+
+    def __repr__(self):
+        return f"<VirtualSlot provider={self.provider_id} {self.start_time.isoformat()}>"
+
+
+def load_rules(provider_ids):
+    """Return `{provider_id: [AvailabilityRule, ...]}`."""
+    rules = defaultdict(list)
+    for rule in AvailabilityRule.objects.filter(provider_id__in=provider_ids):
+        rules[rule.provider_id].append(rule)
+    return rules
+
+
+def load_exceptions(provider_ids, first_day, last_day):
+    """Return `{provider_id: {date: [AvailabilityException, ...]}}`."""
+    exceptions = defaultdict(lambda: defaultdict(list))
+    queryset = AvailabilityException.objects.filter(
+        provider_id__in=provider_ids, date__range=(first_day, last_day),
+    )
+    for exc in queryset:
+        exceptions[exc.provider_id][exc.date].append(exc)
+    return exceptions
+
+
+def _day_slots(rules, day, exceptions):
+    """`(start, end)` pairs generated by `rules` on local date `day`, in order."""
+    tz = timezone.get_current_timezone()
+    pairs = []
+    for rule in rules:
+        if rule.weekday != day.weekday():
+            continue
+        if (rule.valid_from and day < rule.valid_from) or (rule.valid_until and day > rule.valid_until):
+            continue
+        step = timedelta(minutes=rule.slot_minutes)
+        start = datetime.combine(day, rule.start, tz)
+        close = datetime.combine(day, rule.end, tz)
+        while start + step <= close:
+            pairs.append((start, start + step))
+            start += step
+    blocked = exceptions.get(day, ())
+    for start, end in sorted(pairs):
+        if not any(exc.blocks(start.time(), end.time()) for exc in blocked):
+            yield start, end
+
+
+def iter_rule_slots(rules, exceptions, after, until):
+    """
+    Lazily yield `(start, end)` for one provider's rule-generated slots with
+    `after <= start < until`, in time order, one day at a time.
+    """
+    if not rules:
+        return
+    day = timezone.localtime(after).date()
+    last = timezone.localtime(until).date()
+    while day <= last:
+        for start, end in _day_slots(rules, day, exceptions):
+            if start >= until:
+                return
+            if start >= after:
+                yield start, end
+        day += timedelta(days=1)
+
+
+def concrete_intervals(provider_ids, start, end):
+    """`{provider_id: sorted [(start, end)]}` of stored slots touching the window."""
+    intervals = defaultdict(list)
+    rows = TimeSlot.objects.filter(
+        provider_id__in=provider_ids, start_time__lt=end, end_time__gt=start,
+    ).order_by('start_time').values_list('provider_id', 'start_time', 'end_time')
+    for provider_id, slot_start, slot_end in rows:
+        intervals[provider_id].append((slot_start, slot_end))
+    return intervals
+
+
+def overlaps_any(intervals, start, end):
+    """True if `start`-`end` overlaps one of the sorted, non-overlapping `intervals`."""
+    i = bisect_left(intervals, (end,))
+    return i > 0 and intervals[i - 1][1] > start
+
+
+def expand(provider_ids, start, end, providers=None):
+    """
+    Return the virtual slots of `provider_ids` starting in `[start, end)`,
+    sorted by time.  Four queries regardless of the window size.
+    """
+    provider_ids = list(provider_ids)
+    if providers is None:
+        providers = Provider.objects.select_related('user').in_bulk(provider_ids)
+    rules = load_rules(provider_ids)
+    if not rules:
+        return []
+    exceptions = load_exceptions(
+        rules.keys(), timezone.localtime(start).date(), timezone.localtime(end).date(),
+    )
+    taken = concrete_intervals(rules.keys(), start, end)
+    slots = []
+    for provider_id, provider_rules in rules.items():
+        for slot_start, slot_end in iter_rule_slots(provider_rules, exceptions[provider_id], start, end):
+            if not overlaps_any(taken[provider_id], slot_start, slot_end):
+                slots.append(VirtualSlot(provider_id, slot_start, slot_end, providers.get(provider_id)))
+    slots.sort(key=lambda s: (s.start_time, s.provider_id))
+    return slots
+
+
+def rule_slot_at(provider_id, start_time):
+    """Return `(start, end)` if the provider's rules generate a slot at `start_time`."""
+    day = timezone.localtime(start_time).date()
+    rules = load_rules([provider_id]).get(provider_id, [])
+    exceptions = load_exceptions([provider_id], day, day)[provider_id]
+    for start, end in _day_slots(rules, day, exceptions):
+        if start == start_time:
+            return start, end
+    return None
+
+
+def merge(concrete, virtual):
+    """Merge two time-ordered slot sequences into one list."""
+    return sorted([*concrete, *virtual], key=lambda s: s.start_time)
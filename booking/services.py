@@ -0,0 +1,160 @@
+"""
+Booking engine: the only code that changes who holds a slot.
+
+A slot is claimed with a single conditional UPDATE
+(`... SET is_booked = 1 WHERE id = ? AND is_booked = 0`), so two requests
+racing for the same slot cannot both win: the database serializes the
+writes and the loser sees zero affected rows.  The partial unique constraint
+on `Booking.slot` (one non-cancelled booking per slot) backs this up at the
+schema level.  Every function runs in one transaction, so `TimeSlot.is_booked`
+and the bookings pointing at it never drift apart; the per-day counts in
+`DailyAvailability` are adjusted in the same transaction.  Public functions
+go through `writes.serialized`, which queues and retries them on SQLite.
+
+Conditional UPDATEs don't fire `post_save`, so each change is announced
+through `signals.slots_changed` once the transaction commits.
+"""
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import schedule, summary
+from .models import Booking, TimeSlot
+from .signals import notify
+from .writes import serialized
+
+
+class SlotNotFound(LookupError):
+    """The requested slot does not exist."""
+
+
+class SlotUnavailable(Exception):
+    """The requested slot is already held by another booking."""
+
+
+def _claim(slot_id):
+    """Mark a free slot as booked and return it; raise if missing or taken."""
+    if TimeSlot.objects.filter(id=slot_id, is_booked=False).update(is_booked=True, updated_at=timezone.now()):
+        slot = TimeSlot.objects.get(id=slot_id)
+        summary.slot_booked(slot)
+        notify('booked', [slot])
+        return slot
+    if TimeSlot.objects.filter(id=slot_id).exists():
+        raise SlotUnavailable(f'Slot {slot_id} is already booked.')
+    raise SlotNotFound(f'Slot {slot_id} does not exist.')
+
+
+def _release(slot_id):
+    if TimeSlot.objects.filter(id=slot_id, is_booked=True).update(is_booked=False, updated_at=timezone.now()):
+        slot = TimeSlot.objects.get(id=slot_id)
+        summary.slot_freed(slot)
+        notify('freed', [slot])
+
+
+@serialized
+def book(client_id, slot_id, status='confirmed'):
+    """Create an active booking for `slot_id`, claiming the slot atomically."""
+    try:
+        with transaction.atomic():
+            slot = _claim(slot_id)
+            return Booking.objects.create(client_id=client_id, slot=slot, status=status)
+    except IntegrityError as exc:
+        raise SlotUnavailable(f'Slot {slot_id} is already booked.') from exc
+
+
+@serialized
+def book_at(client_id, provider_id, start_time, status='confirmed'):
+    """
+    Book the rule-generated (virtual) slot of `provider_id` at `start_time`,
+    creating its `TimeSlot` row first.  The unique (provider, start_time)
+    constraint makes concurrent materializations converge on one row.
+    """
+    found = schedule.rule_slot_at(provider_id, start_time)
+    if found is None:
+        raise SlotNotFound(f'Provider {provider_id} has no slot at {start_time.isoformat()}.')
+    start, end = found
+    overlapping = TimeSlot.objects.filter(
+        provider_id=provider_id, start_time__lt=end, end_time__gt=start,
+    ).exclude(start_time=start)
+    if overlapping.exists():
+        raise SlotUnavailable(f'Provider {provider_id} is not free at {start.isoformat()}.')
+    try:
+        with transaction.atomic():
+            slot, _ = TimeSlot.objects.get_or_create(
+                provider_id=provider_id, start_time=start, defaults={'end_time': end},
+            )
+    except IntegrityError:
+        slot = TimeSlot.objects.get(provider_id=provider_id, start_time=start)
+    return book(client_id, slot.id, status=status)
+
+
+@serialized
+def move(booking, new_slot_id):
+    """Move `booking` to another slot, freeing the old one."""
+    new_slot_id = int(new_slot_id)
+    if new_slot_id == booking.slot_id:
+        return booking
+    try:
+        with transaction.atomic():
+            booking = Booking.objects.select_for_update().get(id=booking.id)
+            old_slot_id = booking.slot_id
+            if booking.status != 'cancelled':
+                _claim(new_slot_id)
+                _release(old_slot_id)
+            elif not TimeSlot.objects.filter(id=new_slot_id).exists():
+                raise SlotNotFound(f'Slot {new_slot_id} does not exist.')
+            booking.slot_id = new_slot_id
+            booking.save(update_fields=['slot', 'updated_at'])
+    except IntegrityError as exc:
+        raise SlotUnavailable(f'Slot {new_slot_id} is already booked.') from exc
+    return booking
+
+
+@serialized
+def set_status(booking, status):
+    """
+    Change a booking's status.  Cancelling frees the slot; re-activating a
+    cancelled booking has to claim it again.
+    """
+    try:
+        with transaction.atomic():
+            booking = Booking.objects.select_for_update().get(id=booking.id)
+            was_active = booking.status != 'cancelled'
+            is_active = status != 'cancelled'
+            if was_active and not is_active:
+                _release(booking.slot_id)
+            elif is_active and not was_active:
+                _claim(booking.slot_id)
+            booking.status = status
+            booking.save(update_fields=['status', 'updated_at'])
+    except IntegrityError as exc:
+        raise SlotUnavailable(f'Slot {booking.slot_id} is already booked.') from exc
+    return booking
+
+
+@serialized
+def update(booking, slot_id=None, status=None, client_id=None):
+    """Apply a booking edit (move, status change, new client) in one transaction."""
+    with transaction.atomic():
+        if slot_id is not None:
+            booking = move(booking, slot_id)
+        if status is not None:
+            booking = set_status(booking, status)
+        if client_id is not None:
+            booking.client_id = client_id
+            booking.save(update_fields=['client', 'updated_at'])
+    return booking
+
+
+def cancel(booking):
+    return set_status(booking, 'cancelled')
+
+
+@serialized
+def delete(booking):
+    """Delete `booking`, freeing its slot if the booking was holding it."""
+    with transaction.atomic():
+        booking = Booking.objects.select_for_update().get(id=booking.id)
+        if booking.status != 'cancelled':
+            _release(booking.slot_id)
+        booking.delete()
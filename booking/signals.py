@@ -0,0 +1,45 @@
+"""
+`slots_changed`: one signal for every change to slot availability.
+
+The booking engine claims and frees slots with conditional UPDATEs, which
+don't fire `post_save`, so listeners can't rely on model signals alone.
+Every write path reports through `notify()` instead.  The plain model signals
+for `TimeSlot` are forwarded here too.  Receivers get:
+
+    event  'created', 'updated', 'deleted', 'booked' or 'freed'
+    slots  list of TimeSlot instances as they are after the change
+
+Delivery waits until the surrounding transaction commits, so a rolled-back
+booking is never announced.
+"""
+
+import copy
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .models import TimeSlot
+
+
+slots_changed = Signal()
+
+
+def notify(event, slots):
+    slots = list(slots)
+    if slots:
+        transaction.on_commit(
+            lambda: slots_changed.send(sender=TimeSlot, event=event, slots=slots)
+        )
+
+
+@receiver(post_save, sender=TimeSlot)
+def _slot_saved(sender, instance, created, **kwargs):
+    notify('created' if created else 'updated', [instance])
+
+
+@receiver(post_delete, sender=TimeSlot)
+def _slot_deleted(sender, instance, **kwargs):
+    # Django clears `instance.pk` once the delete finishes, before an outer
+    # transaction commits; send a copy taken now.
+    notify('deleted', [copy.copy(instance)])
@@ -0,0 +1,207 @@
+"""
+Maintain `DailyAvailability`: total, free and booked slot counts per
+provider per local day.
+
+Every write that changes those counts adjusts the matching row in the same
+transaction:
+  * the booking engine's claim/release, through `slot_booked`/`slot_freed`;
+  * bulk slot creation, through `slots_added`;
+  * archiving, through `slots_removed`;
+  * model saves and deletes of `TimeSlot`, through the signal receivers
+    below (the API's PUT/DELETE, the admin, `services.book_at`).
+Rows are adjusted with `F()` expressions, so concurrent writers can't lose
+an update.
+
+Listing pages read the counts with `free_counts` and
+`free_by_specialization`.  Their cost depends on providers times days, not
+on the number of slots.
+
+Writes that bypass the ORM (raw SQL, `_raw_delete`, `QuerySet.update()`
+outside the booking engine) are not tracked.  `rebuild()` and `drift()`,
+exposed by `manage.py availability_summary`, repair and detect that.
+"""
+
+from collections import Counter
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import DailyAvailability, TimeSlot
+
+
+WEEK_DAYS = 7
+
+
+def _day(start_time):
+    return timezone.localtime(start_time).date()
+
+
+def _apply(provider_id, day, total=0, free=0, booked=0):
+    if not (total or free or booked):
+        return
+    rows = DailyAvailability.objects.filter(provider_id=provider_id, date=day)
+    changes = {'total': F('total') + total, 'free': F('free') + free, 'booked': F('booked') + booked}
+    if rows.update(**changes) or total <= 0:
+        # A missing row for a decrement means the provider is being deleted
+        # (the rows cascade) or the table has drifted; the check reports it.
+        return
+    try:
+        with transaction.atomic():
+            DailyAvailability.objects.create(provider_id=provider_id, date=day, total=total, free=free, booked=booked)
+    except IntegrityError:
+        rows.update(**changes)
+
+
+def slot_booked(slot):
+    _apply(slot.provider_id, _day(slot.start_time), free=-1, booked=1)
+
+
+def slot_freed(slot):
+    _apply(slot.provider_id, _day(slot.start_time), free=1, booked=-1)
+
+
+def _by_day(slots):
+    """`{(provider_id, day): (total, booked)}` for `slots`."""
+    totals, booked = Counter(), Counter()
+    for slot in slots:
+        key = (slot.provider_id, _day(slot.start_time))
+        totals[key] += 1
+        booked[key] += slot.is_booked
+    return {key: (total, booked[key]) for key, total in totals.items()}
+
+
+def slots_added(slots):
+    """Count new slots, one row update per provider and day."""
+    for (provider_id, day), (total, n) in _by_day(slots).items():
+        _apply(provider_id, day, total=total, free=total - n, booked=n)
+
+
+def slots_removed(slots):
+    """Uncount slots deleted without model signals, one row update per provider and day."""
+    for (provider_id, day), (total, n) in _by_day(slots).items():
+        _apply(provider_id, day, total=-total, free=-(total - n), booked=-n)
+
+
+def _slot_removed(provider_id, start_time, is_booked):
+    _apply(provider_id, _day(start_time), total=-1, free=-(not is_booked), booked=-is_booked)
+
+
+# ── Reading ──────────────────────────────────────────────────────
+def _window(today):
+    today = today or timezone.localdate()
+    return today, (today, today + timedelta(days=WEEK_DAYS - 1))
+
+
+def free_counts(provider_ids, today=None):
+    """`{provider_id: {'today': n, 'week': n}}` of free slots; missing ids have none."""
+    today, week = _window(today)
+    rows = (
+        DailyAvailability.objects.filter(provider_id__in=provider_ids, date__range=week)
+        .values('provider_id')
+        .annotate(week=Sum('free'), today=Sum('free', filter=Q(date=today)))
+    )
+    return {
+        row['provider_id']: {'today': row['today'] or 0, 'week': row['week'] or 0}
+        for row in rows
+    }
+
+
+def free_by_specialization(today=None):
+    """`{specialization: {'today': n, 'week': n}}` of free slots."""
+    today, week = _window(today)
+    rows = (
+        DailyAvailability.objects.filter(date__range=week)
+        .values('provider__specialization')
+        .annotate(week=Sum('free'), today=Sum('free', filter=Q(date=today)))
+    )
+    return {
+        row['provider__specialization']: {'today': row['today'] or 0, 'week': row['week'] or 0}
+        for row in rows
+    }
+
+
+def daily_counts(provider_id, first, last):
+    """`{date: {'total': n, 'free': n, 'booked': n}}` for one provider's days `first`..`last`."""
+    rows = DailyAvailability.objects.filter(provider_id=provider_id, date__range=(first, last))
+    return {row.pop('date'): row for row in rows.values('date', 'total', 'free', 'booked')}
+
+
+# ── Rebuild and drift ────────────────────────────────────────────
+def expected():
+    """`{(provider_id, date): (total, free, booked)}` counted from `TimeSlot`."""
+    rows = (
+        TimeSlot.objects.annotate(day=TruncDate('start_time', tzinfo=timezone.get_current_timezone()))
+        .values('provider_id', 'day')
+        .annotate(total=Count('id'), booked=Count('id', filter=Q(is_booked=True)))
+        .order_by()
+    )
+    return {
+        (row['provider_id'], row['day']): (row['total'], row['total'] - row['booked'], row['booked'])
+        for row in rows
+    }
+
+
+def drift():
+    """
+    Return `[(provider_id, date, stored, expected)]` for every row whose
+    stored counts differ from the slots; `stored`/`expected` are
+    `(total, free, booked)` tuples, `(0, 0, 0)` when a side has no row.
+    """
+    want = expected()
+    have = {
+        (row[0], row[1]): tuple(row[2:])
+        for row in DailyAvailability.objects.values_list('provider_id', 'date', 'total', 'free', 'booked')
+    }
+    empty = (0, 0, 0)
+    found = []
+    for provider_id, day in want.keys() | have.keys():
+        stored, counted = have.get((provider_id, day), empty), want.get((provider_id, day), empty)
+        if stored != counted:
+            found.append((provider_id, day, stored, counted))
+    return sorted(found)
+
+
+@transaction.atomic
+def rebuild(batch_size=5000):
+    """Replace the whole table with counts from `TimeSlot`; return the row count."""
+    rows = [
+        DailyAvailability(provider_id=provider_id, date=day, total=total, free=free, booked=booked)
+        for (provider_id, day), (total, free, booked) in expected().items()
+    ]
+    DailyAvailability.objects.all().delete()
+    DailyAvailability.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+# ── Model saves and deletes ──────────────────────────────────────
+@receiver(pre_save, sender=TimeSlot)
+def _remember_slot(sender, instance, raw=False, **kwargs):
+    instance._summary_before = None
+    if not raw and not instance._state.adding and instance.pk is not None:
+        instance._summary_before = (
+            TimeSlot.objects.filter(pk=instance.pk).values_list('provider_id', 'start_time', 'is_booked').first()
+        )
+
+
+@receiver(post_save, sender=TimeSlot)
+def _slot_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_summary_before', None)
+    if before is not None:
+        provider_id, start_time, is_booked = before
+        if (provider_id, _day(start_time), is_booked) == (instance.provider_id, _day(instance.start_time), instance.is_booked):
+            return
+        _slot_removed(provider_id, start_time, is_booked)
+    if created or before is not None:
+        slots_added([instance])
+
+
+@receiver(post_delete, sender=TimeSlot)
+def _slot_deleted(sender, instance, **kwargs):
+    _slot_removed(instance.provider_id, instance.start_time, instance.is_booked)
@@ -0,0 +1,17 @@
+from django import template
+
+from .. import photos
+
+
+register = template.Library()
+
+
+@register.inclusion_tag('booking/provider_photo.html')
+def provider_photo(provider, css_class='doctor-photo', size=photos.DISPLAY_SIZE):
+    """`<picture>` with WebP and JPEG `srcset`s when the photo has variants."""
+    context = {'provider': provider, 'css_class': css_class, 'size': size}
+    if provider.photo_hash:
+        context['webp_srcset'] = photos.srcset(provider, 'webp')
+        context['jpg_srcset'] = photos.srcset(provider, 'jpg')
+        context['src'] = photos.url(provider, photos.WIDTHS[0], 'jpg')
+    return context
@@ -1,3 +1,1451 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import re
+import threading
+from datetime import datetime, time, timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.http import HttpResponse
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import benchmarks, bulk, feed, middleware, otp, photos, principal, replication, routers, schedule, services, summary, writes
+from .availability import index as availability_index
+from .models import AvailabilityException, AvailabilityRule, Booking, DailyAvailability, PatientProfile, Provider, TimeSlot
+
+
+def make_provider(username, specialization='therapist'):
+    user = User.objects.create_user(username=username)
+    return Provider.objects.create(user=user, specialization=specialization)
+
+
+def make_slots(provider, count, start=None, minutes=30, **kwargs):
+    start = start or timezone.now().replace(microsecond=0) + timedelta(days=1)
+    return [
+        TimeSlot.objects.create(
+            provider=provider,
+            start_time=start + timedelta(minutes=minutes * i),
+            end_time=start + timedelta(minutes=minutes * (i + 1)),
+            **kwargs,
+        )
+        for i in range(count)
+    ]
+
+
+class SlotsApiPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.cardio = make_provider('dr_heart', 'cardiologist')
+        cls.derma = make_provider('dr_skin', 'dermatologist')
+        cls.start = timezone.now().replace(microsecond=0) + timedelta(days=1)
+        make_slots(cls.cardio, 5, start=cls.start)
+        make_slots(cls.derma, 5, start=cls.start)
+        TimeSlot.objects.filter(provider=cls.derma).update(is_booked=True)
+
+    def _walk(self, query=''):
+        ids, url = [], f'/api/slots/?limit=3{query}'
+        while True:
+            body = self.client.get(url).json()
+            ids.extend(s['id'] for s in body['results'])
+            if body['next'] is None:
+                return ids
+            url = f"/api/slots/?limit=3{query}&cursor={body['next']}"
+
+    def test_cursor_walks_every_slot_once_in_order(self):
+        ids = self._walk()
+        expected = list(TimeSlot.objects.order_by('start_time', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_filters_are_combined(self):
+        ids = self._walk('&specialization=Cardiologist&is_booked=false')
+        self.assertEqual(len(ids), 5)
+        self.assertFalse(TimeSlot.objects.filter(id__in=ids, provider=self.derma).exists())
+
+    def test_date_range_filter(self):
+        to = (self.start + timedelta(minutes=60)).isoformat()
+        body = self.client.get('/api/slots/', {'to': to, 'provider_id': self.cardio.id}).json()
+        self.assertEqual(len(body['results']), 2)
+
+    def test_bad_cursor_is_rejected(self):
+        response = self.client.get('/api/slots/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+
+
+class NdjsonExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = make_provider('dr_export', 'dentist')
+        make_slots(cls.provider, 4)
+
+    def _lines(self, url):
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+    def test_slots_export_streams_every_row(self):
+        rows = self._lines('/api/slots/?format=ndjson')
+        self.assertEqual([r['id'] for r in rows], sorted(TimeSlot.objects.values_list('id', flat=True)))
+        self.assertEqual(rows[0]['provider'], 'dr_export')
+
+    def test_slots_export_honours_filters(self):
+        TimeSlot.objects.filter(id=TimeSlot.objects.order_by('id')[0].id).update(is_booked=True)
+        self.assertEqual(len(self._lines('/api/slots/?format=ndjson&is_booked=true')), 1)
+
+    def test_providers_export(self):
+        rows = self._lines('/api/providers/?format=ndjson')
+        self.assertEqual(rows, [{'id': self.provider.id, 'username': 'dr_export', 'specialization': 'dentist'}])
+
+
+class BookingEngineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = make_provider('dr_engine')
+        cls.patient = User.objects.create_user(username='patient')
+        cls.slot_a, cls.slot_b = make_slots(cls.provider, 2)
+
+    def _post(self, url, data, method='post'):
+        return getattr(self.client, method)(url, json.dumps(data), content_type='application/json')
+
+    def test_second_booking_of_a_slot_conflicts(self):
+        first = self._post('/api/bookings/', {'client_id': self.patient.id, 'slot_id': self.slot_a.id})
+        second = self._post('/api/bookings/', {'client_id': self.patient.id, 'slot_id': self.slot_a.id})
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 409)
+        self.assertEqual(Booking.objects.filter(slot=self.slot_a).count(), 1)
+
+    def test_unknown_slot_is_404(self):
+        response = self._post('/api/bookings/', {'client_id': self.patient.id, 'slot_id': 999999})
+        self.assertEqual(response.status_code, 404)
+
+    def test_move_frees_old_slot_and_claims_new(self):
+        booking = services.book(self.patient.id, self.slot_a.id)
+        response = self._post(f'/api/bookings/{booking.id}/', {'slot_id': self.slot_b.id}, 'put')
+        self.assertEqual(response.status_code, 200)
+        self.slot_a.refresh_from_db()
+        self.slot_b.refresh_from_db()
+        self.assertFalse(self.slot_a.is_booked)
+        self.assertTrue(self.slot_b.is_booked)
+
+    def test_move_onto_taken_slot_conflicts_and_changes_nothing(self):
+        mine = services.book(self.patient.id, self.slot_a.id)
+        services.book(self.patient.id, self.slot_b.id)
+        response = self._post(f'/api/bookings/{mine.id}/', {'slot_id': self.slot_b.id}, 'put')
+        self.assertEqual(response.status_code, 409)
+        mine.refresh_from_db()
+        self.assertEqual(mine.slot_id, self.slot_a.id)
+
+    def test_cancel_and_delete_free_the_slot(self):
+        booking = services.book(self.patient.id, self.slot_a.id)
+        services.cancel(booking)
+        self.slot_a.refresh_from_db()
+        self.assertFalse(self.slot_a.is_booked)
+        rebooked = services.book(self.patient.id, self.slot_a.id)
+        self.client.delete(f'/api/bookings/{rebooked.id}/')
+        self.slot_a.refresh_from_db()
+        self.assertFalse(self.slot_a.is_booked)
+
+    def test_constraint_rejects_second_active_booking(self):
+        Booking.objects.create(client=self.patient, slot=self.slot_a, status='confirmed')
+        with self.assertRaises(IntegrityError):
+            Booking.objects.create(client=self.patient, slot=self.slot_a, status='pending')
+
+
+class BookingConcurrencyTests(TransactionTestCase):
+    THREADS = 24
+
+    def test_parallel_bookings_of_one_slot_never_double_book(self):
+        provider = make_provider('dr_busy')
+        slot = make_slots(provider, 1)[0]
+        patients = User.objects.bulk_create(User(username=f'p{i}') for i in range(self.THREADS))
+        barrier = threading.Barrier(self.THREADS)
+        outcomes = []
+
+        def attempt(patient):
+            try:
+                barrier.wait()
+                services.book(patient.id, slot.id)
+                outcomes.append('booked')
+            except (services.SlotUnavailable, OperationalError):
+                outcomes.append('rejected')
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=attempt, args=(p,)) for p in patients]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(outcomes), self.THREADS)
+        self.assertEqual(outcomes.count('booked'), 1)
+        self.assertEqual(Booking.objects.filter(slot=slot).exclude(status='cancelled').count(), 1)
+        slot.refresh_from_db()
+        self.assertTrue(slot.is_booked)
+
+
+class QueryPlanTests(TestCase):
+    """
+    Run each view's queries through EXPLAIN QUERY PLAN and fail on a full scan
+    of a hot table.  Plans are checked twice: on a small table, and again after
+    the data has grown and ANALYZE has given the planner real statistics.
+    """
+    HOT_TABLES = ('booking_timeslot', 'booking_booking')
+    FULL_SCAN = re.compile(r'\bSCAN (%s)\b(?! USING)' % '|'.join(HOT_TABLES))
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_provider('dr_plan', 'cardiologist')
+        cls.other = make_provider('dr_other', 'dentist')
+        cls.patient = User.objects.create_user(username='plan_patient')
+        slots = make_slots(cls.doctor, 20) + make_slots(cls.other, 20)
+        for slot in slots[::4]:
+            services.book(cls.patient.id, slot.id)
+
+    def _grow(self, per_provider=2000):
+        start = timezone.now() + timedelta(days=30)
+        TimeSlot.objects.bulk_create(
+            TimeSlot(
+                provider=provider,
+                start_time=start + timedelta(minutes=30 * i),
+                end_time=start + timedelta(minutes=30 * (i + 1)),
+                is_booked=i % 3 == 0,
+            )
+            for provider in Provider.objects.all()
+            for i in range(per_provider)
+        )
+        patients = User.objects.bulk_create(User(username=f'grow{i}') for i in range(50))
+        booked = TimeSlot.objects.filter(is_booked=True, start_time__gte=start)
+        Booking.objects.bulk_create(
+            Booking(client=patients[i % len(patients)], slot_id=slot_id, status='confirmed')
+            for i, slot_id in enumerate(booked.values_list('id', flat=True))
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def _full_scans(self, url, user=None):
+        if user is not None:
+            self.client.force_login(user)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        scans = []
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or not any(t in sql for t in self.HOT_TABLES):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = '\n'.join(row[-1] for row in cursor.fetchall())
+                if self.FULL_SCAN.search(plan):
+                    scans.append(f'{sql}\n{plan}')
+        return scans
+
+    def _assert_no_full_scans(self):
+        urls = [
+            ('/api/slots/', None),
+            (f'/api/slots/?provider_id={self.doctor.id}', None),
+            ('/api/slots/?specialization=cardiologist&is_booked=false', None),
+            ('/api/slots/?is_booked=false&from=2030-01-01T00:00:00', None),
+            ('/slots/', None),
+            ('/specialization/cardiologist/', None),
+            (f'/provider/{self.doctor.id}/', None),
+            ('/my-appointments/', self.patient),
+            ('/my-schedule/', self.doctor.user),
+        ]
+        for url, user in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self._full_scans(url, user), [])
+
+    def test_hot_queries_use_indexes(self):
+        self._assert_no_full_scans()
+
+    def test_hot_queries_use_indexes_as_data_grows(self):
+        self._grow()
+        self._assert_no_full_scans()
+
+
+class NextAvailableTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user(username='searcher')
+        cls.cardio_a = make_provider('dr_a', 'cardiologist')
+        cls.cardio_b = make_provider('dr_b', 'cardiologist')
+        cls.derma = make_provider('dr_c', 'dermatologist')
+        base = timezone.now().replace(hour=8, minute=0, second=0, microsecond=0) + timedelta(days=2)
+        cls.a_slots = make_slots(cls.cardio_a, 4, start=base + timedelta(minutes=15))
+        cls.b_slots = make_slots(cls.cardio_b, 4, start=base)
+        cls.d_slots = make_slots(cls.derma, 4, start=base - timedelta(hours=1))
+
+    def setUp(self):
+        availability_index.clear()
+
+    def _ids(self, **params):
+        response = self.client.get('/api/slots/next/', params)
+        self.assertEqual(response.status_code, 200)
+        return [s['id'] for s in response.json()['results']]
+
+    def test_merges_providers_in_time_order(self):
+        ids = self._ids(specialization='cardiologist', limit=3)
+        self.assertEqual(ids, [self.b_slots[0].id, self.a_slots[0].id, self.b_slots[1].id])
+
+    def test_booking_and_cancelling_update_the_index(self):
+        self._ids(specialization='cardiologist')  # load the index
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = services.book(self.patient.id, self.b_slots[0].id)
+        self.assertNotIn(self.b_slots[0].id, availability_index._entries)
+        self.assertEqual(self._ids(specialization='cardiologist', limit=1), [self.a_slots[0].id])
+        with self.captureOnCommitCallbacks(execute=True):
+            services.cancel(booking)
+        self.assertEqual(self._ids(specialization='cardiologist', limit=1), [self.b_slots[0].id])
+
+    def test_stale_entries_are_verified_against_the_database(self):
+        self._ids()
+        TimeSlot.objects.filter(id=self.d_slots[0].id).update(is_booked=True)  # another process
+        self.assertEqual(self._ids(limit=1), [self.d_slots[1].id])
+
+    def test_time_of_day_and_duration_filters(self):
+        # Cardiology slots start at 08:00, 08:15, 08:30, ... and last 30 minutes.
+        self.assertEqual(
+            self._ids(specialization='cardiologist', time_from='09:00', limit=2),
+            [self.b_slots[2].id, self.a_slots[2].id],
+        )
+        self.assertEqual(
+            self._ids(specialization='cardiologist', time_to='08:45'),
+            [self.b_slots[0].id, self.a_slots[0].id],
+        )
+        self.assertEqual(self._ids(duration=45), [])
+
+    def test_page_renders(self):
+        response = self.client.get('/next-available/', {'specialization': 'dermatologist'})
+        self.assertContains(response, 'dr_c')
+
+
+class RecurringScheduleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = make_provider('dr_rules', 'pediatrician')
+        cls.patient = User.objects.create_user(username='rule_patient')
+        cls.day = timezone.localdate() + timedelta(days=7)
+        # 09:00-11:00 in 30-minute slots on the weekday a week from today
+        AvailabilityRule.objects.create(
+            provider=cls.provider, weekday=cls.day.weekday(), start=time(9), end=time(11),
+            valid_from=cls.day,
+        )
+        cls.tz = timezone.get_current_timezone()
+
+    def setUp(self):
+        availability_index.clear()
+        cache.clear()
+
+    def _at(self, hour, minute=0, day=None):
+        return datetime.combine(day or self.day, time(hour, minute), self.tz)
+
+    def _window(self):
+        return schedule.expand([self.provider.id], self._at(0), self._at(23, 59))
+
+    def test_rules_expand_to_virtual_slots(self):
+        starts = [s.start_time for s in self._window()]
+        self.assertEqual(starts, [self._at(9), self._at(9, 30), self._at(10), self._at(10, 30)])
+        self.assertFalse(TimeSlot.objects.exists())
+
+    def test_exceptions_and_stored_slots_hide_virtual_slots(self):
+        AvailabilityException.objects.create(provider=self.provider, date=self.day, start=time(9), end=time(10))
+        TimeSlot.objects.create(provider=self.provider, start_time=self._at(10, 15), end_time=self._at(10, 45))
+        self.assertEqual(self._window(), [])
+
+    def test_booking_a_virtual_slot_materializes_one_row(self):
+        booking = services.book_at(self.patient.id, self.provider.id, self._at(9, 30))
+        self.assertEqual(TimeSlot.objects.count(), 1)
+        self.assertEqual(booking.slot.end_time, self._at(10))
+        with self.assertRaises(services.SlotUnavailable):
+            services.book_at(self.patient.id, self.provider.id, self._at(9, 30))
+        with self.assertRaises(services.SlotNotFound):
+            services.book_at(self.patient.id, self.provider.id, self._at(9, 45))
+        self.assertEqual(len(self._window()), 3)
+
+    def test_availability_api_merges_stored_and_virtual(self):
+        TimeSlot.objects.create(provider=self.provider, start_time=self._at(8), end_time=self._at(8, 30))
+        response = self.client.get('/api/availability/', {
+            'provider_id': self.provider.id,
+            'from': self._at(0).isoformat(),
+            'to': self._at(23).isoformat(),
+        })
+        results = response.json()['results']
+        self.assertEqual([r['virtual'] for r in results], [False, True, True, True, True])
+        self.assertIsNone(results[1]['id'])
+
+    def test_api_books_virtual_slot_by_provider_and_time(self):
+        response = self.client.post('/api/bookings/', json.dumps({
+            'client_id': self.patient.id,
+            'provider_id': self.provider.id,
+            'start_time': self._at(10).isoformat(),
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(TimeSlot.objects.get(start_time=self._at(10)).is_booked)
+
+    def test_next_available_includes_virtual_slots(self):
+        response = self.client.get('/api/slots/next/', {'specialization': 'pediatrician', 'limit': 2})
+        starts = [r['start_time'] for r in response.json()['results']]
+        self.assertEqual(starts, [self._at(9).isoformat(), self._at(9, 30).isoformat()])
+
+    def test_provider_page_links_virtual_slots(self):
+        response = self.client.get(f'/provider/{self.provider.id}/')
+        self.assertContains(response, f'/book/{self.provider.id}/at/{int(self._at(9).timestamp())}/')
+
+
+class BulkSlotCreationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = make_provider('dr_bulk')
+        cls.start = timezone.now().replace(microsecond=0) + timedelta(days=3)
+        TimeSlot.objects.create(
+            provider=cls.provider, start_time=cls.start, end_time=cls.start + timedelta(minutes=30),
+        )
+
+    def _item(self, minutes, length=30, provider=None):
+        start = self.start + timedelta(minutes=minutes)
+        return {
+            'provider_id': (provider or self.provider).id,
+            'start_time': start.isoformat(),
+            'end_time': (start + timedelta(minutes=length)).isoformat(),
+        }
+
+    def _post(self, data):
+        return self.client.post('/api/slots/', json.dumps(data), content_type='application/json')
+
+    def test_array_creates_valid_items_and_reports_the_rest(self):
+        response = self._post([
+            self._item(30),             # ok
+            self._item(15),             # overlaps the stored slot
+            self._item(60, length=60),  # ok
+            self._item(90),             # overlaps item 2
+            {'provider_id': self.provider.id, 'start_time': 'soon'},
+            self._item(300, provider=Provider(id=999999)),
+        ])
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual([c['index'] for c in body['created']], [0, 2])
+        self.assertEqual([e['index'] for e in body['errors']], [1, 3, 4, 5])
+        self.assertEqual(TimeSlot.objects.count(), 3)
+
+    def test_single_overlapping_slot_is_a_conflict(self):
+        self.assertEqual(self._post(self._item(10)).status_code, 409)
+        self.assertEqual(self._post(self._item(30)).status_code, 201)
+
+    def test_stored_slot_starting_inside_a_new_item_is_an_overlap(self):
+        # The stored slot sits at 0-30 minutes; these items start before it.
+        self.assertEqual(self._post(self._item(-15)).status_code, 409)
+        response = self._post([self._item(-60, length=180), self._item(-60, length=30), self._item(-30, length=30)])
+        self.assertEqual([c['index'] for c in response.json()['created']], [1, 2])
+        self.assertEqual([e['index'] for e in response.json()['errors']], [0])
+        self.assertEqual(TimeSlot.objects.count(), 3)
+
+    def test_large_batch_validates_with_two_reads(self):
+        items = [self._item(30 * i) for i in range(1, 2001)]
+        with CaptureQueriesContext(connection) as ctx:
+            response = self._post(items)
+        self.assertEqual(len(response.json()['created']), 2000)
+        # One provider lookup and one overlap window read; the rest are INSERT batches.
+        selects = [q for q in ctx.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 2)
+
+
+class SyntheticSeedTests(TestCase):
+    def _snapshot(self):
+        return (
+            list(Provider.objects.order_by('user__username').values_list('specialization', flat=True)),
+            list(TimeSlot.objects.order_by('provider__user__username', 'start_time').values_list('start_time', 'is_booked')),
+            list(Booking.objects.order_by('slot__start_time', 'slot__provider__user__username').values_list('client__username', 'status')),
+        )
+
+    def _seed(self, seed):
+        call_command(
+            'seed_doctors', providers=4, patients=20, days=3, past_days=1, density=0.5,
+            seed=seed, start_date=timezone.localdate() + timedelta(days=1), batch_size=7, stdout=io.StringIO(),
+        )
+        return self._snapshot()
+
+    def test_same_seed_gives_the_same_dataset(self):
+        first = self._seed(7)
+        self.assertEqual(len(first[1]), 4 * 4 * 16)
+        self.assertEqual(self._seed(7), first)
+        self.assertNotEqual(self._seed(8), first)
+
+    def test_booked_slots_have_exactly_one_active_booking(self):
+        self._seed(3)
+        booked = TimeSlot.objects.filter(is_booked=True).count()
+        self.assertEqual(Booking.objects.exclude(status='cancelled').count(), booked)
+        self.assertEqual(summary.drift(), [])
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_measure_reports_every_scenario(self):
+        from .management.commands.seed_doctors import generate_dataset
+        generate_dataset(providers=2, patients=5, days=2, density=0.5, start=timezone.localdate() + timedelta(days=1))
+        results = benchmarks.measure(benchmarks.Fixtures(), iterations=2, warmup=0)
+        self.assertEqual(set(results), set(benchmarks.SCENARIOS))
+        for name, stats in results.items():
+            self.assertEqual(stats['status'], [200], name)
+            self.assertLessEqual(stats['p50_ms'], stats['p99_ms'])
+            self.assertGreaterEqual(stats['peak_kb'], 0, name)
+
+    def test_compare_flags_slower_or_chattier_scenarios(self):
+        def report(p95, queries):
+            return {'results': {'small': {'scenarios': {'api_slots': {'p95_ms': p95, 'queries': queries}}}}}
+        baseline = report(10.0, 1)
+        self.assertEqual(benchmarks.compare(report(11.5, 1), baseline, tolerance=0.2), [])
+        self.assertEqual(len(benchmarks.compare(report(12.5, 1), baseline, tolerance=0.2)), 1)
+        self.assertEqual(len(benchmarks.compare(report(10.0, 2), baseline)), 1)
+        self.assertEqual(benchmarks.compare(report(99.0, 9), {'results': {}}), [])
+
+    def test_load_client_reads_chunked_and_sized_bodies(self):
+        async def read(raw):
+            reader = asyncio.StreamReader()
+            reader.feed_data(raw)
+            reader.feed_eof()
+            return await benchmarks._read_response(reader), await reader.read()
+        chunked = b'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n3\r\nabc\r\n0\r\n\r\nNEXT'
+        self.assertEqual(asyncio.run(read(chunked)), ((200, True), b'NEXT'))
+        sized = b'HTTP/1.1 404 Not Found\r\nContent-Length: 2\r\nConnection: close\r\n\r\n{}NEXT'
+        self.assertEqual(asyncio.run(read(sized)), ((404, False), b'NEXT'))
+
+
+@override_settings(N_PLUS_ONE_RAISE=True, N_PLUS_ONE_THRESHOLD=5)
+class QueryInstrumentationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.providers = [make_provider(f'doc{i}', 'dentist') for i in range(3)]
+        for provider in cls.providers:
+            make_slots(provider, 4)
+        cls.patient = User.objects.create_user(username='pat')
+        for slot in TimeSlot.objects.all()[:8]:
+            services.book(cls.patient.id, slot.id)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_and_api_have_no_repeated_queries(self):
+        provider = self.providers[0]
+        anonymous = ['/slots/', '/specialization/dentist/', f'/provider/{provider.id}/',
+                     '/api/slots/', '/api/providers/', '/api/bookings/', '/api/slots/?format=ndjson']
+        for path in anonymous:
+            response = self.client.get(path)
+            self.assertEqual(response.status_code, 200, path)
+            self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="\d+ queries"')
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.client.force_login(self.patient)
+        self.assertEqual(self.client.get('/my-appointments/').status_code, 200)
+        self.client.force_login(provider.user)
+        self.assertEqual(self.client.get('/my-schedule/').status_code, 200)
+
+    def test_repeated_query_shapes_are_detected(self):
+        def view(request):
+            for provider in Provider.objects.all():
+                provider.user.username
+            return HttpResponse('ok')
+
+        for i in range(3, 6):
+            make_provider(f'doc{i}')
+        handler = middleware.QueryCountMiddleware(view)
+        with self.assertRaisesRegex(middleware.NPlusOneDetected, r'6 x SELECT'):
+            handler(RequestFactory().get('/'))
+        with self.settings(N_PLUS_ONE_RAISE=False), self.assertLogs('booking.sql', 'WARNING'):
+            response = handler(RequestFactory().get('/'))
+        self.assertIn('desc="7 queries"', response['Server-Timing'])
+
+    def test_normalize_sql_collapses_literals_and_in_lists(self):
+        self.assertEqual(
+            middleware.normalize_sql("SELECT * FROM t WHERE id IN (%s, %s, %s) AND n = 3 AND s = 'x'"),
+            'SELECT * FROM t WHERE id IN (...) AND n = ? AND s = ?',
+        )
+
+
+class PageCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dentist = make_provider('dr_tooth', 'dentist')
+        cls.surgeon = make_provider('dr_knife', 'surgeon')
+        cls.dentist_slots = make_slots(cls.dentist, 3)
+        cls.surgeon_slots = make_slots(cls.surgeon, 3)
+        cls.patient = User.objects.create_user(username='cached_patient')
+
+    def setUp(self):
+        cache.clear()
+
+    def _get(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_second_anonymous_hit_is_served_from_cache(self):
+        for path in ['/slots/', '/specialization/dentist/', f'/provider/{self.dentist.id}/']:
+            self.assertEqual(self._get(path)['X-Cache'], 'MISS')
+            with self.assertNumQueries(0):
+                cached = self._get(path)
+            self.assertEqual(cached['X-Cache'], 'HIT')
+        stats = self._get('/api/cache/stats/').json()
+        self.assertEqual(stats['provider'], {'hits': 1, 'misses': 1})
+
+    def test_booking_invalidates_only_the_affected_provider(self):
+        for path in ['/slots/', '/specialization/dentist/', '/specialization/surgeon/',
+                     f'/provider/{self.dentist.id}/', f'/provider/{self.surgeon.id}/']:
+            self._get(path)
+        with self.captureOnCommitCallbacks(execute=True):
+            services.book(self.patient.id, self.dentist_slots[0].id)
+        self.assertEqual(self._get('/slots/')['X-Cache'], 'MISS')
+        self.assertEqual(self._get('/specialization/dentist/')['X-Cache'], 'MISS')
+        self.assertEqual(self._get(f'/provider/{self.dentist.id}/')['X-Cache'], 'MISS')
+        self.assertEqual(self._get('/specialization/surgeon/')['X-Cache'], 'HIT')
+        self.assertEqual(self._get(f'/provider/{self.surgeon.id}/')['X-Cache'], 'HIT')
+        self.assertContains(self._get(f'/provider/{self.dentist.id}/'), 'Booked')
+
+    def test_logged_in_users_get_cached_data_rendered_fresh(self):
+        self._get('/specialization/dentist/')
+        self.client.force_login(self.patient)
+        response = self._get('/specialization/dentist/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertContains(response, 'dr_tooth')
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = make_provider('dr_etag')
+        cls.slots = make_slots(cls.provider, 5)
+        cls.patient = User.objects.create_user(username='etag_patient')
+
+    def _revalidate(self, path, **headers):
+        first = self.client.get(path)
+        self.assertEqual(first.status_code, 200)
+        return first, self.client.get(path, HTTP_IF_NONE_MATCH=first['ETag'], **headers)
+
+    def test_unchanged_lists_and_details_answer_304_without_loading_rows(self):
+        booking = services.book(self.patient.id, self.slots[0].id)
+        paths = ['/api/slots/', '/api/slots/?is_booked=false&limit=2', '/api/slots/?format=ndjson',
+                 '/api/providers/', '/api/bookings/', f'/api/slots/{self.slots[1].id}/',
+                 f'/api/providers/{self.provider.id}/', f'/api/bookings/{booking.id}/']
+        for path in paths:
+            first = self.client.get(path)
+            with self.assertNumQueries(1):
+                again = self.client.get(path, HTTP_IF_NONE_MATCH=first['ETag'])
+            self.assertEqual(again.status_code, 304, path)
+            self.assertEqual(again['ETag'], first['ETag'])
+
+    def test_etag_varies_with_query_string(self):
+        self.assertNotEqual(
+            self.client.get('/api/slots/?limit=2')['ETag'], self.client.get('/api/slots/?limit=3')['ETag'],
+        )
+
+    def test_writes_and_deletes_change_the_list_etag(self):
+        _, unchanged = self._revalidate('/api/slots/')
+        self.assertEqual(unchanged.status_code, 304)
+        etag = unchanged['ETag']
+        services.book(self.patient.id, self.slots[2].id)
+        booked = self.client.get('/api/slots/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(booked.status_code, 200)
+        self.slots[4].delete()
+        deleted = self.client.get('/api/slots/', HTTP_IF_NONE_MATCH=booked['ETag'])
+        self.assertEqual(deleted.status_code, 200)
+        self.assertEqual(len(deleted.json()['results']), 4)
+
+    def test_username_change_invalidates_payloads_that_show_it(self):
+        paths = ['/api/slots/', '/api/providers/', f'/api/slots/{self.slots[0].id}/', f'/api/providers/{self.provider.id}/']
+        etags = {path: self.client.get(path)['ETag'] for path in paths}
+        user = self.provider.user
+        user.username = 'dr_etag_renamed'
+        user.save()
+        for path in paths:
+            response = self.client.get(path, HTTP_IF_NONE_MATCH=etags[path])
+            self.assertEqual(response.status_code, 200, path)
+            self.assertIn('dr_etag_renamed', response.content.decode(), path)
+
+        etag = self.client.get('/api/slots/')['ETag']
+        user.save(update_fields=['last_login'])
+        self.assertEqual(self.client.get('/api/slots/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_detail_honours_if_modified_since(self):
+        first = self.client.get(f'/api/providers/{self.provider.id}/')
+        again = self.client.get(f'/api/providers/{self.provider.id}/', HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(again.status_code, 304)
+        self.assertNotIn('Last-Modified', self.client.get('/api/providers/'))
+
+
+class AvailabilitySummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = make_provider('dr_count', 'dentist')
+        cls.patient = User.objects.create_user(username='count_patient')
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        cls.start = datetime.combine(tomorrow, time(9), timezone.get_current_timezone())
+        cls.slots = make_slots(cls.provider, 4, start=cls.start)
+
+    def setUp(self):
+        cache.clear()
+
+    def _counts(self, day=None):
+        row = DailyAvailability.objects.get(provider=self.provider, date=day or self.start.date())
+        return row.total, row.free, row.booked
+
+    def test_booking_cancelling_and_slot_writes_keep_counts_in_step(self):
+        self.assertEqual(self._counts(), (4, 4, 0))
+        booking = services.book(self.patient.id, self.slots[0].id)
+        self.assertEqual(self._counts(), (4, 3, 1))
+        services.cancel(booking)
+        self.assertEqual(self._counts(), (4, 4, 0))
+        services.book(self.patient.id, self.slots[1].id)
+        self.client.delete(f'/api/slots/{self.slots[1].id}/')
+        self.assertEqual(self._counts(), (3, 3, 0))
+        next_day = (self.start + timedelta(days=1)).isoformat()
+        self.client.put(f'/api/slots/{self.slots[2].id}/', json.dumps({'start_time': next_day}), content_type='application/json')
+        self.assertEqual(self._counts(), (2, 2, 0))
+        self.assertEqual(self._counts(self.start.date() + timedelta(days=1)), (1, 1, 0))
+        self.client.post('/api/slots/', json.dumps([{
+            'provider_id': self.provider.id,
+            'start_time': (self.start + timedelta(hours=5)).isoformat(),
+            'end_time': (self.start + timedelta(hours=5, minutes=30)).isoformat(),
+        }]), content_type='application/json')
+        self.assertEqual(self._counts(), (3, 3, 0))
+        self.assertEqual(summary.drift(), [])
+
+    def test_check_reports_drift_and_rebuild_repairs_it(self):
+        TimeSlot.objects.filter(id=self.slots[3].id).update(is_booked=True)
+        with self.assertRaises(CommandError):
+            call_command('availability_summary', check=True, stdout=io.StringIO())
+        call_command('availability_summary', stdout=io.StringIO())
+        self.assertEqual(self._counts(), (4, 3, 1))
+        call_command('availability_summary', check=True, stdout=io.StringIO())
+
+    def test_pages_show_free_counts(self):
+        services.book(self.patient.id, self.slots[0].id)
+        week_day = self.start.date()
+        counts = summary.free_counts([self.provider.id], today=week_day)
+        self.assertEqual(counts, {self.provider.id: {'today': 3, 'week': 3}})
+        self.assertEqual(summary.free_by_specialization()['dentist'], {'today': 0, 'week': 3})
+        self.assertContains(self.client.get(f'/provider/{self.provider.id}/'), '3 this week')
+        self.assertContains(self.client.get('/specialization/dentist/'), '0 free today · 3 this week')
+
+
+class AsyncApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = make_provider('dr_async', 'cardiologist')
+        cls.slots = make_slots(cls.provider, 3)
+        cls.patient = User.objects.create_user(username='async_patient')
+
+    async def test_reads_under_asgi(self):
+        response = await self.async_client.get('/api/slots/?limit=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertIn('queries', response['Server-Timing'])
+        again = await self.async_client.get('/api/slots/?limit=2', headers={'If-None-Match': response['ETag']})
+        self.assertEqual(again.status_code, 304)
+        detail = await self.async_client.get(f'/api/providers/{self.provider.id}/')
+        self.assertEqual(detail.json()['username'], 'dr_async')
+        missing = await self.async_client.get('/api/bookings/999999/')
+        self.assertEqual(missing.status_code, 404)
+
+    async def test_ndjson_streams_asynchronously(self):
+        response = await self.async_client.get('/api/slots/?format=ndjson')
+        self.assertTrue(response.is_async)
+        lines = [json.loads(line) async for chunk in response.streaming_content for line in chunk.splitlines()]
+        self.assertEqual([row['id'] for row in lines], [s.id for s in self.slots])
+
+    async def test_booking_engine_runs_through_the_async_view(self):
+        created = await self.async_client.post(
+            '/api/bookings/', {'client_id': self.patient.id, 'slot_id': self.slots[0].id},
+            content_type='application/json',
+        )
+        self.assertEqual(created.status_code, 201)
+        taken = await self.async_client.post(
+            '/api/bookings/', {'client_id': self.patient.id, 'slot_id': self.slots[0].id},
+            content_type='application/json',
+        )
+        self.assertEqual(taken.status_code, 409)
+        moved = await self.async_client.put(
+            f"/api/bookings/{created.json()['id']}/", {'slot_id': self.slots[1].id},
+            content_type='application/json',
+        )
+        self.assertEqual(moved.status_code, 200)
+        slot = await TimeSlot.objects.aget(id=self.slots[1].id)
+        self.assertTrue(slot.is_booked)
+
+
+def _sse_events(body):
+    """`[(event, data)]` from an SSE body, skipping comments and retry hints."""
+    events = []
+    for block in body.strip().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':') and ': ' in line)
+        if 'event' in fields:
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+class SlotFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dentist = make_provider('feed_dentist', 'dentist')
+        cls.surgeon = make_provider('feed_surgeon', 'surgeon')
+        cls.patient = User.objects.create_user(username='feed_patient')
+
+    def setUp(self):
+        self.cursor = feed.broadcaster.event_id(feed.broadcaster.parse_cursor(''))
+
+    def test_reconnect_replays_missed_events_for_the_subscription(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            dentist_slot, = make_slots(self.dentist, 1)
+            make_slots(self.surgeon, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            services.book(self.patient.id, dentist_slot.id)
+
+        response = self.client.get('/api/slots/events/?specialization=Dentist', headers={'Last-Event-ID': self.cursor})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = _sse_events(response.content.decode())
+        self.assertEqual([kind for kind, _ in events], ['created', 'booked'])
+        self.assertEqual(events[1][1]['id'], dentist_slot.id)
+        self.assertTrue(events[1][1]['is_booked'])
+
+        by_provider = self.client.get(f'/api/slots/events/?provider_id={self.surgeon.id}&last_event_id={self.cursor}')
+        events = _sse_events(by_provider.content.decode())
+        self.assertEqual([(kind, data['provider_id']) for kind, data in events], [('created', self.surgeon.id)])
+
+    def test_api_delete_announces_the_slot_id_and_unindexes_it(self):
+        slot, = make_slots(self.dentist, 1)
+        availability_index.rebuild()
+        self.addCleanup(availability_index.clear)
+        self.assertIn(slot.id, availability_index._entries)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.client.delete(f'/api/slots/{slot.id}/').status_code, 200)
+
+        response = self.client.get(f'/api/slots/events/?last_event_id={self.cursor}')
+        events = _sse_events(response.content.decode())
+        self.assertEqual([(kind, data['id']) for kind, data in events], [('deleted', slot.id)])
+        self.assertNotIn(slot.id, availability_index._entries)
+
+    def test_unknown_cursor_gets_a_reset(self):
+        response = self.client.get('/api/slots/events/', headers={'Last-Event-ID': 'stale-1'})
+        self.assertEqual(_sse_events(response.content.decode()), [('reset', {})])
+        self.assertEqual(self.client.get('/api/slots/events/?provider_id=x').status_code, 400)
+
+    def test_wsgi_answers_at_once_and_only_asgi_pages_subscribe(self):
+        # A sync worker is never parked on the stream, whatever the stream length.
+        response = self.client.get('/api/slots/events/')
+        self.assertFalse(response.streaming)
+        self.assertIn(f'retry: {feed.POLL_RETRY_MS}', response.content.decode())
+        self.assertNotIn(b'EventSource', self.client.get('/slots/').content)
+
+    @override_settings(SLOT_FEED_MAX_SECONDS=5)
+    async def test_async_subscriber_is_woken_by_a_booking(self):
+        slot = await TimeSlot.objects.acreate(
+            provider=self.dentist, start_time=timezone.now() + timedelta(days=1),
+            end_time=timezone.now() + timedelta(days=1, minutes=30),
+        )
+        response = await self.async_client.get(f'/api/slots/events/?provider_id={self.dentist.id}')
+        self.assertTrue(response.is_async)
+        chunks = aiter(response.streaming_content)
+        await anext(chunks)  # opening frame
+        feed.broadcaster.publish('freed', {'id': slot.id, 'provider_id': self.dentist.id, 'specialization': 'dentist'})
+        body = await asyncio.wait_for(anext(chunks), 2)
+        self.assertEqual(_sse_events(body.decode()), [('freed', {'id': slot.id, 'provider_id': self.dentist.id, 'specialization': 'dentist'})])
+        await chunks.aclose()
+
+    async def test_asgi_slots_page_subscribes(self):
+        response = await self.async_client.get('/slots/')
+        self.assertIn(b"new EventSource('/api/slots/events/')", response.content)
+
+
+class SparseFieldsetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = make_provider('dr_sparse', 'dentist')
+        cls.slots = make_slots(cls.provider, 3)
+
+    def test_fields_select_only_the_requested_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/slots/?fields=start_time,id&limit=2')
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['results'][0], {'start_time': self.slots[0].start_time.isoformat(), 'id': self.slots[0].id})
+        self.assertIsNotNone(body['next'])
+        page_query = queries.captured_queries[-1]['sql']
+        self.assertNotIn('auth_user', page_query)
+        self.assertNotIn('"end_time"', page_query.split('FROM')[0])
+
+        following = self.client.get(f"/api/slots/?fields=id&cursor={body['next']}").json()
+        self.assertEqual(following['results'], [{'id': self.slots[2].id}])
+
+    def test_columnar_format_lists_each_field_once(self):
+        body = self.client.get('/api/slots/?format=columnar&fields=id,provider,is_booked').json()
+        self.assertEqual(body['fields'], ['id', 'provider', 'is_booked'])
+        self.assertEqual(body['columns']['id'], [s.id for s in self.slots])
+        self.assertEqual(body['columns']['provider'], ['dr_sparse'] * 3)
+        self.assertIsNone(body['next'])
+        providers = self.client.get('/api/providers/?format=columnar').json()
+        self.assertEqual(providers['columns']['username'], ['dr_sparse'])
+        bookings = self.client.get('/api/bookings/?fields=id,slot_id').json()
+        self.assertEqual(bookings, [])
+
+    def test_unknown_fields_are_rejected(self):
+        for url in ('/api/slots/?fields=id,secret', '/api/providers/?fields=password', '/api/bookings/?fields=,'):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 400, url)
+            self.assertIn('Available', response.json()['error'])
+        ndjson = self.client.get('/api/providers/?format=ndjson&fields=username')
+        self.assertEqual(b''.join(ndjson.streaming_content), b'{"username":"dr_sparse"}\n')
+
+
+class BatchApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = make_provider('dr_batch', 'dentist')
+        cls.slots = make_slots(cls.provider, 3)
+        cls.patient = User.objects.create_user(username='batch_patient')
+
+    def post(self, operations):
+        return self.client.post('/api/batch/', {'operations': operations}, content_type='application/json')
+
+    def test_operations_run_in_order_and_report_each_result(self):
+        start = self.slots[-1].end_time + timedelta(hours=1)
+        booking = services.book(self.patient.id, self.slots[0].id)
+        response = self.post([
+            {'method': 'POST', 'path': '/api/slots/', 'body': {
+                'provider_id': self.provider.id, 'start_time': start.isoformat(),
+                'end_time': (start + timedelta(minutes=30)).isoformat(),
+            }},
+            {'method': 'PUT', 'path': f'/api/bookings/{booking.id}/', 'body': {'slot_id': self.slots[1].id}},
+            {'method': 'POST', 'path': '/api/bookings/', 'body': {'client_id': self.patient.id, 'slot_id': self.slots[0].id}},
+            {'method': 'delete', 'path': f'/api/slots/{self.slots[2].id}/'},
+        ])
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([r['status'] for r in results], [201, 200, 201, 200])
+        self.assertTrue(TimeSlot.objects.filter(id=results[0]['body']['id']).exists())
+        self.assertEqual(Booking.objects.get(id=booking.id).slot_id, self.slots[1].id)
+        self.assertTrue(Booking.objects.filter(id=results[2]['body']['id'], slot=self.slots[0]).exists())
+        self.assertFalse(TimeSlot.objects.filter(id=self.slots[2].id).exists())
+
+    def test_a_failing_operation_rolls_back_the_whole_batch(self):
+        response = self.post([
+            {'method': 'POST', 'path': '/api/bookings/', 'body': {'client_id': self.patient.id, 'slot_id': self.slots[0].id}},
+            {'method': 'PUT', 'path': f'/api/slots/{self.slots[1].id}/', 'body': {'start_time': 'soon'}},
+            {'method': 'DELETE', 'path': f'/api/slots/{self.slots[2].id}/'},
+        ])
+        self.assertEqual(response.status_code, 400)
+        body = response.json()
+        self.assertEqual(body['failed'], 1)
+        self.assertEqual([r['status'] for r in body['results']], [201, 400])
+        self.assertFalse(Booking.objects.exists())
+
+    def test_constraint_violations_are_conflicts_not_errors(self):
+        taken = {'start_time': self.slots[0].start_time.isoformat()}
+        response = self.post([{'method': 'PUT', 'path': f'/api/slots/{self.slots[1].id}/', 'body': taken}])
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['results'][0]['body'], {'error': bulk.START_TAKEN_ERROR})
+        response = self.post([{'method': 'POST', 'path': '/api/providers/', 'body': {
+            'user_id': self.provider.user_id, 'specialization': 'surgeon',
+        }}])
+        self.assertEqual(response.status_code, 409)
+        put = self.client.put(f'/api/slots/{self.slots[1].id}/', taken, content_type='application/json')
+        self.assertEqual(put.status_code, 409)
+        self.assertEqual(TimeSlot.objects.get(id=self.slots[1].id).start_time, self.slots[1].start_time)
+        self.assertFalse(TimeSlot.objects.get(id=self.slots[0].id).is_booked)
+        self.assertEqual(DailyAvailability.objects.get(provider=self.provider).booked, 0)
+
+    def test_rejects_unsupported_and_oversized_batches(self):
+        self.assertEqual(self.post([{'method': 'GET', 'path': '/api/slots/'}]).status_code, 405)
+        self.assertEqual(self.post([{'method': 'DELETE', 'path': '/nowhere/'}]).status_code, 404)
+        self.assertEqual(self.post([]).status_code, 400)
+        with self.settings(BATCH_MAX_OPERATIONS=2):
+            ops = [{'method': 'DELETE', 'path': f'/api/slots/{s.id}/'} for s in self.slots]
+            self.assertEqual(self.post(ops).status_code, 400)
+
+    def test_hundreds_of_operations_in_one_request(self):
+        slots = make_slots(self.provider, 300, start=self.slots[-1].end_time + timedelta(days=1), minutes=15)
+        ops = [{'method': 'PUT', 'path': f'/api/slots/{s.id}/', 'body': {'is_booked': True}} for s in slots]
+        response = self.post(ops)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 300)
+        self.assertEqual(TimeSlot.objects.filter(is_booked=True).count(), 300)
+
+
+sent_sms = []
+
+
+def _record_sms(phone, code):
+    sent_sms.append((phone, code))
+
+
+@override_settings(OTP_SMS_SENDER='', OTP_RESEND_COOLDOWN=0, OTP_SENDS_PER_PHONE=3, OTP_MAX_ATTEMPTS=2)
+class OtpTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        otp.cache.clear()
+        self.user = User.objects.create_user(username='otp_patient', password='pw12345')
+        self.profile = PatientProfile.objects.create(user=self.user, phone_number='+15550100')
+
+    def test_codes_are_hashed_and_single_use(self):
+        self.addCleanup(sent_sms.clear)
+        with self.settings(OTP_SMS_SENDER='booking.tests._record_sms'):
+            code = otp.issue('+15550100')
+            self.assertIsNone(otp.hint('+15550100'))
+        self.assertEqual(sent_sms, [('+15550100', code)])
+        self.assertNotIn(code, otp.cache.get(otp._key('+15550100', 'code')))
+        self.assertTrue(otp.verify('+15550100', code))
+        self.assertFalse(otp.verify('+15550100', code))
+
+    @override_settings(DEBUG=False)
+    def test_code_is_shown_until_an_sms_sender_is_configured(self):
+        self.assertIsNone(otp.hint('+15550100'))
+        code = otp.issue('+15550100')
+        self.assertEqual(otp.hint('+15550100'), code)
+
+    def test_codes_are_visible_to_every_worker(self):
+        code = otp.issue('+15550100')
+        other_worker = caches.create_connection('shared')
+        self.assertIsNotNone(other_worker.get(otp._key('+15550100', 'code')))
+        self.assertTrue(otp.verify('+15550100', code))
+
+    def test_wrong_guesses_burn_the_code(self):
+        code = otp.issue('+15550100')
+        wrong = f'{(int(code) + 1) % 1_000_000:06d}'
+        self.assertFalse(otp.verify('+15550100', wrong))
+        self.assertFalse(otp.verify('+15550100', wrong))
+        self.assertFalse(otp.verify('+15550100', code))
+
+    def test_sends_are_throttled_per_phone_and_ip(self):
+        for _ in range(3):
+            otp.issue('+15550100')
+        with self.assertRaises(otp.Throttled):
+            otp.issue('+15550100')
+        with self.settings(OTP_SENDS_PER_IP=1):
+            otp.issue('+15550101', ip='10.0.0.9')
+            with self.assertRaises(otp.Throttled):
+                otp.issue('+15550102', ip='10.0.0.9')
+        with self.settings(OTP_RESEND_COOLDOWN=30):
+            otp.issue('+15550103')
+            with self.assertRaises(otp.Throttled):
+                otp.issue('+15550103')
+
+    @override_settings(TRUSTED_PROXY_COUNT=1, OTP_SENDS_PER_IP=1)
+    def test_ip_limit_counts_forwarded_client_addresses(self):
+        other = User.objects.create_user(username='otp_other')
+        PatientProfile.objects.create(user=other, phone_number='+15550199')
+
+        def resend(user, forwarded_for):
+            self.client.force_login(user)
+            # Same proxy address for every request; a client-supplied entry comes first.
+            self.client.get('/resend-otp/', REMOTE_ADDR='10.1.1.1', HTTP_X_FORWARDED_FOR=f'6.6.6.6, {forwarded_for}')
+
+        resend(self.user, '203.0.113.5')
+        resend(other, '198.51.100.7')
+        self.assertIsNotNone(otp.hint('+15550100'))
+        self.assertIsNotNone(otp.hint('+15550199'))
+        otp.clear('+15550199')
+        resend(other, '203.0.113.5')
+        self.assertIsNone(otp.hint('+15550199'))
+
+    def test_verification_writes_the_profile_only_once(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/resend-otp/')
+            wrong = f"{(int(otp.hint('+15550100')) + 1) % 1_000_000:06d}"
+            self.client.post('/verify-phone/', {'otp_code': wrong})
+        writes = [q['sql'] for q in queries.captured_queries if 'booking_patientprofile' in q['sql'] and not q['sql'].startswith('SELECT')]
+        self.assertEqual(writes, [])
+        self.assertContains(self.client.get('/verify-phone/'), otp.hint('+15550100'))
+        response = self.client.post('/verify-phone/', {'otp_code': otp.hint('+15550100')})
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
+        self.profile.refresh_from_db()
+        self.assertTrue(self.profile.is_phone_verified)
+
+
+class PrincipalTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = make_provider('dr_principal', 'dentist')
+        cls.patient = User.objects.create_user(username='principal_patient')
+        PatientProfile.objects.create(user=cls.patient, phone_number='+15550200')
+
+    def request(self, user, session=None):
+        from django.contrib.sessions.backends.db import SessionStore
+        request = RequestFactory().get('/')
+        request.user = user
+        request.session = session if session is not None else SessionStore()
+        return request
+
+    def test_loaded_in_one_query_then_kept_in_the_session(self):
+        first = self.request(self.doctor.user)
+        with self.assertNumQueries(1):
+            me = principal.get_principal(first)
+        self.assertEqual((me.role, me.provider_id, me.can_book), ('doctor', self.doctor.id, True))
+        with self.assertNumQueries(0):
+            self.assertEqual(principal.get_principal(self.request(self.doctor.user, first.session)), me)
+        patient = principal.get_principal(self.request(self.patient))
+        self.assertEqual((patient.role, patient.phone_number, patient.can_book), ('patient', '+15550200', False))
+        with self.settings(PRINCIPAL_CACHE_TIMEOUT=0), self.assertNumQueries(1):
+            principal.get_principal(self.request(self.doctor.user, first.session))
+
+    def test_verifying_updates_the_principal_for_every_worker(self):
+        slot, = make_slots(self.doctor, 1)
+        self.client.force_login(self.patient)
+        self.assertRedirects(self.client.get(f'/book/{slot.id}/'), '/verify-phone/', fetch_redirect_response=False)
+        with self.settings(OTP_SMS_SENDER=''):
+            self.client.get('/resend-otp/')
+            response = self.client.post('/verify-phone/', {'otp_code': otp.hint('+15550200')})
+        self.assertRedirects(response, '/', fetch_redirect_response=False)
+        # Another worker's process-local cache knows nothing of this patient.
+        cache.clear()
+        self.assertNotEqual(self.client.get(f'/book/{slot.id}/').get('Location'), '/verify-phone/')
+        self.assertTrue(self.client.session[principal.SESSION_KEY]['phone_verified'])
+
+    def test_views_read_the_principal(self):
+        slot, = make_slots(self.doctor, 1)
+        self.client.force_login(self.patient)
+        self.assertRedirects(self.client.get(f'/book/{slot.id}/'), '/verify-phone/', fetch_redirect_response=False)
+        self.assertRedirects(self.client.get('/my-schedule/'), '/my-appointments/', fetch_redirect_response=False)
+        self.client.force_login(self.doctor.user)
+        response = self.client.get('/my-schedule/')
+        self.assertContains(response, 'href="/my-schedule/"')
+        self.assertIsInstance(response.wsgi_request.principal._wrapped, principal.Principal)
+
+
+@override_settings(SQLITE_WRITE_BACKOFF=0)
+class SerializedWriteTests(TransactionTestCase):
+    def test_locked_writes_are_retried_as_a_whole(self):
+        calls = []
+
+        @writes.serialized
+        def flaky():
+            calls.append(connection.in_atomic_block)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'done'
+
+        with self.assertLogs('booking.writes', 'WARNING'):
+            self.assertEqual(flaky(), 'done')
+        self.assertEqual(calls, [True, True, True])
+
+    def test_gives_up_after_the_retry_budget_and_on_other_errors(self):
+        @writes.serialized
+        def locked():
+            raise OperationalError('database is locked')
+
+        @writes.serialized
+        def broken():
+            raise OperationalError('no such table: nowhere')
+
+        with self.settings(SQLITE_WRITE_RETRIES=1), self.assertLogs('booking.writes', 'WARNING') as logs:
+            with self.assertRaises(OperationalError):
+                locked()
+        self.assertEqual(len(logs.records), 1)
+        with self.assertRaises(OperationalError):
+            broken()
+
+    def test_nested_calls_join_the_outer_transaction(self):
+        attempts = []
+
+        @writes.serialized
+        def inner():
+            attempts.append(1)
+            raise OperationalError('database is locked')
+
+        with transaction.atomic(), self.assertRaises(OperationalError):
+            inner()
+        self.assertEqual(attempts, [1])
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_STICKY_SECONDS=7)
+class ReplicaRoutingTests(SimpleTestCase):
+    # Not TestCase: its wrapping transaction would pin every read to the primary.
+    databases = {'default'}
+    router = routers.PrimaryReplicaRouter()
+
+    def run_request(self, request, write=False):
+        seen = {}
+
+        def view(request):
+            seen['read'] = self.router.db_for_read(Booking)
+            if write:
+                self.router.db_for_write(Booking)
+            return HttpResponse()
+
+        response = routers.ReplicaRoutingMiddleware(view)(request)
+        return seen['read'], response
+
+    def test_request_reads_go_to_replicas_outside_primary_transactions(self):
+        self.assertEqual(self.router.db_for_read(TimeSlot), 'default')  # no request
+        routers._state.set(routers._RoutingState(pinned=False))
+        self.addCleanup(routers._state.set, None)
+        self.assertEqual(self.router.db_for_read(TimeSlot), 'replica1')
+        self.assertEqual(self.router.db_for_read(otp.cache.cache_model_class), 'default')
+        with transaction.atomic():
+            self.assertEqual(self.router.db_for_read(TimeSlot), 'default')
+        with self.settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.router.db_for_read(TimeSlot), 'default')
+        self.assertEqual(self.router.db_for_write(TimeSlot), 'default')
+        self.assertEqual(self.router.db_for_read(TimeSlot), 'default')  # this request wrote
+        self.assertFalse(self.router.allow_migrate('replica1', 'booking'))
+
+    def test_writers_stick_to_the_primary(self):
+        factory = RequestFactory()
+        read, response = self.run_request(factory.get('/my-appointments/'))
+        self.assertEqual(read, 'replica1')
+        self.assertNotIn(routers.STICKY_COOKIE, response.cookies)
+
+        read, response = self.run_request(factory.post('/api/bookings/'), write=True)
+        self.assertEqual(read, 'default')
+        self.assertEqual(response.cookies[routers.STICKY_COOKIE]['max-age'], 7)
+
+        sticky = factory.get('/my-appointments/')
+        sticky.COOKIES[routers.STICKY_COOKIE] = '1'
+        self.assertEqual(self.run_request(sticky)[0], 'default')
+        self.assertIsNone(routers._state.get())
+
+    def test_replication_stand_in_copies_the_primary(self):
+        import sqlite3
+        import tempfile
+        from pathlib import Path
+        with tempfile.TemporaryDirectory() as tmp:
+            primary, replica = Path(tmp) / 'primary.sqlite3', Path(tmp) / 'replica.sqlite3'
+            with sqlite3.connect(primary) as db:
+                db.execute('CREATE TABLE t (x)')
+                db.execute('INSERT INTO t VALUES (1), (2)')
+            db.close()
+            replication.copy_database(primary, replica)
+            copy = sqlite3.connect(replica)
+            self.assertEqual(copy.execute('SELECT COUNT(*) FROM t').fetchone(), (2,))
+            copy.close()
+
+
+def image_upload(name='face.jpg', size=(640, 480), color='teal'):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+class PhotoTests(TestCase):
+    def setUp(self):
+        import shutil
+        import tempfile
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.provider = make_provider('dr_photo', 'dentist')
+
+    def upload(self, **kwargs):
+        self.provider.photo = image_upload(**kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.provider.save()
+
+    def test_upload_renders_hashed_variants(self):
+        from PIL import Image
+        self.upload()
+        storage = self.provider.photo.storage
+        self.assertTrue(photos.is_hash(self.provider.photo_hash))
+        for width in photos.WIDTHS:
+            for ext in photos.FORMATS:
+                name = photos.variant_name(self.provider.photo_hash, width, ext)
+                with storage.open(name) as f, Image.open(f) as image:
+                    self.assertEqual(image.size, (width, width))
+        first = self.provider.photo_hash
+        self.upload(color='navy')
+        self.assertNotEqual(self.provider.photo_hash, first)
+
+    def test_variant_view_renders_lazily_and_caches_for_good(self):
+        self.upload()
+        storage = self.provider.photo.storage
+        name = photos.variant_name(self.provider.photo_hash, 200, 'webp')
+        storage.delete(name)
+        response = self.client.get(photos.url(self.provider, 200, 'webp'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertTrue(storage.exists(name))
+        response.close()
+
+        base = f'/photos/{self.provider.id}'
+        self.assertEqual(self.client.get(f'{base}/{"0" * 16}/200.webp').status_code, 404)
+        self.assertEqual(self.client.get(f'{base}/{self.provider.photo_hash}/150.webp').status_code, 404)
+        self.assertEqual(self.client.get(f'{base}/{self.provider.photo_hash}/200.gif').status_code, 404)
+
+    def test_listing_uses_srcset_and_falls_back_for_unreadable_photos(self):
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        self.upload()
+        make_slots(self.provider, 1)
+        other = make_provider('dr_svg')
+        other.photo = SimpleUploadedFile('dr.svg', b'<svg xmlns="http://www.w3.org/2000/svg"/>')
+        other.save()
+        self.assertEqual(other.photo_hash, '')
+        make_slots(other, 1)
+
+        html = self.client.get('/slots/').content.decode()
+        self.assertIn(f'{photos.srcset(self.provider, "webp")}"', html)
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(f'src="{other.photo.url}"', html)
+        self.assertNotIn('doctor1.jpg', html)
+
+
+class MyAppointmentsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = User.objects.create_user(username='regular')
+        cls.provider = make_provider('dr_history')
+        now = timezone.now().replace(microsecond=0)
+        cls.past = make_slots(cls.provider, 5, start=now - timedelta(days=30))
+        cls.upcoming = make_slots(cls.provider, 3, start=now + timedelta(days=1))
+        for slot in cls.past + cls.upcoming:
+            Booking.objects.create(client=cls.patient, slot=slot, status='confirmed')
+        Booking.objects.filter(slot=cls.upcoming[-1]).update(status='cancelled')
+
+    def setUp(self):
+        self.client.force_login(self.patient)
+
+    def walk(self, section):
+        starts, url = [], '/my-appointments/'
+        while url:
+            response = self.client.get(url)
+            starts += [b.slot.start_time for b in response.context[section]]
+            cursor = response.context[f'{section}_next']
+            url = cursor and f'/my-appointments/?{section}={cursor}'
+        return starts, response.context['counts']
+
+    def test_sections_split_and_page_in_the_database(self):
+        from unittest import mock
+        with mock.patch('booking.views.APPOINTMENTS_PAGE_SIZE', 2):
+            upcoming, counts = self.walk('upcoming')
+            past, _ = self.walk('past')
+        self.assertEqual(upcoming, [s.start_time for s in self.upcoming[:2]])
+        self.assertEqual(past, [s.start_time for s in [self.upcoming[-1]] + self.past[::-1]])
+        self.assertEqual(counts, {'upcoming': 2, 'past': 6, 'cancelled': 1})
+        self.assertRedirects(self.client.get('/my-appointments/?past=garbage'), '/my-appointments/')
+
+    def test_cost_does_not_grow_with_history(self):
+        def queries():
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(self.client.get('/my-appointments/').status_code, 200)
+            return len(ctx.captured_queries)
+
+        queries()  # warm the session and principal caches
+        before = queries()
+        start = timezone.now().replace(microsecond=0) - timedelta(days=400)
+        for slot in make_slots(self.provider, 60, start=start):
+            Booking.objects.create(client=self.patient, slot=slot, status='confirmed')
+        self.assertEqual(queries(), before)
+        response = self.client.get('/my-appointments/')
+        self.assertEqual(len(response.context['past']), 20)
+        self.assertContains(response, '66 past')
+
+
+class MyScheduleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = make_provider('dr_calendar')
+        cls.provider.user.first_name = 'Cal'
+        cls.provider.user.save()
+        wednesday = timezone.make_aware(datetime(2030, 1, 9, 10))
+        cls.wednesday = make_slots(cls.provider, 3, start=wednesday)
+        cls.friday = make_slots(cls.provider, 1, start=wednesday + timedelta(days=2))
+        cls.next_week = make_slots(cls.provider, 1, start=wednesday + timedelta(days=7))
+        cls.patient = User.objects.create_user(username='pat_cal', first_name='Ann', last_name='Lee')
+        slot = cls.wednesday[0]
+        Booking.objects.create(client=User.objects.create_user(username='gone'), slot=slot, status='cancelled')
+        services.book(cls.patient.id, slot.id)
+
+    def setUp(self):
+        self.client.force_login(self.provider.user)
+
+    def get(self, **params):
+        response = self.client.get('/my-schedule/', params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_week_window_with_active_bookings_and_day_counts(self):
+        response = self.get(date='2030-01-10')
+        days = response.context['days']
+        self.assertEqual([d['date'] for d in days], [datetime(2030, 1, 9).date(), datetime(2030, 1, 11).date()])
+        self.assertEqual(days[0]['counts'], {'total': 3, 'free': 2, 'booked': 1})
+        first = days[0]['slots'][0]
+        self.assertEqual((first['id'], first['patient'], first['booking_status']), (self.wednesday[0].id, 'Ann Lee', 'confirmed'))
+        self.assertEqual(len(days[0]['slots']), 3)  # the cancelled booking adds no row
+        self.assertIsNone(days[0]['slots'][1]['booking_status'])
+        self.assertContains(response, 'date=2030-01-06')  # previous week
+        self.assertContains(response, 'date=2030-01-14')  # next week
+
+    def test_day_and_month_views(self):
+        day = self.get(view='day', date='2030-01-11').context['days']
+        self.assertEqual([s['id'] for d in day for s in d['slots']], [self.friday[0].id])
+        month = self.get(view='month', date='2030-01-20')
+        self.assertEqual(sum(len(d['slots']) for d in month.context['days']), 5)
+        self.assertEqual(month.context['next'], datetime(2030, 2, 1).date())
+        fallback = self.get(view='year', date='soon').context
+        self.assertEqual((fallback['view'], fallback['first']), ('week', timezone.localdate() - timedelta(days=timezone.localdate().weekday())))
+
+    def test_queries_do_not_grow_with_the_schedule(self):
+        self.get(date='2030-01-09')  # warm the session and principal caches
+        with CaptureQueriesContext(connection) as small:
+            self.get(date='2030-01-09')
+        make_slots(self.provider, 40, start=timezone.make_aware(datetime(2030, 1, 10, 6)), minutes=15)
+        with CaptureQueriesContext(connection) as big:
+            self.get(date='2030-01-09')
+        self.assertEqual(len(big.captured_queries), len(small.captured_queries))
+
+
+class ArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.provider = make_provider('dr_archive')
+        cls.patient = User.objects.create_user(username='pat_archive')
+        cls.old = make_slots(cls.provider, 5, start=timezone.now().replace(microsecond=0) - timedelta(days=200))
+        cls.recent = make_slots(cls.provider, 2)
+        for slot in cls.old[:3] + cls.recent[:1]:
+            services.book(cls.patient.id, slot.id)
+        services.set_status(Booking.objects.get(slot=cls.old[0]), 'cancelled')
+
+    def run_command(self, *args):
+        out = io.StringIO()
+        call_command('archive_bookings', *args, stdout=out)
+        return out.getvalue()
+
+    def test_batches_resume_until_the_live_tables_hold_only_the_horizon(self):
+        from .models import ArchivedBooking, ArchivedSlot
+        self.assertIn('5 slot(s)', self.run_command('--days', '90', '--dry-run'))
+        output = self.run_command('--days', '90', '--batch-size', '2', '--max-batches', '1')
+        self.assertIn('3 slot(s) left', output)
+        self.assertEqual(list(ArchivedSlot.objects.order_by('id').values_list('id', flat=True)), [s.id for s in self.old[:2]])
+
+        output = self.run_command('--days', '90', '--batch-size', '2')
+        self.assertIn('Archived 3 slots and 1 bookings in 2 batch(es).', output)
+        self.assertEqual(set(TimeSlot.objects.values_list('id', flat=True)), {s.id for s in self.recent})
+        self.assertEqual(Booking.objects.count(), 1)
+        archived = ArchivedBooking.objects.select_related('slot').get(slot_id=self.old[0].id)
+        self.assertEqual((archived.client_id, archived.status), (self.patient.id, 'cancelled'))
+        self.assertEqual(ArchivedSlot.objects.filter(is_booked=True).count(), 2)
+        self.assertEqual(summary.drift(), [])
+        self.assertIn('Archived 0 slots', self.run_command('--days', '90'))
+
+    def test_my_appointments_reads_the_archive_on_request(self):
+        call_command('archive_bookings', '--days', '90', stdout=io.StringIO())
+        self.client.force_login(self.patient)
+        response = self.client.get('/my-appointments/')
+        self.assertIsNone(response.context['archived'])
+        self.assertContains(response, '?archived=')
+
+        from unittest import mock
+        with mock.patch('booking.views.APPOINTMENTS_PAGE_SIZE', 2):
+            first = self.client.get('/my-appointments/?archived=').context
+            rest = self.client.get(f'/my-appointments/?archived={first["archived_next"]}').context
+        starts = [b.slot.start_time for b in list(first['archived']) + list(rest['archived'])]
+        self.assertEqual(starts, [s.start_time for s in self.old[2::-1]])
+        self.assertIsNone(rest['archived_next'])
+        self.assertEqual(len(first['upcoming']), 1)
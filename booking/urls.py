@@ -7,6 +7,14 @@ from .views import resend_otp
 from .views import book_slot
 from .views import my_appointments
 from .views import my_schedule
+from .views import next_available_page
+from .views import next_available_api
+from .views import book_rule_slot
+from .views import availability_api
+from .views import cache_stats_api
+from .views import slot_events_api
+from .views import batch_api
+from .views import provider_photo
 
 from .views import (
     home,
@@ -31,14 +39,22 @@ urlpatterns = [
     path('slots/', slots_page, name='slots'),
     path('specialization/<str:name>/', specialization_page, name='specialization'),
     path('provider/<int:provider_id>/', provider_detail, name='provider_detail'),
+    path('next-available/', next_available_page, name='next_available'),
+    path('photos/<int:provider_id>/<str:photo_hash>/<int:width>.<str:ext>', provider_photo, name='provider_photo'),
 
     # BOOKING
     path('book/<int:slot_id>/', book_slot, name='book_slot'),
+    path('book/<int:provider_id>/at/<int:timestamp>/', book_rule_slot, name='book_rule_slot'),
     path('my-appointments/', my_appointments, name='my_appointments'),
     path('my-schedule/', my_schedule, name='my_schedule'),
 
     # API
     path('api/slots/', slots_api),
+    path('api/slots/next/', next_available_api),
+    path('api/slots/events/', slot_events_api),
+    path('api/availability/', availability_api),
+    path('api/cache/stats/', cache_stats_api),
+    path('api/batch/', batch_api),
     path('api/slots/<int:slot_id>/', slots_api),
     path('api/providers/', providers_api),
     path('api/providers/<int:provider_id>/', providers_api),
@@ -1,17 +1,39 @@
-from django.shortcuts import render, get_object_or_404
-from django.http import JsonResponse
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, render, redirect, get_object_or_404
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from .models import Provider, TimeSlot, Booking
-from django.contrib.auth.decorators import login_required
+from django.contrib import messages
+from django.contrib.auth import authenticate, login, logout
+from django.contrib.auth.models import User
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_time
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, FilteredRelation, Q
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from . import batch, bulk, caching, feed, otp, photos, principal, schedule, services, summary, writes
+from .models import ArchivedBooking, Provider, TimeSlot, Booking, PatientProfile
+from .availability import index as availability_index
+from .conditional import alist_validators, not_modified, object_validators, set_validators
+from .export import is_asgi, ndjson_response, wants_ndjson
+from .pagination import InvalidCursor, apaginate_by_start_time, paginate_by_start_time, parse_limit
+from .projection import InvalidFields, Projection, isoformat, list_response, wants_columnar
 from django.contrib.auth.decorators import login_required
 
+import calendar
 import json
 
 
-def _is_phone_verified(user):
-    """Check if the user has a verified phone number."""
-    profile = getattr(user, 'patient_profile', None)
-    return profile is not None and profile.is_phone_verified
+def _send_otp(request, phone):
+    """Issue a code for `phone` and tell the user; False if throttled."""
+    try:
+        code = otp.issue(phone, ip=otp.client_ip(request))
+    except otp.Throttled as exc:
+        messages.error(request, str(exc))
+        return False
+    # Without an SMS sender (OTP_SMS_SENDER) the code is shown on screen
+    hint = f': {code}' if otp.hint(phone) else ''
+    messages.info(request, f'OTP code sent to {phone}{hint}')
+    return True
 
 
 # ═══════════════════════════════════════════════
@@ -28,10 +50,9 @@ def login_view(request):
         if user is not None:
             login(request, user)
             # If patient has unverified phone, send them to verify
-            profile = getattr(user, 'patient_profile', None)
-            if profile and not profile.is_phone_verified:
-                profile.generate_otp()
-                messages.info(request, f'OTP sent to {profile.phone_number}. Please verify.')
+            me = principal.get_principal(request)
+            if me.is_patient and not me.phone_verified:
+                _send_otp(request, me.phone_number)
                 return redirect('verify_phone')
             next_url = request.GET.get('next', 'home')
             return redirect(next_url)
@@ -67,11 +88,9 @@ def register_view(request):
                 username=username, email=email, password=password,
                 first_name=first_name, last_name=last_name,
             )
-            profile = PatientProfile.objects.create(user=user, phone_number=phone)
-            otp = profile.generate_otp()
+            PatientProfile.objects.create(user=user, phone_number=phone)
             login(request, user)
-            # In production this would send a real SMS; for now we show it on screen
-            messages.info(request, f'OTP code sent to {phone}: {otp}')
+            _send_otp(request, phone)
             return redirect('verify_phone')
     return render(request, 'booking/register.html')
 
@@ -79,35 +98,36 @@ def register_view(request):
 @login_required(login_url='login')
 def verify_phone(request):
     """OTP verification page."""
-    profile = getattr(request.user, 'patient_profile', None)
-    if not profile:
+    me = request.principal
+    if not me.is_patient:
         messages.error(request, 'No phone number associated with your account.')
         return redirect('home')
-    if profile.is_phone_verified:
+    if me.phone_verified:
         messages.success(request, 'Your phone is already verified.')
         return redirect('home')
 
     if request.method == 'POST':
         code = request.POST.get('otp_code', '').strip()
-        if profile.verify_otp(code):
+        if otp.verify(me.phone_number, code):
+            PatientProfile.objects.filter(user_id=me.user_id).update(is_phone_verified=True)
+            principal.forget(request)
             messages.success(request, 'Phone number verified successfully!')
             return redirect('home')
         else:
             messages.error(request, 'Invalid OTP code. Please try again.')
 
     return render(request, 'booking/verify_phone.html', {
-        'phone_number': profile.phone_number,
-        'otp_hint': profile.otp_code,  # Shown on screen for demo purposes
+        'phone_number': me.phone_number,
+        'otp_hint': otp.hint(me.phone_number),  # Shown on screen until SMS is set up
     })
 
 
 @login_required(login_url='login')
 def resend_otp(request):
     """Resend OTP code."""
-    profile = getattr(request.user, 'patient_profile', None)
-    if profile and not profile.is_phone_verified:
-        otp = profile.generate_otp()
-        messages.info(request, f'New OTP sent to {profile.phone_number}: {otp}')
+    me = request.principal
+    if me.is_patient and not me.phone_verified:
+        _send_otp(request, me.phone_number)
     return redirect('verify_phone')
 
 
@@ -124,72 +144,183 @@ def home(request):
     specializations = Provider.SPECIALIZATION_CHOICES
     return render(request, 'booking/home.html', {
         'specializations': specializations,
+        'free': summary.free_by_specialization(),
     })
 
 
 def slots_page(request):
-    slots = TimeSlot.objects.select_related('provider').all()
-    return render(request, 'booking/slots.html', {'slots': slots})
-
-    selected_spec = request.GET.get('spec', '')
-    if selected_spec:
-        slots = slots.filter(provider__specialization__iexact=selected_spec)
-
-    return render(request, 'booking/slots.html', {
-        'slots': slots,
-        'specializations': Provider.SPECIALIZATION_CHOICES,
-        'selected_spec': selected_spec,
-    })
+    selected_spec = request.GET.get('spec', '').lower()
+
+    def build_context():
+        slots = TimeSlot.objects.select_related('provider__user').order_by('start_time', 'id')
+        if selected_spec:
+            slots = slots.filter(provider__specialization=selected_spec)
+        return {
+            'slots': list(slots),
+            'specializations': Provider.SPECIALIZATION_CHOICES,
+            'selected_spec': selected_spec,
+            # Live badges need a held-open stream, which only ASGI servers can afford.
+            'live_feed': live_feed,
+        }
+
+    live_feed = is_asgi(request)
+    versions = [f'spec:{selected_spec}'] if selected_spec else ['slots']
+    return caching.cached_page(
+        request, 'slots', [selected_spec, int(live_feed)], versions, 'booking/slots.html', build_context,
+    )
 
 
 def specialization_page(request, name):
-    slots = TimeSlot.objects.filter(
-        provider__specialization__iexact=name
-    ).select_related('provider__user')
-    return render(
-        request,
-        'booking/specialization.html',
-        {'slots': slots, 'specialization': name.capitalize()},
+    name = name.lower()
+
+    def build_context():
+        slots = TimeSlot.objects.filter(
+            provider__specialization=name
+        ).select_related('provider__user').order_by('start_time', 'id')
+        providers = list(Provider.objects.filter(specialization=name).select_related('user').order_by('id'))
+        free = summary.free_counts([p.id for p in providers])
+        no_slots = {'today': 0, 'week': 0}
+        return {
+            'slots': list(slots),
+            'specialization': name.capitalize(),
+            'availability': [(p, free.get(p.id, no_slots)) for p in providers],
+        }
+
+    return caching.cached_page(
+        request, 'specialization', [name], [f'spec:{name}'], 'booking/specialization.html', build_context,
     )
 
 
+# Days of rule-generated (virtual) slots shown on a provider's page.
+PROVIDER_WINDOW_DAYS = 14
+
+
 def provider_detail(request, provider_id):
-    provider = get_object_or_404(Provider, id=provider_id)
-    slots = TimeSlot.objects.filter(provider=provider).order_by('start_time')
-    return render(
-        request,
-        'booking/doctor.html',
-        {'provider': provider, 'slots': slots},
+    def build_context():
+        provider = get_object_or_404(Provider.objects.select_related('user'), id=provider_id)
+        slots = TimeSlot.objects.filter(provider=provider).order_by('start_time')
+        now = timezone.now()
+        virtual = schedule.expand(
+            [provider.id], now, now + timedelta(days=PROVIDER_WINDOW_DAYS),
+            providers={provider.id: provider},
+        )
+        free = summary.free_counts([provider.id]).get(provider.id, {'today': 0, 'week': 0})
+        return {'provider': provider, 'slots': schedule.merge(slots, virtual), 'free': free}
+
+    return caching.cached_page(
+        request, 'provider', [provider_id], [f'provider:{provider_id}'], 'booking/doctor.html', build_context,
     )
 
 
+def provider_photo(request, provider_id, photo_hash, width, ext):
+    """A resized provider photo (see `booking.photos`), rendered on first request."""
+    if not photos.is_hash(photo_hash) or width not in photos.WIDTHS or ext not in photos.FORMATS:
+        raise Http404
+    name = photos.variant_name(photo_hash, width, ext)
+    storage = Provider._meta.get_field('photo').storage
+    if not storage.exists(name):
+        # Variants of a replaced photo stay servable while they exist, but
+        # only the current photo is rendered.
+        provider = get_object_or_404(Provider, id=provider_id, photo_hash=photo_hash)
+        name = photos.ensure(provider, width, ext)
+    response = FileResponse(storage.open(name), content_type=photos.FORMATS[ext][1])
+    response['Cache-Control'] = photos.CACHE_CONTROL
+    return response
+
+
+# ═══════════════════════════════════════════════
+#  SEARCH: Next available appointment
+# ═══════════════════════════════════════════════
+
+def _next_available_filters(params):
+    """Build `AvailabilityIndex.next_available` kwargs from the query string."""
+    filters = {'limit': int(params.get('limit') or 10)}
+    if params.get('specialization'):
+        filters['specialization'] = params['specialization'].lower()
+    if params.get('provider_id'):
+        filters['provider_id'] = int(params['provider_id'])
+    if params.get('from'):
+        filters['after'] = _parse_query_datetime(params['from'], 'from')
+    if params.get('to'):
+        filters['before'] = _parse_query_datetime(params['to'], 'to')
+    for name in ('time_from', 'time_to'):
+        if params.get(name):
+            value = parse_time(params[name])
+            if value is None:
+                raise ValueError(f'{name} must be a time such as 09:30')
+            filters[name] = value
+    if params.get('duration'):
+        filters['min_duration'] = timedelta(minutes=int(params['duration']))
+    return filters
+
+
+def next_available_page(request):
+    error = None
+    slots = []
+    try:
+        slots = availability_index.next_available(**_next_available_filters(request.GET))
+    except ValueError as exc:
+        error = str(exc)
+    return render(request, 'booking/next_available.html', {
+        'slots': slots,
+        'error': error,
+        'specializations': Provider.SPECIALIZATION_CHOICES,
+        'params': request.GET,
+    })
+
+
 # ═══════════════════════════════════════════════
 #  BOOKING: Book a slot + confirmation page
 # ═══════════════════════════════════════════════
 
+def _booking_gate(request):
+    """Redirect patients who still have to verify their phone before booking."""
+    # Check phone verification (doctors skip this check)
+    if not request.principal.can_book:
+        messages.warning(request, 'Please verify your phone number before booking.')
+        return redirect('verify_phone')
+    return None
+
+
 @login_required(login_url='login')
 def book_slot(request, slot_id):
     slot = get_object_or_404(TimeSlot, id=slot_id)
 
-    # Check phone verification (doctors skip this check)
-    is_doctor = hasattr(request.user, 'provider')
-    if not is_doctor and not _is_phone_verified(request.user):
-        messages.warning(request, 'Please verify your phone number before booking.')
-        return redirect('verify_phone')
+    gate = _booking_gate(request)
+    if gate:
+        return gate
 
-    # Double-booking prevention
-    if slot.is_booked:
+    # Claim the slot atomically; a concurrent booking makes this fail cleanly
+    try:
+        booking = services.book(request.user.id, slot.id, status='confirmed')
+    except services.SlotUnavailable:
         messages.error(request, 'This slot is already booked.')
         return redirect('slots')
+    except services.SlotNotFound:
+        raise Http404('No TimeSlot matches the given query.')
 
-    # Create booking and mark slot
-    booking = Booking.objects.create(
-        client=request.user,
-        slot=slot,
-        status='confirmed',
-    )
-    slot.is_booked = True
-    slot.save()
+    return render(request, 'booking/booking_confirmation.html', {
+        'booking': booking,
+    })
+
+
+@login_required(login_url='login')
+def book_rule_slot(request, provider_id, timestamp):
+    """Book a virtual slot generated from the provider's recurring hours."""
+    provider = get_object_or_404(Provider, id=provider_id)
+
+    gate = _booking_gate(request)
+    if gate:
+        return gate
+
+    start_time = datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+    try:
+        booking = services.book_at(request.user.id, provider.id, start_time, status='confirmed')
+    except services.SlotUnavailable:
+        messages.error(request, 'This slot is already booked.')
+        return redirect('provider_detail', provider_id=provider.id)
+    except services.SlotNotFound:
+        raise Http404('The provider has no slot at that time.')
 
     return render(request, 'booking/booking_confirmation.html', {
         'booking': booking,
@@ -200,165 +331,449 @@ def book_slot(request, slot_id):
 #  HISTORY: Patient appointments / Doctor schedule
 # ═══════════════════════════════════════════════
 
+# Bookings per page in each my_appointments section.
+APPOINTMENTS_PAGE_SIZE = 20
+
+
 @login_required(login_url='login')
 def my_appointments(request):
-    bookings = Booking.objects.filter(
-        client=request.user
-    ).select_related('slot__provider__user').order_by('-slot__start_time')
-
-    now = timezone.now()
-    upcoming = [b for b in bookings if b.slot.start_time >= now and b.status != 'cancelled']
-    past = [b for b in bookings if b.slot.start_time < now or b.status == 'cancelled']
+    """
+    Upcoming bookings soonest first, then past and cancelled ones newest
+    first.  Each section is one keyset page (`?upcoming=` / `?past=`
+    cursors), so the page costs the same however long the history is.
+    Bookings moved out by `booking.archive` are only read when asked for
+    (`?archived=`, paged the same way).
+    """
+    bookings = Booking.objects.filter(client=request.user).select_related('slot__provider__user')
+    upcoming_q = Q(slot__start_time__gte=timezone.now()) & ~Q(status='cancelled')
+    try:
+        upcoming, upcoming_next = paginate_by_start_time(
+            bookings.filter(upcoming_q), request.GET.get('upcoming'), APPOINTMENTS_PAGE_SIZE,
+            field='slot__start_time',
+        )
+        past, past_next = paginate_by_start_time(
+            bookings.exclude(upcoming_q), request.GET.get('past'), APPOINTMENTS_PAGE_SIZE,
+            field='slot__start_time', descending=True,
+        )
+        archived = archived_next = None
+        if 'archived' in request.GET:
+            archived, archived_next = paginate_by_start_time(
+                ArchivedBooking.objects.filter(client=request.user).select_related('slot__provider__user'),
+                request.GET['archived'], APPOINTMENTS_PAGE_SIZE,
+                field='slot__start_time', descending=True,
+            )
+    except InvalidCursor:
+        return redirect('my_appointments')
+    counts = Booking.objects.filter(client=request.user).aggregate(
+        upcoming=Count('id', filter=upcoming_q),
+        past=Count('id', filter=~upcoming_q),
+        cancelled=Count('id', filter=Q(status='cancelled')),
+    )
 
     return render(request, 'booking/my_appointments.html', {
         'upcoming': upcoming,
+        'upcoming_next': upcoming_next,
         'past': past,
+        'past_next': past_next,
+        'archived': archived,
+        'archived_next': archived_next,
+        'counts': counts,
+        'paged': any(key in request.GET for key in ('upcoming', 'past', 'archived')),
     })
 
 
+# my_schedule windows; `?view=` picks one, `?date=` (YYYY-MM-DD) a day in it.
+SCHEDULE_VIEWS = ('day', 'week', 'month')
+
+
+def _schedule_window(params):
+    """Return `(view, first_day, day_count)` for my_schedule's query string."""
+    view = params.get('view') if params.get('view') in SCHEDULE_VIEWS else 'week'
+    try:
+        day = date.fromisoformat(params.get('date', ''))
+    except ValueError:
+        day = timezone.localdate()
+    if view == 'day':
+        return view, day, 1
+    if view == 'week':
+        return view, day - timedelta(days=day.weekday()), 7
+    return view, day.replace(day=1), calendar.monthrange(day.year, day.month)[1]
+
+
 @login_required(login_url='login')
 def my_schedule(request):
-    """For doctors: see their own slots and who booked them."""
-    try:
-        provider = Provider.objects.get(user=request.user)
-    except Provider.DoesNotExist:
+    """
+    For doctors: their slots in one day, week or month, with who booked
+    them.  Slots and their active bookings come from one joined query over
+    the window; the day headers come from `DailyAvailability`.
+    """
+    if not request.principal.is_doctor:
         messages.info(request, 'You are not registered as a doctor.')
         return redirect('my_appointments')
-
-    slots = TimeSlot.objects.filter(provider=provider).order_by('start_time')
-
-    # Attach booking info to each slot
-    slot_ids = [s.id for s in slots]
-    bookings_map = {}
-    for b in Booking.objects.filter(slot_id__in=slot_ids).select_related('client'):
-        bookings_map[b.slot_id] = b
-
-    schedule = []
-    for slot in slots:
-        schedule.append({
-            'slot': slot,
-            'booking': bookings_map.get(slot.id),
-        })
+    provider = Provider.objects.select_related('user').get(id=request.principal.provider_id)
+
+    view, first, day_count = _schedule_window(request.GET)
+    last = first + timedelta(days=day_count - 1)
+    tz = timezone.get_current_timezone()
+    rows = (
+        TimeSlot.objects.filter(
+            provider=provider,
+            start_time__gte=datetime.combine(first, datetime.min.time(), tzinfo=tz),
+            start_time__lt=datetime.combine(last + timedelta(days=1), datetime.min.time(), tzinfo=tz),
+        )
+        .annotate(active=FilteredRelation('booking', condition=~Q(booking__status='cancelled')))
+        .values(
+            'id', 'start_time', 'end_time', 'is_booked',
+            booking_status=F('active__status'),
+            patient_username=F('active__client__username'),
+            patient_first_name=F('active__client__first_name'),
+            patient_last_name=F('active__client__last_name'),
+        )
+        .order_by('start_time')
+    )
+    status_labels = dict(Booking.STATUS_CHOICES)
+    counts = summary.daily_counts(provider.id, first, last)
+    days = {}
+    for row in rows:
+        day = timezone.localtime(row['start_time']).date()
+        if day not in days:
+            days[day] = {'date': day, 'counts': counts.get(day), 'slots': []}
+        if row['booking_status']:
+            full_name = f"{row['patient_first_name']} {row['patient_last_name']}".strip()
+            row['patient'] = full_name or row['patient_username']
+            row['booking_label'] = status_labels.get(row['booking_status'], row['booking_status'])
+        days[day]['slots'].append(row)
 
     return render(request, 'booking/my_schedule.html', {
         'provider': provider,
-        'schedule': schedule,
+        'days': list(days.values()),
+        'view': view,
+        'views': SCHEDULE_VIEWS,
+        'first': first,
+        'last': last,
+        'previous': first - timedelta(days=1),
+        'next': last + timedelta(days=1),
+        'today': timezone.localdate(),
     })
 
 
 # ═══════════════════════════════════════════════
-#  API ENDPOINTS (unchanged)
+#  API ENDPOINTS
 # ═══════════════════════════════════════════════
 
-def specialization_page(request, name):
-    slots = TimeSlot.objects.filter(
-        provider__specialization__iexact=name
-    ).select_related('provider')
-    return render(
-        request,
-        'booking/specialization.html',
-        {'slots': slots, 'specialization': name.capitalize()},
-    )
-
-
-def provider_detail(request, provider_id):
-    provider = get_object_or_404(Provider, id=provider_id)
-    slots = TimeSlot.objects.filter(provider=provider).order_by('start_time')
-    return render(
-        request,
-        'booking/doctor.html',
-        {'provider': provider, 'slots': slots},
-    )
-
-
 # ---------- API: Slots ----------
+def _parse_bool(value):
+    return value.strip().lower() in {'1', 'true', 'yes', 'on'}
+
+
+def _parse_query_datetime(value, name):
+    dt = parse_datetime(value)
+    if dt is None:
+        raise ValueError(f'{name} must be an ISO 8601 datetime')
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt)
+    return dt
+
+
+def _filter_slots(queryset, params):
+    """Apply the slot list filters from the query string in the database."""
+    if params.get('provider_id'):
+        queryset = queryset.filter(provider_id=params['provider_id'])
+    if params.get('specialization'):
+        queryset = queryset.filter(provider__specialization=params['specialization'].lower())
+    if params.get('is_booked'):
+        queryset = queryset.filter(is_booked=_parse_bool(params['is_booked']))
+    if params.get('from'):
+        queryset = queryset.filter(start_time__gte=_parse_query_datetime(params['from'], 'from'))
+    if params.get('to'):
+        queryset = queryset.filter(start_time__lt=_parse_query_datetime(params['to'], 'to'))
+    return queryset
+
+
+def _slot_to_dict(slot):
+    return {
+        'id': slot.id,
+        'provider_id': slot.provider_id,
+        'provider': str(slot.provider),
+        'start_time': slot.start_time.isoformat(),
+        'end_time': slot.end_time.isoformat(),
+        'is_booked': slot.is_booked,
+    }
+
+
+# List and export fields: `?fields=` picks a subset, read with values_list.
+SLOT_FIELDS = Projection(
+    id=('id', None),
+    provider_id=('provider_id', None),
+    provider=('provider__user__username', None),
+    start_time=('start_time', isoformat),
+    end_time=('end_time', isoformat),
+    is_booked=('is_booked', None),
+)
+PROVIDER_FIELDS = Projection(
+    id=('id', None),
+    username=('user__username', None),
+    specialization=('specialization', None),
+)
+BOOKING_FIELDS = Projection(
+    id=('id', None),
+    client_id=('client_id', None),
+    slot_id=('slot_id', None),
+    created_at=('created_at', isoformat),
+)
+
+
+@writes.serialized
+def _in_transaction(func, *args):
+    # Its own savepoint, so a rejected write leaves an enclosing transaction usable.
+    with transaction.atomic():
+        return func(*args)
+
+
+# The JSON API views are async: under an ASGI server a slow client or a
+# database lock wait parks a coroutine instead of a whole worker.  Reads use
+# the async ORM; writes that need a transaction (the booking engine, bulk
+# creation, saves that adjust the daily counts) run via sync_to_async.
 @csrf_exempt
-def slots_api(request, slot_id=None):
+async def slots_api(request, slot_id=None):
     if request.method == 'GET':
         if slot_id is not None:
-            slot = get_object_or_404(TimeSlot, id=slot_id)
-            data = {
-                'id': slot.id,
-                'provider_id': slot.provider_id,
-                'provider': str(slot.provider),
-                'start_time': slot.start_time.isoformat(),
-                'end_time': slot.end_time.isoformat(),
-                'is_booked': slot.is_booked,
-            }
-            return JsonResponse(data)
-        slots = TimeSlot.objects.select_related('provider').all()
-        data = [
-            {
-                'id': s.id,
-                'provider_id': s.provider_id,
-                'provider': str(s.provider),
-                'start_time': s.start_time.isoformat(),
-                'end_time': s.end_time.isoformat(),
-                'is_booked': s.is_booked,
-            }
-            for s in slots
-        ]
-        return JsonResponse(data, safe=False)
+            slot = await aget_object_or_404(TimeSlot.objects.select_related('provider__user'), id=slot_id)
+            etag, last_modified = object_validators(slot)
+            unchanged = not_modified(request, etag, last_modified)
+            if unchanged:
+                return unchanged
+            return set_validators(JsonResponse(_slot_to_dict(slot)), etag, last_modified)
+        try:
+            slots = _filter_slots(TimeSlot.objects.all(), request.GET)
+            names = SLOT_FIELDS.parse(request.GET.get('fields'))
+        except ValueError as exc:
+            return JsonResponse({'error': str(exc)}, status=400)
+        # Validate before any row is loaded or serialized
+        etag = await alist_validators(request, slots)
+        unchanged = not_modified(request, etag)
+        if unchanged:
+            return unchanged
+        if wants_ndjson(request):
+            lookups = SLOT_FIELDS.lookups(names)
+            return set_validators(
+                ndjson_response(
+                    slots.order_by('id'), lookups, SLOT_FIELDS.serializer(names, lookups),
+                    asynchronous=is_asgi(request),
+                ),
+                etag,
+            )
+        # The cursor is built from the last row's start_time and id
+        lookups = SLOT_FIELDS.lookups(names, required=('start_time', 'id'))
+        try:
+            limit = parse_limit(request.GET.get('limit'))
+            page, next_cursor = await apaginate_by_start_time(
+                slots.values_list(*lookups, named=True), request.GET.get('cursor'), limit,
+            )
+        except InvalidCursor as exc:
+            return JsonResponse({'error': str(exc)}, status=400)
+        response = list_response(SLOT_FIELDS, names, lookups, page, wants_columnar(request), next=next_cursor)
+        return set_validators(response, etag)
 
     if request.method == 'POST':
         data = json.loads(request.body)
-        slot = TimeSlot.objects.create(
-            provider_id=data['provider_id'],
-            start_time=data['start_time'],
-            end_time=data['end_time'],
-        )
-        return JsonResponse({'id': slot.id, 'status': 'created'}, status=201)
+        try:
+            created, errors = await sync_to_async(bulk.create_slots)(data if isinstance(data, list) else [data])
+        except bulk.SlotConflict as exc:
+            return JsonResponse({'error': str(exc)}, status=409)
+        if isinstance(data, list):
+            # Bulk publish: valid items are created, invalid ones reported by index
+            return JsonResponse({
+                'created': [{'index': i, 'id': slot.id} for i, slot in created],
+                'errors': errors,
+            }, status=201 if created else 400)
+        if errors:
+            status = 409 if errors[0]['error'] == bulk.OVERLAP_ERROR else 400
+            return JsonResponse({'error': errors[0]['error']}, status=status)
+        return JsonResponse({'id': created[0][1].id, 'status': 'created'}, status=201)
 
     if request.method == 'PUT' and slot_id is not None:
-        slot = get_object_or_404(TimeSlot, id=slot_id)
+        slot = await aget_object_or_404(TimeSlot, id=slot_id)
         data = json.loads(request.body)
-        if 'is_booked' in data:
-            slot.is_booked = data['is_booked']
-        if 'start_time' in data:
-            slot.start_time = data['start_time']
-        if 'end_time' in data:
-            slot.end_time = data['end_time']
-        slot.save()
+        try:
+            if 'is_booked' in data:
+                slot.is_booked = data['is_booked']
+            if 'start_time' in data:
+                slot.start_time = _parse_query_datetime(data['start_time'], 'start_time')
+            if 'end_time' in data:
+                slot.end_time = _parse_query_datetime(data['end_time'], 'end_time')
+        except ValueError as exc:
+            return JsonResponse({'error': str(exc)}, status=400)
+        # The daily availability counts are adjusted in the same transaction
+        try:
+            await sync_to_async(_in_transaction)(slot.save)
+        except IntegrityError:
+            return JsonResponse({'error': bulk.START_TAKEN_ERROR}, status=409)
         return JsonResponse({'status': 'updated'})
 
     if request.method == 'DELETE' and slot_id is not None:
-        slot = get_object_or_404(TimeSlot, id=slot_id)
-        slot.delete()
+        slot = await aget_object_or_404(TimeSlot, id=slot_id)
+        await sync_to_async(_in_transaction)(slot.delete)
         return JsonResponse({'status': 'deleted'})
 
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
 
+# ---------- API: Next available slots ----------
+def next_available_api(request):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    try:
+        slots = availability_index.next_available(**_next_available_filters(request.GET))
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    return JsonResponse({'results': [_slot_to_dict(s) for s in slots]})
+
+
+# ---------- API: Live slot events (Server-Sent Events) ----------
+def slot_events_api(request):
+    """
+    Push slot booked/freed/created/updated/deleted events as they happen,
+    optionally narrowed to `provider_id` or `specialization`.  Reconnects
+    resume from `Last-Event-ID` (or `?last_event_id=`); see `feed`.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    provider_id = request.GET.get('provider_id')
+    if provider_id:
+        if not provider_id.isdigit():
+            return JsonResponse({'error': 'provider_id must be an integer'}, status=400)
+        provider_id = int(provider_id)
+    else:
+        provider_id = None
+    specialization = request.GET.get('specialization', '').lower() or None
+    cursor = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id', '')
+
+    if is_asgi(request):
+        response = StreamingHttpResponse(
+            feed.astream(cursor, provider_id, specialization), content_type='text/event-stream',
+        )
+    else:
+        # A sync worker can't be parked on the stream; see `feed.catch_up`.
+        response = HttpResponse(
+            feed.catch_up(cursor, provider_id, specialization), content_type='text/event-stream',
+        )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+# ---------- API: Batch ----------
+@csrf_exempt
+async def batch_api(request):
+    """Run a list of slot/provider/booking writes in one transaction; see `batch`."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'error': 'Body must be JSON'}, status=400)
+    operations = data.get('operations') if isinstance(data, dict) else data
+    if not isinstance(operations, list) or not operations:
+        return JsonResponse({'error': 'Expected a non-empty list of operations'}, status=400)
+    if len(operations) > batch.max_operations():
+        return JsonResponse({'error': f'At most {batch.max_operations()} operations per batch'}, status=400)
+    # Each operation looks up its own rows; only repeats within one count as N+1
+    request.query_units = len(operations)
+    results, failed = await sync_to_async(batch.run)(operations)
+    if failed is not None:
+        # Nothing was written; `results` shows how far the batch got.
+        return JsonResponse({
+            'error': results[failed]['body']['error'],
+            'failed': failed,
+            'results': results,
+        }, status=results[failed]['status'])
+    return JsonResponse({'results': results})
+
+
+# ---------- API: Page cache statistics ----------
+def cache_stats_api(request):
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    return JsonResponse(caching.stats())
+
+
+# ---------- API: Availability (stored + rule-generated slots) ----------
+def availability_api(request):
+    """
+    Slots in a bounded window, merging stored slots with virtual ones
+    expanded from recurring rules.  Virtual slots have `"id": null`; book them
+    with POST /api/bookings/ using `provider_id` + `start_time`.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+    params = request.GET
+    try:
+        start = _parse_query_datetime(params['from'], 'from') if params.get('from') else timezone.now()
+        end = _parse_query_datetime(params['to'], 'to') if params.get('to') else start + timedelta(days=7)
+        if end - start > timedelta(days=schedule.MAX_WINDOW_DAYS):
+            raise ValueError(f'The from/to window must be at most {schedule.MAX_WINDOW_DAYS} days')
+        stored = _filter_slots(TimeSlot.objects.select_related('provider__user'), params).filter(
+            start_time__gte=start, start_time__lt=end,
+        ).order_by('start_time', 'id')
+        providers = Provider.objects.select_related('user')
+        if params.get('provider_id'):
+            providers = providers.filter(id=params['provider_id'])
+        if params.get('specialization'):
+            providers = providers.filter(specialization=params['specialization'].lower())
+        providers = providers.in_bulk()
+    except ValueError as exc:
+        return JsonResponse({'error': str(exc)}, status=400)
+    virtual = []
+    if not (params.get('is_booked') and _parse_bool(params['is_booked'])):
+        virtual = schedule.expand(providers.keys(), start, end, providers=providers)
+    return JsonResponse({
+        'results': [
+            {**_slot_to_dict(s), 'virtual': s.is_virtual}
+            for s in schedule.merge(stored, virtual)
+        ],
+    })
+
+
 # ---------- API: Providers ----------
 @csrf_exempt
-def providers_api(request, provider_id=None):
+async def providers_api(request, provider_id=None):
     if request.method == 'GET':
         if provider_id is not None:
-            provider = get_object_or_404(Provider, id=provider_id)
+            provider = await aget_object_or_404(Provider.objects.select_related('user'), id=provider_id)
+            etag, last_modified = object_validators(provider)
+            unchanged = not_modified(request, etag, last_modified)
+            if unchanged:
+                return unchanged
             data = {
                 'id': provider.id,
                 'username': provider.user.username,
                 'specialization': provider.specialization,
             }
-            return JsonResponse(data)
-        providers = Provider.objects.select_related('user').all()
-        data = [
-            {
-                'id': p.id,
-                'username': p.user.username,
-                'specialization': p.specialization,
-            }
-            for p in providers
-        ]
-        return JsonResponse(data, safe=False)
+            return set_validators(JsonResponse(data), etag, last_modified)
+        try:
+            names = PROVIDER_FIELDS.parse(request.GET.get('fields'))
+        except InvalidFields as exc:
+            return JsonResponse({'error': str(exc)}, status=400)
+        etag = await alist_validators(request, Provider.objects.all())
+        unchanged = not_modified(request, etag)
+        if unchanged:
+            return unchanged
+        lookups = PROVIDER_FIELDS.lookups(names)
+        if wants_ndjson(request):
+            return set_validators(ndjson_response(
+                Provider.objects.order_by('id'), lookups, PROVIDER_FIELDS.serializer(names, lookups),
+                asynchronous=is_asgi(request),
+            ), etag)
+        rows = [row async for row in Provider.objects.order_by('id').values_list(*lookups)]
+        return set_validators(list_response(PROVIDER_FIELDS, names, lookups, rows, wants_columnar(request)), etag)
 
     if request.method == 'POST':
         data = json.loads(request.body)
-        from django.contrib.auth.models import User
-        user = User.objects.get(id=data['user_id'])
-        provider = Provider.objects.create(
+        user = await User.objects.aget(id=data['user_id'])
+        provider = await Provider.objects.acreate(
             user=user,
-            specialization=data['specialization'],
+            specialization=data['specialization'].lower(),
         )
         return JsonResponse(
             {'id': provider.id, 'status': 'created'},
@@ -366,16 +781,16 @@ def providers_api(request, provider_id=None):
         )
 
     if request.method == 'PUT' and provider_id is not None:
-        provider = get_object_or_404(Provider, id=provider_id)
+        provider = await aget_object_or_404(Provider, id=provider_id)
         data = json.loads(request.body)
         if 'specialization' in data:
-            provider.specialization = data['specialization']
-        provider.save()
+            provider.specialization = data['specialization'].lower()
+        await provider.asave()
         return JsonResponse({'status': 'updated'})
 
     if request.method == 'DELETE' and provider_id is not None:
-        provider = get_object_or_404(Provider, id=provider_id)
-        provider.delete()
+        provider = await aget_object_or_404(Provider, id=provider_id)
+        await sync_to_async(_in_transaction)(provider.delete)
         return JsonResponse({'status': 'deleted'})
 
     return JsonResponse({'error': 'Method not allowed'}, status=405)
@@ -383,65 +798,80 @@ def providers_api(request, provider_id=None):
 
 # ---------- API: Bookings ----------
 @csrf_exempt
-def bookings_api(request, booking_id=None):
+async def bookings_api(request, booking_id=None):
     if request.method == 'GET':
         if booking_id is not None:
-            booking = get_object_or_404(Booking, id=booking_id)
+            booking = await aget_object_or_404(Booking, id=booking_id)
+            etag, last_modified = object_validators(booking)
+            unchanged = not_modified(request, etag, last_modified)
+            if unchanged:
+                return unchanged
             data = {
                 'id': booking.id,
                 'client_id': booking.client_id,
                 'slot_id': booking.slot_id,
                 'created_at': booking.created_at.isoformat(),
             }
-            return JsonResponse(data)
-        bookings = Booking.objects.select_related('client', 'slot').all()
-        data = [
-            {
-                'id': b.id,
-                'client_id': b.client_id,
-                'slot_id': b.slot_id,
-                'created_at': b.created_at.isoformat(),
-            }
-            for b in bookings
-        ]
-        return JsonResponse(data, safe=False)
+            return set_validators(JsonResponse(data), etag, last_modified)
+        try:
+            names = BOOKING_FIELDS.parse(request.GET.get('fields'))
+        except InvalidFields as exc:
+            return JsonResponse({'error': str(exc)}, status=400)
+        etag = await alist_validators(request, Booking.objects.all())
+        unchanged = not_modified(request, etag)
+        if unchanged:
+            return unchanged
+        lookups = BOOKING_FIELDS.lookups(names)
+        if wants_ndjson(request):
+            return set_validators(ndjson_response(
+                Booking.objects.order_by('id'), lookups, BOOKING_FIELDS.serializer(names, lookups),
+                asynchronous=is_asgi(request),
+            ), etag)
+        rows = [row async for row in Booking.objects.order_by('id').values_list(*lookups)]
+        return set_validators(list_response(BOOKING_FIELDS, names, lookups, rows, wants_columnar(request)), etag)
 
     if request.method == 'POST':
         data = json.loads(request.body)
-        booking = Booking.objects.create(
-            client_id=data['client_id'],
-            slot_id=data['slot_id'],
-        )
-        slot = booking.slot
-        slot.is_booked = True
-        slot.save()
+        if not await User.objects.filter(id=data['client_id']).aexists():
+            return JsonResponse({'error': 'Unknown client_id'}, status=400)
+        try:
+            if 'slot_id' in data:
+                booking = await sync_to_async(services.book)(data['client_id'], data['slot_id'], status='pending')
+            else:
+                # A virtual slot from a recurring rule: materialize it, then book
+                start_time = _parse_query_datetime(data['start_time'], 'start_time')
+                booking = await sync_to_async(services.book_at)(
+                    data['client_id'], data['provider_id'], start_time, status='pending',
+                )
+        except ValueError as exc:
+            return JsonResponse({'error': str(exc)}, status=400)
+        except services.SlotNotFound as exc:
+            return JsonResponse({'error': str(exc)}, status=404)
+        except services.SlotUnavailable as exc:
+            return JsonResponse({'error': str(exc)}, status=409)
         return JsonResponse(
             {'id': booking.id, 'status': 'created'},
             status=201,
         )
 
     if request.method == 'PUT' and booking_id is not None:
-        booking = get_object_or_404(Booking, id=booking_id)
+        booking = await aget_object_or_404(Booking, id=booking_id)
         data = json.loads(request.body)
-        old_slot = booking.slot
-        if 'slot_id' in data:
-            old_slot.is_booked = False
-            old_slot.save()
-            booking.slot_id = data['slot_id']
-            new_slot = booking.slot
-            new_slot.is_booked = True
-            new_slot.save()
-        if 'client_id' in data:
-            booking.client_id = data['client_id']
-        booking.save()
+        if 'status' in data and data['status'] not in dict(Booking.STATUS_CHOICES):
+            return JsonResponse({'error': 'Invalid status'}, status=400)
+        try:
+            await sync_to_async(services.update)(
+                booking, **{key: data[key] for key in ('slot_id', 'status', 'client_id') if key in data},
+            )
+        except services.SlotNotFound as exc:
+            return JsonResponse({'error': str(exc)}, status=404)
+        except services.SlotUnavailable as exc:
+            return JsonResponse({'error': str(exc)}, status=409)
         return JsonResponse({'status': 'updated'})
 
     if request.method == 'DELETE' and booking_id is not None:
-        booking = get_object_or_404(Booking, id=booking_id)
-        slot = booking.slot
-        slot.is_booked = False
-        slot.save()
-        booking.delete()
+        booking = await aget_object_or_404(Booking, id=booking_id)
+        await sync_to_async(services.delete)(booking)
         return JsonResponse({'status': 'deleted'})
 
     return JsonResponse({'error': 'Method not allowed'}, status=405)
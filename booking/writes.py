@@ -0,0 +1,67 @@
+"""
+Serialized write path for booking writes on SQLite.
+
+SQLite allows one writer at a time per database file.  The connection
+settings (see `DATABASES` in settings) make that cheap:
+  * WAL journal mode (`SQLITE_WAL`, on in production), so readers never
+    block the writer;
+  * `BEGIN IMMEDIATE`, so a transaction takes the write lock at its start
+    instead of failing halfway when a read tries to become a write;
+  * a busy timeout, so a waiting writer queues instead of erroring.
+
+`@serialized` adds two things on top:
+  * a process-wide lock, so threads of one worker queue here rather than in
+    SQLite's busy handler;
+  * a retry with jittered exponential backoff when another process still
+    holds the file longer than the busy timeout.
+The whole function runs in one transaction and is retried as a unit.  A
+call nested in an outer transaction just joins it, because only the
+outermost caller can safely retry.
+
+On other databases the decorator only adds the transaction.
+"""
+
+import functools
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+
+logger = logging.getLogger('booking.writes')
+
+DEFAULT_RETRIES = 5
+DEFAULT_BACKOFF = 0.05
+
+_lock = threading.RLock()
+
+
+def is_locked_error(exc):
+    message = str(exc).lower()
+    return 'database is locked' in message or 'database table is locked' in message
+
+
+def serialized(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if connection.in_atomic_block:
+            return func(*args, **kwargs)
+        if connection.vendor != 'sqlite':
+            with transaction.atomic():
+                return func(*args, **kwargs)
+        retries = getattr(settings, 'SQLITE_WRITE_RETRIES', DEFAULT_RETRIES)
+        backoff = getattr(settings, 'SQLITE_WRITE_BACKOFF', DEFAULT_BACKOFF)
+        for attempt in range(retries + 1):
+            try:
+                with _lock, transaction.atomic():
+                    return func(*args, **kwargs)
+            except OperationalError as exc:
+                if attempt == retries or not is_locked_error(exc):
+                    raise
+                delay = backoff * 2 ** attempt * random.uniform(0.5, 1.5)
+                logger.warning('%s: database locked, retry %d in %.3fs', func.__qualname__, attempt + 1, delay)
+                time.sleep(delay)
+    return wrapper
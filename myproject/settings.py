@@ -50,12 +50,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'booking.middleware.QueryCountMiddleware',
+    'booking.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'booking.principal.PrincipalMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -74,6 +77,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'booking.principal.principal',
             ],
         },
     },
@@ -85,13 +89,64 @@ WSGI_APPLICATION = 'myproject.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
 
+# SQLite tuned for concurrent workers: WAL lets reads run alongside the single
+# writer, BEGIN IMMEDIATE takes the write lock up front (no failed lock upgrades),
+# and writers wait up to SQLITE_BUSY_TIMEOUT seconds for it.  Booking writes also
+# queue and retry in booking/writes.py.
+#
+# Unlike the other pragmas, journal_mode=WAL is written into the database file
+# header and stays after the connection closes.  db.sqlite3 is the tracked demo
+# database, so SQLITE_WAL defaults to on only in production (DEBUG off); set it
+# to turn WAL on for an untracked local file.
+#
+# Connections are kept for DB_CONN_MAX_AGE seconds and reused across requests,
+# as suits the WSGI workers of the gunicorn Procfile.  Under ASGI (uvicorn)
+# every async request runs its sync ORM work in its own thread, and a kept
+# connection would leak per thread, so myproject/asgi.py defaults it to 0.
+SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', '20'))
+SQLITE_WAL = os.environ.get('SQLITE_WAL', str(not DEBUG)).strip().lower() in {'1', 'true', 'yes', 'on'}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': SQLITE_BUSY_TIMEOUT,
+            'init_command': (
+                ('PRAGMA journal_mode=WAL;' if SQLITE_WAL else '')
+                + 'PRAGMA synchronous=NORMAL;'
+                f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT * 1000};'
+            ),
+        },
     }
 }
 
+# Read replicas: reads go to DATABASE_REPLICAS, writes and recent writers' reads
+# to `default` (booking/routers.py).  Locally, DB_REPLICA_PATHS names SQLite files
+# that `manage.py replicate_sqlite --interval 1` keeps in sync with the primary.
+DB_REPLICA_PATHS = [p.strip() for p in os.environ.get('DB_REPLICA_PATHS', '').split(',') if p.strip()]
+DATABASE_REPLICAS = [f'replica{i}' for i in range(1, len(DB_REPLICA_PATHS) + 1)]
+DATABASES.update({
+    alias: {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'CONN_MAX_AGE': DATABASES['default']['CONN_MAX_AGE'],
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {'timeout': SQLITE_BUSY_TIMEOUT, 'init_command': 'PRAGMA query_only=ON;'},
+        'TEST': {'MIRROR': 'default'},
+    }
+    for alias, path in zip(DATABASE_REPLICAS, DB_REPLICA_PATHS)
+})
+DATABASE_ROUTERS = ['booking.routers.PrimaryReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', '10'))
+
+# `manage.py archive_bookings` moves slots that started more than this many
+# days ago, with their bookings, into the archive tables (booking.archive).
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '90'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -125,6 +180,52 @@ USE_TZ = True
 
 ALLOWED_HOSTS = ["*"]
 
+# SQL instrumentation (booking.middleware.QueryCountMiddleware)
+# A request repeating one query shape this many times is reported as an N+1;
+# with N_PLUS_ONE_RAISE the request fails instead of logging a warning.
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', '10'))
+N_PLUS_ONE_RAISE = os.environ.get('N_PLUS_ONE_RAISE', 'False').strip().lower() in {'1', 'true', 'yes', 'on'}
+
+# Page cache (booking.caching). Invalidation bumps version counters stored in
+# the cache, so with several worker processes use a shared backend
+# (Memcached/Redis); with the per-process local-memory cache other workers
+# see changes only when their entries expire after PAGE_CACHE_TIMEOUT seconds.
+#
+# `shared` holds state that must agree across workers: OTP codes, attempts
+# and send limits (booking/otp.py).  It is a table in the primary database,
+# created by migration 0014.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'booking_shared_cache',
+        'OPTIONS': {'MAX_ENTRIES': 100_000},
+    },
+}
+PAGE_CACHE_TIMEOUT = int(os.environ.get('PAGE_CACHE_TIMEOUT', '60'))
+
+# Phone verification codes and their send limits live in the cache (see booking/otp.py).
+# OTP_SMS_SENDER is the dotted path of a `send(phone, code)` callable.  Until
+# one is set, the code is shown on the verify page instead.
+OTP_SMS_SENDER = os.environ.get('OTP_SMS_SENDER', '')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'booking.sql': {
+            'handlers': ['console'],
+            'level': os.environ.get('SQL_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
 
@@ -134,7 +235,15 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 # Serve static files in production (Render) without nginx
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
+# Uploaded files (provider photos and their resized variants)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 if not DEBUG:
     # Render runs behind a proxy (sets X-Forwarded-Proto)
     SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
+# Proxies in front of the app that append to X-Forwarded-For (Render's, in
+# production).  Client IPs for OTP throttling are read from that header.
+TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', '0' if DEBUG else '1'))
+